@@ -0,0 +1,6 @@
+# backend/bench/__init__.py
+"""
+Benchmark scripts. Run them as modules from backend/, e.g.
+
+    cd backend && python -m bench.bench_trending
+"""
@@ -0,0 +1,96 @@
+# backend/bench/bench_asr.py
+"""
+Lyrics transcription real-time factor on CPU: the full-track path vs the
+VAD-gated, int8 path (karaoke.karaoke.transcribe_words).
+
+Each config ("<asr mode>:<compute type>") runs in its own spawned process
+with KARAOKE_WHISPER_THREADS set. Reported per config: model load time,
+RTF (transcribe + align seconds / audio seconds), words found, and the
+median word start-time difference against the first config, matched by
+word text in order.
+
+    cd backend && python -m bench.bench_asr --vocals temp_karaoke/vocals.wav
+    cd backend && python -m bench.bench_asr --vocals v.wav --configs full:float32 full:int8 vad:int8 --threads 8
+"""
+import os
+import time
+import argparse
+import difflib
+import multiprocessing as mp
+
+from bench.common import git_commit, write_results, percentile
+
+
+def run_config(config, vocals, threads, repeat):
+    os.environ["KARAOKE_WHISPER_THREADS"] = str(threads)
+    asr_mode, compute_type = config.split(":")
+    import torch
+    import soundfile as sf
+    from karaoke import karaoke
+
+    torch.set_num_threads(threads)
+    seconds = sf.info(vocals).duration
+
+    start = time.perf_counter()
+    karaoke.registry.warm([karaoke.whisper_model("cpu", compute_type), karaoke.align_model("cpu")])
+    load_s = time.perf_counter() - start
+
+    walls = []
+    for _ in range(repeat):
+        w0 = time.perf_counter()
+        words = karaoke.transcribe_words(vocals, "cpu", asr_mode=asr_mode, compute_type=compute_type)
+        walls.append(time.perf_counter() - w0)
+
+    return {
+        "config": config,
+        "threads": threads,
+        "audio_s": round(seconds, 1),
+        "load_s": round(load_s, 2),
+        "wall_s": round(min(walls), 2),
+        "rtf": round(min(walls) / seconds, 4),
+        "words": [(w.get("word", ""), w.get("start")) for w in words],
+    }
+
+
+def start_drift(base, other):
+    """Median |Δstart| over words both runs agree on (same text, in order)."""
+    a = [w.strip().lower() for w, _ in base]
+    b = [w.strip().lower() for w, _ in other]
+    diffs = []
+    for block in difflib.SequenceMatcher(None, a, b, autojunk=False).get_matching_blocks():
+        for k in range(block.size):
+            s0, s1 = base[block.a + k][1], other[block.b + k][1]
+            if s0 is not None and s1 is not None:
+                diffs.append(abs(s0 - s1))
+    return (round(percentile(sorted(diffs), 50), 3) if diffs else None), len(diffs)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="CPU lyrics transcription RTF: full vs VAD-gated int8")
+    ap.add_argument("--vocals", required=True, help="a separated vocal stem")
+    ap.add_argument("--configs", nargs="+", default=["full:float32", "full:int8", "vad:int8"],
+                    help="<full|vad>:<compute type>; the first one is the reference")
+    ap.add_argument("--threads", type=int, default=os.cpu_count() or 4)
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--out", default="bench/results/asr.json")
+    args = ap.parse_args()
+
+    runs = []
+    ctx = mp.get_context("spawn")
+    for config in args.configs:
+        with ctx.Pool(1) as pool:
+            r = pool.apply(run_config, (config, args.vocals, args.threads, args.repeat))
+        base = runs[0]["words"] if runs else r["words"]
+        r["median_start_diff_s"], r["matched_words"] = start_drift(base, r["words"])
+        runs.append(r)
+        print(f"{config:<14} load {r['load_s']:>6.2f}s  wall {r['wall_s']:>7.2f}s  RTF {r['rtf']:.3f}  "
+              f"words {len(r['words']):>4}  matched {r['matched_words']:>4}  "
+              f"median Δstart {r['median_start_diff_s']}s")
+
+    for r in runs:
+        r["words"] = len(r["words"])
+    write_results(args.out, {"commit": git_commit(), "vocals": args.vocals, "runs": runs})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# backend/bench/bench_codec.py
+"""
+Encode CPU time and bytes-on-the-wire for room payloads, JSON vs msgpack.
+
+    cd backend && python -m bench.bench_codec --songs 50 --users 200
+"""
+import sys
+import json
+import time
+import argparse
+
+from bench.common import write_results
+import socket_codec
+
+
+def build_payloads(n_songs, n_users):
+    leaderboard = [
+        {
+            "id": i,
+            "name": f"Song Title Number {i}",
+            "artist": f"Artist {i % 17}",
+            "votes": (n_songs - i) % 9,
+            "submitted_by": f"listener_{i % n_users}",
+            "db_song_id": 1000 + i,
+        }
+        for i in range(n_songs)
+    ]
+    current = dict(leaderboard[0], audio_url=f"/play/{leaderboard[0]['db_song_id']}", position=42.0)
+    return {
+        "leaderboard": leaderboard,
+        "user_list": [f"listener_{i}" for i in range(n_users)],
+        "current_song": current,
+        "progress": {"time": 123},
+    }
+
+
+def time_it(fn, data, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        out = fn(data)
+    return (time.perf_counter() - start) / rounds * 1e6, out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--songs", type=int, default=50)
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--rounds", type=int, default=2000)
+    ap.add_argument("--out", help="write results as JSON to this path")
+    args = ap.parse_args()
+
+    if socket_codec.msgpack is None:
+        sys.exit("msgpack is not installed (pip install msgpack)")
+
+    def to_json(d):
+        return json.dumps(d, separators=(",", ":")).encode("utf-8")
+
+    results = []
+    print(f"{'event':<14}{'json B':>9}{'mpk B':>9}{'ratio':>7}{'json us':>10}{'mpk us':>10}")
+    for event, data in build_payloads(args.songs, args.users).items():
+        json_us, json_raw = time_it(to_json, data, args.rounds)
+        mp_us, mp_raw = time_it(socket_codec.encode, data, args.rounds)
+        assert socket_codec.decode(mp_raw) == data, f"{event} did not round-trip"
+        row = {
+            "event": event,
+            "json_bytes": len(json_raw),
+            "msgpack_bytes": len(mp_raw),
+            "json_encode_us": round(json_us, 2),
+            "msgpack_encode_us": round(mp_us, 2),
+        }
+        results.append(row)
+        print(f"{event:<14}{row['json_bytes']:>9}{row['msgpack_bytes']:>9}"
+              f"{row['msgpack_bytes'] / row['json_bytes']:>7.2f}"
+              f"{row['json_encode_us']:>10.1f}{row['msgpack_encode_us']:>10.1f}")
+
+    if args.out:
+        write_results(args.out, {"songs": args.songs, "users": args.users, "results": results})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# backend/bench/bench_drive_transfer.py
+"""
+Karaoke job Drive I/O: the old sequential transfers vs karaoke.transfer.DriveTransfers.
+
+Against a local fake Drive with per-request latency and per-connection
+bandwidth, each job downloads one source file and uploads three outputs
+(vocals, accompaniment, lyrics) with a public permission each:
+
+  sequential  default MediaIoBaseDownload, one-shot MediaFileUpload per file,
+              one after the other, then a permissions call each
+  manager     DriveTransfers: large chunks, resumable uploads with retries,
+              the three uploads + permissions concurrently
+
+--fail-every N answers every Nth upload chunk with 503 to show that
+resumable uploads ride out transient failures (sequential is not run then).
+
+    cd backend && python -m bench.bench_drive_transfer
+    cd backend && python -m bench.bench_drive_transfer --latency-ms 120 --mbps 40 --stem-mb 72
+    cd backend && python -m bench.bench_drive_transfer --fail-every 3 --chunk-mb 1
+"""
+import os
+import io
+import time
+import argparse
+import tempfile
+import shutil
+
+import httplib2
+from googleapiclient.discovery import build
+from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
+
+from bench.common import summarize, git_commit, write_results
+from bench import fake_drive
+from karaoke.transfer import DriveTransfers
+
+
+class _LocalHttp(httplib2.Http):
+    # googleapiclient keeps https:// for media upload URLs even with an
+    # http:// api_endpoint; the fake Drive only speaks plain HTTP
+    def request(self, uri, *args, **kwargs):
+        return super().request(uri.replace("https://127.0.0.1", "http://127.0.0.1"), *args, **kwargs)
+
+
+def service_factory(base_url):
+    def make():
+        http = _LocalHttp(timeout=60)
+        http.redirect_codes = http.redirect_codes - {308}  # resumable "incomplete", as in googleapiclient
+        return build("drive", "v3", http=http, static_discovery=True,
+                     client_options={"api_endpoint": base_url + "/"})
+    return make
+
+
+def sequential_job(svc, file_id, workdir, outputs):
+    request = svc.files().get_media(fileId=file_id)
+    with io.FileIO(os.path.join(workdir, "input"), "wb") as fh:
+        downloader = MediaIoBaseDownload(fh, request)
+        done = False
+        while not done:
+            _, done = downloader.next_chunk()
+    for path, mime in outputs:
+        media = MediaFileUpload(path, mimetype=mime)
+        file_id = svc.files().create(body={"name": os.path.basename(path), "parents": ["bench"]},
+                                     media_body=media, fields="id").execute()["id"]
+        svc.permissions().create(fileId=file_id, body={"role": "reader", "type": "anyone"}).execute()
+
+
+def manager_job(transfers, file_id, workdir, outputs):
+    transfers.download(file_id, os.path.join(workdir, "input"))
+    transfers.upload_many([(path, os.path.basename(path), "bench", mime) for path, mime in outputs])
+
+
+def make_outputs(workdir, stem_mb):
+    outputs = []
+    for name, size, mime in (("vocals.mp3", stem_mb, "audio/mpeg"),
+                             ("accompaniment.mp3", stem_mb, "audio/mpeg"),
+                             ("lyrics.json", 0.05, "application/json")):
+        path = os.path.join(workdir, name)
+        with open(path, "wb") as f:
+            f.write(os.urandom(int(size * 1e6)))
+        outputs.append((path, mime))
+    return outputs
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Karaoke job Drive I/O: sequential vs transfer manager")
+    ap.add_argument("--jobs", type=int, default=5)
+    ap.add_argument("--stem-mb", type=float, default=3.5, help="size of each uploaded stem")
+    ap.add_argument("--latency-ms", type=float, default=80, help="added per request")
+    ap.add_argument("--mbps", type=float, default=50, help="per-connection bandwidth")
+    ap.add_argument("--chunk-mb", type=int, default=16)
+    ap.add_argument("--fail-every", type=int, default=0)
+    ap.add_argument("--compute-s", type=float, default=120,
+                    help="separation + alignment time per job, for the I/O share")
+    ap.add_argument("--out", default="bench/results/drive_transfer.json")
+    args = ap.parse_args()
+
+    server, base_url = fake_drive.start(latency=args.latency_ms / 1000, mbps=args.mbps,
+                                        fail_every=args.fail_every)
+    workdir = tempfile.mkdtemp(prefix="karaoke-drive-")
+    factory = service_factory(base_url)
+    modes = {"manager": DriveTransfers(factory, chunk_mb=args.chunk_mb)}
+    if not args.fail_every:
+        svc = factory()
+        modes = {"sequential": svc, **modes}
+
+    report = {"commit": git_commit(), "config": vars(args), "modes": {}}
+    try:
+        outputs = make_outputs(workdir, args.stem_mb)
+        for mode, client in modes.items():
+            job = sequential_job if mode == "sequential" else manager_job
+            times = []
+            for i in range(args.jobs):
+                start = time.perf_counter()
+                job(client, f"fake-{i}", workdir, outputs)
+                times.append(time.perf_counter() - start)
+            stats = summarize(times)
+            share = stats["p50"] / (stats["p50"] + args.compute_s)
+            report["modes"][mode] = dict(stats, io_share=round(share, 3))
+            print(f"{mode:<11} I/O per job p50 {stats['p50']:>6.2f}s  max {stats['max']:>6.2f}s  "
+                  f"({share:.1%} of a {args.compute_s:g}s job)")
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    write_results(args.out, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# backend/bench/bench_encode.py
+"""
+Stem encoding: size and time of each published format against the WAV stems.
+
+Decodes the input to the same float WAV the separator writes, then encodes
+it with karaoke.encode for every format, reporting bytes, the reduction
+against WAV, encode time (as a multiple of real time), and the upload time
+at --uplink-mbps.
+
+    cd backend && python -m bench.bench_encode
+    cd backend && python -m bench.bench_encode --input "temp/No Doctor.mp3" --bitrate 96k
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+import soundfile as sf
+
+from bench.common import git_commit, write_results
+from karaoke import encode
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compressed stem size / encode time")
+    ap.add_argument("--input", default="temp/No Doctor.mp3")
+    ap.add_argument("--formats", nargs="+", default=["mp3", "m4a", "opus"])
+    ap.add_argument("--bitrate", default=encode.STEM_BITRATE)
+    ap.add_argument("--uplink-mbps", type=float, default=20, help="for the upload time estimate")
+    ap.add_argument("--out", default="bench/results/encode.json")
+    args = ap.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="karaoke-encode-")
+    try:
+        wav = os.path.join(workdir, "stem.wav")
+        try:
+            data, sr = sf.read(args.input, dtype="float32", always_2d=True)
+            sf.write(wav, data, sr, subtype="FLOAT")
+        except RuntimeError:
+            subprocess.run(["ffmpeg", "-nostdin", "-loglevel", "error", "-y", "-i", args.input,
+                            "-c:a", "pcm_f32le", wav], check=True)
+        seconds = sf.info(wav).duration
+        wav_bytes = os.path.getsize(wav)
+
+        def row(fmt, path, elapsed):
+            size = os.path.getsize(path)
+            return {
+                "format": fmt,
+                "bytes": size,
+                "reduction": round(wav_bytes / size, 1),
+                "encode_x_realtime": round(seconds / elapsed, 1) if elapsed else None,
+                "upload_s": round(size * 8 / (args.uplink_mbps * 1e6), 2),
+            }
+
+        runs = [row("wav", wav, 0)]
+        for fmt in args.formats:
+            src = os.path.join(workdir, f"{fmt}.wav")
+            shutil.copy(wav, src)
+            start = time.perf_counter()
+            path = encode.encode(src, fmt, args.bitrate)
+            runs.append(row(fmt, path, time.perf_counter() - start))
+
+        for r in runs:
+            speed = f"{r['encode_x_realtime']:>6.1f}x realtime" if r["encode_x_realtime"] else " " * 15
+            print(f"{r['format']:<5} {r['bytes'] / 1e6:>8.2f} MB  {r['reduction']:>5.1f}x smaller  "
+                  f"{speed}  upload {r['upload_s']:>6.2f}s @ {args.uplink_mbps:g} Mbit/s")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    write_results(args.out, {"commit": git_commit(), "input": args.input, "audio_seconds": round(seconds, 1),
+                             "bitrate": args.bitrate, "runs": runs})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+# backend/bench/bench_http.py
+"""
+HTTP endpoint benchmarks against local Drive and MySQL stand-ins.
+
+Runs main.app under uvicorn in a child process with:
+  - execute_read_query backed by a seeded SQLite catalog (fake_catalog)
+  - DRIVE_API_BASE pointed at a local fake Drive serving backend/temp (fake_drive)
+
+then hammers /play/{id} (full and Range), /artists, /albums, /songs and
+/autopath_recommend at a fixed concurrency, reporting throughput, TTFB and
+total latency percentiles per endpoint.
+
+Compare against an earlier run and fail (exit 1) on regressions:
+
+    cd backend
+    python -m bench.bench_http --out bench/results/http_base.json
+    python -m bench.bench_http --baseline bench/results/http_base.json --max-p99-regression 0.25
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+import contextlib
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from bench.common import summarize, git_commit, write_results, free_port, wait_for_port
+
+RANGE_BYTES = 64 * 1024
+
+
+def _server_main(port, n_songs, quiet):
+    import uvicorn
+    import main
+    from bench import fake_catalog
+    from bench import fake_drive
+
+    fake_catalog.install(main, n_songs=n_songs)
+    _, drive_base = fake_drive.start()
+    main.DRIVE_API_BASE = drive_base
+    main.get_drive_access_token = lambda: "bench-token"
+
+    out = open(os.devnull, "w") if quiet else sys.stdout
+    with contextlib.redirect_stdout(out):
+        uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def build_scenarios(n_songs, seed):
+    """(name, method, path-factory, kwargs-factory) for each endpoint under test."""
+    from bench import fake_catalog
+
+    conn = fake_catalog.build(n_songs=n_songs)
+    pairs = [(r["artist_name"], r["album_name"]) for r in conn.execute(
+        "SELECT DISTINCT artist_name, album_name FROM songs")]
+    song_ids = [r["id"] for r in conn.execute("SELECT id FROM songs")]
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def pick(seq):
+        with lock:
+            return rng.choice(seq)
+
+    def album_path():
+        artist, album = pick(pairs)
+        return f"/songs/{artist}/{album}"
+
+    return [
+        ("play_full", "GET", lambda: f"/play/{pick(song_ids)}", lambda: {}),
+        ("play_range", "GET", lambda: f"/play/{pick(song_ids)}",
+         lambda: {"headers": {"Range": f"bytes=0-{RANGE_BYTES - 1}"}}),
+        ("artists", "GET", lambda: "/artists", lambda: {}),
+        ("albums", "GET", lambda: f"/albums/{pick(pairs)[0]}", lambda: {}),
+        ("songs", "GET", album_path, lambda: {}),
+        ("autopath_recommend", "POST", lambda: "/autopath_recommend",
+         lambda: {"json": {"song_id": pick(song_ids)}}),
+    ]
+
+
+def run_scenario(base_url, scenario, n_requests, concurrency):
+    name, method, path_fn, kwargs_fn = scenario
+    local = threading.local()
+    ttfb, total, errors, nbytes = [], [], [], [0]
+    record = threading.Lock()
+
+    def one(_):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            with session.request(method, base_url + path_fn(), stream=True, timeout=30, **kwargs_fn()) as resp:
+                chunks = resp.iter_content(64 * 1024)
+                first = next(chunks, b"")
+                first_at = time.perf_counter()
+                size = len(first) + sum(len(c) for c in chunks)
+                done_at = time.perf_counter()
+                ok = resp.status_code < 400
+        except requests.RequestException:
+            ok, size = False, 0
+            first_at = done_at = time.perf_counter()
+        with record:
+            if ok:
+                ttfb.append(first_at - start)
+                total.append(done_at - start)
+                nbytes[0] += size
+            else:
+                errors.append(1)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(n_requests)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": n_requests,
+        "errors": len(errors),
+        "throughput_rps": round(len(total) / elapsed, 1),
+        "mb_per_s": round(nbytes[0] / elapsed / 1e6, 2),
+        "ttfb_ms": summarize(ttfb, scale=1000),
+        "latency_ms": summarize(total, scale=1000),
+    }
+
+
+def check_regressions(results, baseline, max_p99, max_tput):
+    """Human-readable failures where `results` is worse than `baseline`."""
+    failures = []
+    for name, cur in results["endpoints"].items():
+        base = baseline.get("endpoints", {}).get(name)
+        if not base:
+            continue
+        if cur["errors"] > base["errors"]:
+            failures.append(f"{name}: errors {base['errors']} -> {cur['errors']}")
+        for metric in ("ttfb_ms", "latency_ms"):
+            b, c = base[metric].get("p99"), cur[metric].get("p99")
+            if b and c and c > b * (1 + max_p99):
+                failures.append(f"{name}: {metric} p99 {b:.1f} -> {c:.1f} (> +{max_p99:.0%})")
+        b, c = base["throughput_rps"], cur["throughput_rps"]
+        if b and c < b * (1 - max_tput):
+            failures.append(f"{name}: throughput {b:.1f} -> {c:.1f} rps (> -{max_tput:.0%})")
+    return failures
+
+
+def main():
+    import json
+
+    ap = argparse.ArgumentParser(description="HTTP endpoint benchmarks with local Drive/MySQL stand-ins")
+    ap.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--songs", type=int, default=2000, help="synthetic catalog size")
+    ap.add_argument("--only", nargs="*", help="endpoint names to run")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--url", help="target an already running server instead of spawning one")
+    ap.add_argument("--out", default="bench/results/http.json")
+    ap.add_argument("--baseline", help="earlier results file to compare against")
+    ap.add_argument("--max-p99-regression", type=float, default=0.25,
+                    help="allowed relative p99 increase before failing")
+    ap.add_argument("--max-throughput-drop", type=float, default=0.20,
+                    help="allowed relative throughput drop before failing")
+    ap.add_argument("--verbose", action="store_true", help="keep server prints")
+    args = ap.parse_args()
+
+    proc = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        port = free_port()
+        proc = mp.get_context("spawn").Process(
+            target=_server_main, args=(port, args.songs, not args.verbose), daemon=True)
+        proc.start()
+        wait_for_port(port)
+        base_url = f"http://127.0.0.1:{port}"
+
+    endpoints = {}
+    try:
+        for scenario in build_scenarios(args.songs, args.seed):
+            if args.only and scenario[0] not in args.only:
+                continue
+            run_scenario(base_url, scenario, min(args.concurrency, args.requests), args.concurrency)  # warm-up
+            endpoints[scenario[0]] = run_scenario(base_url, scenario, args.requests, args.concurrency)
+            r = endpoints[scenario[0]]
+            print(f"{scenario[0]:<20}{r['throughput_rps']:>9.1f} rps"
+                  f"  ttfb p50 {r['ttfb_ms'].get('p50')} p99 {r['ttfb_ms'].get('p99')} ms"
+                  f"  total p99 {r['latency_ms'].get('p99')} ms  errors {r['errors']}")
+    finally:
+        if proc:
+            proc.terminate()
+            proc.join(timeout=10)
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "config": {k: v for k, v in vars(args).items()
+                   if k in ("requests", "concurrency", "songs", "seed", "url")},
+        "endpoints": endpoints,
+    }
+    write_results(args.out, results)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        failures = check_regressions(results, baseline, args.max_p99_regression, args.max_throughput_drop)
+        for line in failures:
+            print("REGRESSION", line)
+        if failures:
+            sys.exit(1)
+        print("no regressions against", args.baseline)
+
+
+if __name__ == "__main__":
+    main()
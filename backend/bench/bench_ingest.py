@@ -0,0 +1,43 @@
+# backend/bench/bench_ingest.py
+"""
+Ingest listing + probe throughput against the local Drive stand-in.
+
+Runs ingest.run in dry-run mode (no DB writes) over a fake folder of
+--files tracks, served with --latency seconds per request, once per
+--workers value, and reports files/second. Needs ffprobe on PATH.
+
+    cd backend && python -m bench.bench_ingest
+    cd backend && python -m bench.bench_ingest --files 2000 --latency 0.05 --workers 1 8 32
+"""
+import argparse
+
+from bench.common import git_commit, write_results
+from bench import fake_drive
+import ingest
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Ingest listing + probe throughput")
+    ap.add_argument("--files", type=int, default=300)
+    ap.add_argument("--latency", type=float, default=0.02, help="fake Drive seconds per request")
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    ap.add_argument("--out", default="bench/results/ingest.json")
+    args = ap.parse_args()
+
+    server, base = fake_drive.start(latency=args.latency, listing=args.files)
+    report = {"commit": git_commit(), "files": args.files, "latency_s": args.latency, "runs": []}
+    try:
+        for workers in args.workers:
+            summary = ingest.run(["bench-folder"], lambda: "bench-token", lambda: base, None, None,
+                                 dry_run=True, workers=workers, log=lambda *_: None)
+            report["runs"].append({"workers": workers, "probed": summary["probed"], "failed": summary["failed"],
+                                   "seconds": summary["seconds"], "files_per_second": summary["files_per_second"]})
+            print(f"workers={workers:<3} {summary['probed']} probed, {summary['failed']} failed in "
+                  f"{summary['seconds']}s  ({summary['files_per_second']} files/s)")
+    finally:
+        server.shutdown()
+    write_results(args.out, report)
+
+
+if __name__ == "__main__":
+    main()
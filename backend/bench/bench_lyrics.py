@@ -0,0 +1,88 @@
+# backend/bench/bench_lyrics.py
+"""
+Lyrics payload size and active-word lookup cost.
+
+Sizes: the stored pretty-printed JSON, the same data as compact JSON, the
+columnar /lyrics encoding, each raw and gzip'd, and one ?t= window.
+Lookups: the frontend's scan over every line and word per animation
+frame vs a binary search over the columnar start times, at evenly spaced
+playback times.
+
+    cd backend && python -m bench.bench_lyrics
+    cd backend && python -m bench.bench_lyrics --input temp/Color_Out_-_Host_lyrics.json --repeat 20
+"""
+import json
+import gzip
+import time
+import argparse
+from bisect import bisect_right
+
+from bench.common import git_commit, write_results
+from lyrics_index import LyricsIndex
+
+
+def scan(lines, t):
+    # karaoke.jsx: first word whose [start, end] contains t
+    for i, line in enumerate(lines):
+        for j, w in enumerate(line):
+            if w["start"] <= t <= w["end"]:
+                return i, j
+    return -1, -1
+
+
+def search(doc, t):
+    ms = t * 1000
+    k = bisect_right(doc["start"], ms) - 1
+    if k < 0 or ms > doc["end"][k]:
+        return -1
+    return k
+
+
+def sizes(data, raw_file):
+    doc = LyricsIndex.from_json(data).encode()
+    window = LyricsIndex.from_json(data).window(data["lines"][len(data["lines"]) // 2][0]["start"])
+    forms = {
+        "stored": raw_file,
+        "compact_json": json.dumps(data, separators=(",", ":")).encode(),
+        "columnar": json.dumps(doc, separators=(",", ":")).encode(),
+        "window": json.dumps(window, separators=(",", ":")).encode(),
+    }
+    return {name: {"bytes": len(b), "gzip": len(gzip.compress(b, 6))} for name, b in forms.items()}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Lyrics payload size and lookup cost")
+    ap.add_argument("--input", default="temp/Color_Out_-_Host_lyrics.json")
+    ap.add_argument("--frames", type=int, default=10000, help="playback times looked up per round")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--out", default="bench/results/lyrics.json")
+    args = ap.parse_args()
+
+    with open(args.input, "rb") as f:
+        raw_file = f.read()
+    data = json.loads(raw_file)
+    lines = data["lines"]
+    doc = LyricsIndex.from_json(data).encode()
+    end = lines[-1][-1]["end"] + 5
+    times = [end * i / args.frames for i in range(args.frames)]
+
+    report = {"commit": git_commit(), "input": args.input, "words": len(doc["w"]),
+              "sizes": sizes(data, raw_file), "lookup_us": {}}
+    for name, fn, arg in (("scan", scan, lines), ("bisect", search, doc)):
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for t in times:
+                fn(arg, t)
+            best = min(best, time.perf_counter() - start)
+        report["lookup_us"][name] = round(best / len(times) * 1e6, 3)
+
+    for name, s in report["sizes"].items():
+        print(f"{name:<13} {s['bytes']:>7} B   gzip {s['gzip']:>6} B")
+    print(f"lookup per frame ({report['words']} words): scan {report['lookup_us']['scan']}us  "
+          f"bisect {report['lookup_us']['bisect']}us")
+    write_results(args.out, report)
+
+
+if __name__ == "__main__":
+    main()
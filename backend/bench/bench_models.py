@@ -0,0 +1,91 @@
+# backend/bench/bench_models.py
+"""
+Per-song model overhead with and without the process-wide model registry.
+
+"cold" reloads Demucs, WhisperX and the alignment model for every song
+(what the pipeline used to do); "registry" loads them once and then only
+borrows them. With --audio the separation and alignment stages are run
+too, so the overhead can be compared with the real per-song work.
+
+--fake-load replaces the loaders with a sleep of that many seconds (no ML
+stack needed) and adds "pressure": the registry on a simulated machine
+where every model fits, but free RAM is below KARAOKE_MIN_FREE_MB once
+all of them are resident.
+
+    cd backend && python -m bench.bench_models --songs 3 --audio "temp/No Doctor.mp3"
+    cd backend && python -m bench.bench_models --songs 5 --fake-load 2
+"""
+import time
+import argparse
+
+from bench.common import summarize, git_commit, write_results
+
+FAKE_MODEL_MB = 1000
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Model load overhead per song, cold vs registry")
+    ap.add_argument("--songs", type=int, default=3)
+    ap.add_argument("--device", help="cpu / cuda (default: auto)")
+    ap.add_argument("--audio", help="also run separation + alignment on this file")
+    ap.add_argument("--fake-load", type=float, help="stand-in loaders that take this many seconds")
+    ap.add_argument("--out", default="bench/results/models.json")
+    args = ap.parse_args()
+
+    from karaoke import karaoke
+    from karaoke import models
+    from karaoke.models import registry
+
+    device = args.device or karaoke.default_device()
+    keys = [karaoke.demucs_model(device), karaoke.whisper_model(device), karaoke.align_model(device)]
+    modes = ["cold", "registry"]
+    if args.fake_load is not None:
+        for key in keys:
+            registry.register(key, lambda: time.sleep(args.fake_load) or object())
+        ram_mb = FAKE_MODEL_MB * (len(keys) + 1)
+        models.available_ram_mb = lambda: ram_mb - FAKE_MODEL_MB * len(registry._entries)
+        modes.append("pressure")
+
+    def one_song():
+        start = time.perf_counter()
+        for key in keys:
+            with registry.use(key):
+                pass
+        overhead = time.perf_counter() - start
+        work = 0.0
+        if args.audio:
+            start = time.perf_counter()
+            with karaoke.job_workdir() as workdir:
+                vocals, _ = karaoke.demucs_separate(args.audio, device, workdir)
+                karaoke.align_lyrics_whisperx(vocals, device, workdir)
+            work = time.perf_counter() - start
+        return overhead, work
+
+    results = {"commit": git_commit(), "device": device, "songs": args.songs,
+               "fake_load_s": args.fake_load, "modes": {}}
+    min_free_mb = registry.min_free_mb
+    for mode in modes:
+        registry.clear()
+        registry.min_free_mb = int(FAKE_MODEL_MB * 1.5) if mode == "pressure" else min_free_mb
+        overheads, works = [], []
+        for _ in range(args.songs):
+            if mode == "cold":
+                registry.clear()
+            overhead, work = one_song()
+            overheads.append(overhead)
+            works.append(work)
+        results["modes"][mode] = {
+            "model_overhead_s": summarize(overheads),
+            "stage_work_s": summarize(works) if args.audio else None,
+            "total_s": round(sum(overheads) + sum(works), 2),
+        }
+        print(f"{mode:<9} per-song model overhead p50 {results['modes'][mode]['model_overhead_s']['p50']:.3f}s"
+              f"  total {results['modes'][mode]['total_s']}s")
+
+    results["registry"] = registry.stats()
+    registry.min_free_mb = min_free_mb
+    write_results(args.out, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# backend/bench/bench_parallel_jobs.py
+"""
+Concurrent karaoke renders in a process pool: isolation check + songs/hour.
+
+Each job gets a distinct synthetic input (a different tone per job) and
+runs karaoke.render_karaoke inside its own job_workdir(). The check
+fails unless every job ended up in its own directory and its outputs
+came from its own input. Throughput is reported for each --workers value.
+
+    cd backend && python -m bench.bench_parallel_jobs --jobs 8 --workers 1 4
+    cd backend && python -m bench.bench_parallel_jobs --fake-models   # no torch/whisperx needed
+"""
+import os
+import sys
+import json
+import time
+import wave
+import shutil
+import hashlib
+import argparse
+import tempfile
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from bench.common import git_commit, write_results
+
+SAMPLE_RATE = 44100
+
+
+def synth_input(path, idx, seconds):
+    """Stereo WAV with a tone that is unique to job `idx`."""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    tone = 0.3 * np.sin(2 * np.pi * (220 + 7 * idx) * t)
+    pcm = (np.stack([tone, tone], axis=1) * 32767).astype("<i2")
+    with wave.open(path, "wb") as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(SAMPLE_RATE)
+        w.writeframes(pcm.tobytes())
+
+
+def digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _install_fake_models(karaoke, seconds):
+    """Cheap stand-ins that still read the job's input and write into its workdir."""
+    def demucs_separate(audio_path, device, workdir, **kwargs):
+        time.sleep(seconds)
+        vocals = os.path.join(workdir, "vocals.wav")
+        accomp = os.path.join(workdir, "accompaniment.wav")
+        shutil.copy(audio_path, vocals)
+        shutil.copy(audio_path, accomp)
+        return vocals, accomp
+
+    def align_lyrics_whisperx(vocals_path, device, workdir):
+        time.sleep(seconds / 2)
+        lines = [[{"text": digest(vocals_path)[:16], "start": 0.0, "end": 1.0}]]
+        path = os.path.join(workdir, "lyrics.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"lines": lines}, f)
+        return path, lines
+
+    karaoke.demucs_separate = demucs_separate
+    karaoke.align_lyrics_whisperx = align_lyrics_whisperx
+
+
+def render_one(idx, src, device, fake_seconds):
+    from karaoke import karaoke
+
+    if fake_seconds is not None:
+        _install_fake_models(karaoke, fake_seconds)
+
+    start = time.perf_counter()
+    with karaoke.job_workdir() as workdir:
+        input_path = workdir / "input.wav"
+        shutil.copy(src, input_path)
+        out = karaoke.render_karaoke(input_path, device or karaoke.default_device(), workdir)
+        files = {k: out[k] for k in ("vocals_path", "accompaniment_path", "lyrics_path")}
+        return {
+            "idx": idx,
+            "workdir": str(workdir),
+            "in_workdir": all(os.path.dirname(p) == str(workdir) for p in files.values()),
+            "input": digest(input_path),
+            "outputs": {k: digest(p) for k, p in files.items()},
+            "lyrics_head": out["lines"][0][0]["text"] if out["lines"] and out["lines"][0] else None,
+            "seconds": time.perf_counter() - start,
+        }
+
+
+def check_isolation(results, fake):
+    problems = []
+    if len({r["workdir"] for r in results}) != len(results):
+        problems.append("jobs shared a work directory")
+    for r in results:
+        if not r["in_workdir"]:
+            problems.append(f"job {r['idx']} wrote outside its work directory")
+        if fake and r["lyrics_head"] != r["input"][:16]:
+            problems.append(f"job {r['idx']} aligned someone else's vocals")
+    for key in ("vocals_path", "accompaniment_path"):
+        if len({r["outputs"][key] for r in results}) != len(results):
+            problems.append(f"{key} outputs collide between jobs")
+    return problems
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Parallel karaoke render isolation + throughput")
+    ap.add_argument("--jobs", type=int, default=8)
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, max(2, os.cpu_count() // 2)])
+    ap.add_argument("--seconds", type=float, default=20, help="length of each synthetic input")
+    ap.add_argument("--device", help="cpu / cuda (default: auto)")
+    ap.add_argument("--fake-models", action="store_true",
+                    help="replace Demucs/WhisperX with cheap stand-ins (isolation check only)")
+    ap.add_argument("--fake-seconds", type=float, default=0.5, help="simulated stage time with --fake-models")
+    ap.add_argument("--out", default="bench/results/parallel_jobs.json")
+    args = ap.parse_args()
+
+    fake_seconds = args.fake_seconds if args.fake_models else None
+    src_dir = tempfile.mkdtemp(prefix="karaoke-bench-")
+    inputs = []
+    for i in range(args.jobs):
+        path = os.path.join(src_dir, f"input_{i}.wav")
+        synth_input(path, i, args.seconds)
+        inputs.append(path)
+
+    report = {"commit": git_commit(), "jobs": args.jobs, "audio_seconds": args.seconds,
+              "fake_models": args.fake_models, "runs": []}
+    failed = False
+    try:
+        for workers in args.workers:
+            start = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) as pool:
+                futures = [pool.submit(render_one, i, p, args.device, fake_seconds) for i, p in enumerate(inputs)]
+                results = [f.result() for f in futures]
+            elapsed = time.perf_counter() - start
+
+            problems = check_isolation(results, args.fake_models)
+            failed = failed or bool(problems)
+            run = {
+                "workers": workers,
+                "elapsed_s": round(elapsed, 2),
+                "songs_per_hour": round(args.jobs / elapsed * 3600, 1),
+                "isolation_ok": not problems,
+                "problems": problems,
+            }
+            report["runs"].append(run)
+            print(f"workers={workers:<3} {run['songs_per_hour']:>9.1f} songs/hour  "
+                  f"isolation {'OK' if not problems else 'FAILED: ' + '; '.join(problems)}")
+    finally:
+        shutil.rmtree(src_dir, ignore_errors=True)
+
+    write_results(args.out, report)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# backend/bench/bench_separation.py
+"""
+Separation cost per minute of audio: "quality" (Demucs mdx_extra) vs "fast" (Demucs htdemucs).
+
+Each mode runs in its own spawned process so model memory does not leak
+between them. Reported per mode: model load time, CPU seconds and wall
+seconds per minute of audio, and the process's peak RSS.
+
+    cd backend && python -m bench.bench_separation
+    cd backend && python -m bench.bench_separation --input "temp/No Doctor.mp3" --device cpu --repeat 2
+"""
+import os
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import multiprocessing as mp
+
+from bench.common import git_commit, write_results
+
+
+def _peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def run_mode(mode, input_path, device, repeat, streaming):
+    os.environ["KARAOKE_STREAM_SEPARATION"] = streaming
+    import soundfile as sf
+    from karaoke import karaoke
+
+    device = device or karaoke.default_device()
+    minutes = sf.info(input_path).duration / 60
+
+    start = time.perf_counter()
+    with karaoke.separator(mode, device):
+        pass
+    load_s = time.perf_counter() - start
+    backend = [e["key"] for e in karaoke.registry.stats()["resident"]]
+
+    cpu, wall = [], []
+    for _ in range(repeat):
+        workdir = tempfile.mkdtemp(prefix="karaoke-sep-")
+        try:
+            c0, w0 = time.process_time(), time.perf_counter()
+            karaoke.demucs_separate(input_path, device, workdir, mode=mode)
+            cpu.append(time.process_time() - c0)
+            wall.append(time.perf_counter() - w0)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "mode": mode,
+        "backend": backend,
+        "device": device,
+        "audio_minutes": round(minutes, 2),
+        "load_s": round(load_s, 2),
+        "cpu_s_per_min": round(min(cpu) / minutes, 2),
+        "wall_s_per_min": round(min(wall) / minutes, 2),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Separation CPU time / memory per minute of audio")
+    ap.add_argument("--input", default="temp/No Doctor.mp3")
+    ap.add_argument("--modes", nargs="+", default=["quality", "fast"])
+    ap.add_argument("--device", help="cpu / cuda (default: auto)")
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--streaming", choices=["auto", "1", "0"], default="auto",
+                    help="KARAOKE_STREAM_SEPARATION for the run")
+    ap.add_argument("--out", default="bench/results/separation.json")
+    args = ap.parse_args()
+
+    runs = []
+    ctx = mp.get_context("spawn")
+    for mode in args.modes:
+        # fresh process per mode: peak RSS and load time are not shared
+        with ctx.Pool(1) as pool:
+            r = pool.apply(run_mode, (mode, args.input, args.device, args.repeat, args.streaming))
+        runs.append(r)
+        print(f"{mode:<8} {','.join(r['backend']):<40} load {r['load_s']:>6.2f}s  "
+              f"cpu {r['cpu_s_per_min']:>7.2f}s/min  wall {r['wall_s_per_min']:>7.2f}s/min  "
+              f"peak RSS {r['peak_rss_mb']:>8.1f} MB")
+
+    write_results(args.out, {"commit": git_commit(), "input": args.input, "runs": runs})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# backend/bench/bench_startup.py
+"""
+Backend cold-start time.
+
+For each run, in fresh interpreters:
+  import_s     python -c "import main"
+  ready_s      launch uvicorn → first 200 from /ready (streaming/chat API up)
+  karaoke_s    launch → /ready?require=karaoke answers 200 (or the preload fails)
+
+    cd backend && python -m bench.bench_startup --runs 5
+    cd backend && python -m bench.bench_startup --no-preload     # KARAOKE_PRELOAD=0
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+import requests
+
+from bench.common import BACKEND_DIR, summarize, git_commit, write_results, free_port
+
+SERVER = "import uvicorn, main; uvicorn.run(main.app, host='127.0.0.1', port={port}, log_level='warning')"
+
+
+def time_import(env):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import main"], cwd=BACKEND_DIR, env=env,
+                   check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def time_server(env, timeout, wait_karaoke):
+    port = free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-c", SERVER.format(port=port)], cwd=BACKEND_DIR,
+                            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}/ready"
+    ready_s = karaoke_s = None
+    karaoke_state = None
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"server exited with {proc.returncode}")
+            try:
+                if ready_s is None:
+                    if requests.get(url, timeout=1).status_code == 200:
+                        ready_s = time.perf_counter() - start
+                        if not wait_karaoke:
+                            break
+                else:
+                    resp = requests.get(url, params={"require": "karaoke"}, timeout=1)
+                    karaoke_state = resp.json()["karaoke"]["state"]
+                    if karaoke_state not in ("idle", "loading"):
+                        karaoke_s = time.perf_counter() - start
+                        break
+            except requests.RequestException:
+                pass
+            time.sleep(0.01)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    return ready_s, karaoke_s, karaoke_state
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Backend cold-start time")
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--timeout", type=float, default=120)
+    ap.add_argument("--no-preload", action="store_true", help="run with KARAOKE_PRELOAD=0")
+    ap.add_argument("--out", default="bench/results/startup.json")
+    args = ap.parse_args()
+
+    env = dict(os.environ, KARAOKE_PRELOAD="0" if args.no_preload else "1")
+    imports, ready, karaoke, states = [], [], [], []
+    for i in range(args.runs):
+        imports.append(time_import(env))
+        r, k, state = time_server(env, args.timeout, wait_karaoke=not args.no_preload)
+        if r is not None:
+            ready.append(r)
+        if k is not None:
+            karaoke.append(k)
+            states.append(state)
+        print(f"run {i + 1}: import {imports[-1]:.2f}s  /ready {r if r is None else round(r, 2)}s"
+              + ("" if args.no_preload else f"  karaoke {state} after {k if k is None else round(k, 2)}s"))
+
+    report = {
+        "commit": git_commit(),
+        "preload": not args.no_preload,
+        "import_s": summarize(imports),
+        "ready_s": summarize(ready),
+        "karaoke_s": summarize(karaoke),
+        "karaoke_states": states,
+    }
+    print(f"import p50 {report['import_s'].get('p50')}s  /ready p50 {report['ready_s'].get('p50')}s"
+          + ("" if args.no_preload else f"  karaoke p50 {report['karaoke_s'].get('p50')}s"))
+    write_results(args.out, report)
+
+
+if __name__ == "__main__":
+    main()
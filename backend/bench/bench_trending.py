@@ -0,0 +1,85 @@
+# backend/bench/bench_trending.py
+"""
+Trending sketch cost and accuracy on a synthetic, drifting event stream.
+
+Events are suggest / vote / play for song ids drawn from a Zipf-like
+distribution over --songs ids, with the popular ids shifting halfway
+through. The stream is fed to trending.Trending on a simulated clock
+(--rate events per second) and checked against exact decayed scores:
+recall of the exact top-N and the worst relative score error among them.
+
+    cd backend && python -m bench.bench_trending
+    cd backend && python -m bench.bench_trending --events 2000000 --songs 100000 --half-life 600
+"""
+import time
+import random
+import argparse
+
+from bench.common import git_commit, write_results
+import trending
+
+
+def stream(n_events, n_songs, seed, skew=1.1):
+    rng = random.Random(seed)
+    weights = [1 / (r + 1) ** skew for r in range(n_songs)]
+    ranks = list(range(n_songs))
+    kinds = list(trending.WEIGHTS)
+    half = n_events // 2
+    first = rng.choices(ranks, weights, k=half)
+    rng.shuffle(ranks)  # different songs are popular in the second half
+    second = rng.choices(ranks, weights, k=n_events - half)
+    return [(rng.choice(kinds), song_id) for song_id in first + second]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Trending sketch cost and accuracy")
+    ap.add_argument("--events", type=int, default=500000)
+    ap.add_argument("--songs", type=int, default=50000)
+    ap.add_argument("--rate", type=float, default=200, help="simulated events per second")
+    ap.add_argument("--half-life", type=float, default=300)
+    ap.add_argument("--top", type=int, default=20)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--out", default="bench/results/trending.json")
+    args = ap.parse_args()
+
+    events = stream(args.events, args.songs, args.seed)
+    clock = [0.0]
+    sketch = trending.Trending(half_life=args.half_life, clock=lambda: clock[0])
+    exact = {}
+
+    step = 1 / args.rate
+    start = time.perf_counter()
+    for kind, song_id in events:
+        clock[0] += step
+        sketch.record(kind, song_id)
+    elapsed = time.perf_counter() - start
+
+    t_end = clock[0]
+    for i, (kind, song_id) in enumerate(events):
+        age = t_end - (i + 1) * step
+        exact[song_id] = exact.get(song_id, 0.0) + trending.WEIGHTS[kind] * 2.0 ** (-age / args.half_life)
+
+    truth = sorted(exact.items(), key=lambda kv: -kv[1])[:args.top]
+    got = sketch.top_songs(args.top)
+    got_ids = {r["song_id"] for r in got}
+    recall = sum(1 for song_id, _ in truth if song_id in got_ids) / len(truth)
+    errors = [abs(sketch.estimate(song_id) - score) / score for song_id, score in truth]
+
+    report = {
+        "commit": git_commit(),
+        "events": args.events,
+        "songs": args.songs,
+        "half_life_s": args.half_life,
+        "us_per_event": round(elapsed / args.events * 1e6, 3),
+        "recall_at_top": round(recall, 3),
+        "max_rel_error_top": round(max(errors), 4),
+        "sketch": sketch.report()["sketch"],
+    }
+    print(f"{args.events} events over {args.songs} songs: {report['us_per_event']} us/event")
+    print(f"top-{args.top} recall {report['recall_at_top']}, worst relative score error "
+          f"{report['max_rel_error_top']}")
+    write_results(args.out, report)
+
+
+if __name__ == "__main__":
+    main()
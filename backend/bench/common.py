@@ -0,0 +1,74 @@
+# backend/bench/common.py
+"""Small helpers shared by the benchmark scripts."""
+import os
+import json
+import time
+import socket
+import resource
+import contextlib
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(values, scale=1.0):
+    """count / p50 / p90 / p99 / max of a list of samples, multiplied by `scale`."""
+    vals = sorted(v * scale for v in values)
+    if not vals:
+        return {"count": 0}
+    return {
+        "count": len(vals),
+        "p50": round(percentile(vals, 50), 3),
+        "p90": round(percentile(vals, 90), 3),
+        "p99": round(percentile(vals, 99), 3),
+        "max": round(vals[-1], 3),
+    }
+
+
+def rss_mb():
+    """Current resident set size in MB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / 1e6, 1)
+    except (OSError, ValueError):
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3, 1)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with contextlib.suppress(OSError), socket.create_connection(("127.0.0.1", port), timeout=0.5):
+            return
+        time.sleep(0.1)
+    raise RuntimeError(f"server did not start on port {port}")
+
+
+def write_results(path, results):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {path}")
@@ -0,0 +1,127 @@
+# backend/bench/fake_catalog.py
+"""
+Seeded SQLite stand-in for the Railway MySQL catalog.
+
+Builds `songs`, `tags`, `song_tags` and `karaoke_assets` with a synthetic
+catalog and swaps `main.execute_read_query` for a version that runs the
+same SQL against it (`%s` -> `?`, `RAND()` -> `RANDOM()`).
+"""
+import re
+import zlib
+import random
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE songs (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    artist_name TEXT,
+    album_name TEXT,
+    audio_url TEXT
+);
+CREATE TABLE tags (
+    tag_id INTEGER PRIMARY KEY,
+    tag_name TEXT NOT NULL
+);
+CREATE TABLE song_tags (
+    song_id INTEGER NOT NULL,
+    tag_id INTEGER NOT NULL
+);
+CREATE TABLE karaoke_assets (
+    song_id INTEGER PRIMARY KEY,
+    vocals_url TEXT,
+    accompaniment_url TEXT,
+    lyrics_url TEXT,
+    processed INTEGER,
+    created_at TEXT,
+    updated_at TEXT
+);
+CREATE INDEX idx_song_tags_song ON song_tags(song_id);
+CREATE INDEX idx_song_tags_tag ON song_tags(tag_id);
+"""
+
+
+def build(n_songs=500, n_artists=40, albums_per_artist=3, n_tags=30,
+          tags_per_song=4, seed=7, path=":memory:"):
+    """Create and seed the catalog. Returns an open sqlite3 connection."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    _add_mysql_functions(conn)
+    conn.executescript(SCHEMA)
+
+    conn.executemany(
+        "INSERT INTO tags (tag_id, tag_name) VALUES (?, ?)",
+        [(t, f"tag{t}") for t in range(1, n_tags + 1)],
+    )
+
+    songs, song_tags = [], []
+    for i in range(1, n_songs + 1):
+        artist = rng.randrange(n_artists)
+        album = rng.randrange(albums_per_artist)
+        songs.append((
+            i,
+            f"Song {i}",
+            f"Artist {artist}",
+            f"Album {artist}-{album}",
+            f"https://drive.google.com/file/d/fake-{i}/preview",
+        ))
+        for tag in rng.sample(range(1, n_tags + 1), min(tags_per_song, n_tags)):
+            song_tags.append((i, tag))
+
+    conn.executemany(
+        "INSERT INTO songs (id, title, artist_name, album_name, audio_url) VALUES (?, ?, ?, ?, ?)",
+        songs,
+    )
+    conn.executemany("INSERT INTO song_tags (song_id, tag_id) VALUES (?, ?)", song_tags)
+    conn.commit()
+    return conn
+
+
+class _BitXor:
+    def __init__(self):
+        self.value = 0
+
+    def step(self, value):
+        if value is not None:
+            self.value ^= value
+
+    def finalize(self):
+        return self.value
+
+
+def _add_mysql_functions(conn):
+    """The MySQL builtins catalog.FINGERPRINT_SQL uses."""
+    conn.create_function("CRC32", 1, lambda s: None if s is None else zlib.crc32(str(s).encode()))
+    conn.create_function("CONCAT_WS", -1,
+                         lambda sep, *parts: sep.join(str(p) for p in parts if p is not None))
+    conn.create_aggregate("BIT_XOR", 1, _BitXor)
+
+
+def titles(conn):
+    return [r["title"] for r in conn.execute("SELECT title FROM songs ORDER BY id")]
+
+
+def _translate(query):
+    query = query.replace("%s", "?")
+    return re.sub(r"\bRAND\(\)", "RANDOM()", query, flags=re.IGNORECASE)
+
+
+def make_read_query(conn):
+    """execute_read_query() replacement backed by `conn`."""
+    lock = threading.Lock()
+
+    def execute_read_query(query, params=None, raise_errors=False):
+        with lock:
+            cur = conn.execute(_translate(query), tuple(params or ()))
+            return [dict(r) for r in cur.fetchall()]
+
+    return execute_read_query
+
+
+def install(main_module, conn=None, **build_kwargs):
+    """Point main.py's DB helper at a seeded SQLite catalog. Returns the connection."""
+    conn = conn or build(**build_kwargs)
+    main_module.execute_read_query = make_read_query(conn)
+    return conn
@@ -0,0 +1,302 @@
+# backend/bench/fake_drive.py
+"""
+Local stand-in for the Drive v3 REST API.
+
+Serves the audio files in backend/temp for any file id:
+
+    GET /drive/v3/files/<id>?alt=media     media bytes, honours Range
+    GET /drive/v3/files/<id>               JSON metadata (size, mimeType, md5Checksum, ...)
+    POST /batch/drive/v3                   multipart/mixed batch of metadata GETs
+    GET /drive/v3/files?q=...              files.list: `listing` fake-<n> tracks in any folder, paged
+
+and accepts uploads (bytes are counted, not kept):
+
+    POST /upload/drive/v3/files?uploadType=multipart    one-shot upload
+    POST /upload/drive/v3/files?uploadType=resumable    opens a session (Location header)
+    PUT  <session url>                                  Content-Range chunks, 308 until complete
+    POST /drive/v3/files/<id>/permissions
+
+Ids of the form `fake-<n>` (what fake_catalog stores) map onto the
+available files round-robin; any other id is looked up by file name.
+
+`listing` sets how many tracks a folder listing returns (default: one
+per audio file). `latency` (seconds per request), `mbps` (per-connection bandwidth for
+request and response bodies) and `fail_every` (answer every Nth upload
+chunk with 503) make transfer benchmarks resemble a remote Drive.
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import itertools
+import mimetypes
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+
+from bench.common import BACKEND_DIR
+
+MEDIA_DIR = os.path.join(BACKEND_DIR, "temp")
+CHUNK = 64 * 1024
+
+
+def _media_files(media_dir):
+    return sorted(
+        os.path.join(media_dir, name) for name in os.listdir(media_dir)
+        if (mimetypes.guess_type(name)[0] or "").startswith("audio/")
+    )
+
+
+class FakeDrive:
+    def __init__(self, media_dir=MEDIA_DIR, latency=0.0, mbps=None, fail_every=0, listing=None):
+        self.files = _media_files(media_dir)
+        if not self.files:
+            raise RuntimeError(f"no audio files found in {media_dir}")
+        self.listing = len(self.files) if listing is None else listing
+        self._meta = {}
+        self.latency = latency
+        self.mbps = mbps
+        self.fail_every = fail_every
+        self.sessions = {}  # upload id → bytes received
+        self._ids = itertools.count(1)
+        self._chunks = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def throttle(self, nbytes):
+        if self.mbps:
+            time.sleep(nbytes * 8 / (self.mbps * 1e6))
+
+    def next_id(self):
+        with self.lock:
+            return next(self._ids)
+
+    def should_fail(self):
+        if not self.fail_every:
+            return False
+        with self.lock:
+            return next(self._chunks) % self.fail_every == 0
+
+    def resolve(self, file_id):
+        m = re.fullmatch(r"fake-(\d+)", file_id)
+        if m:
+            return self.files[int(m.group(1)) % len(self.files)]
+        for path in self.files:
+            if os.path.basename(path) == file_id:
+                return path
+        return None
+
+    def metadata(self, file_id, path):
+        if path not in self._meta:
+            with open(path, "rb") as f:
+                md5 = hashlib.md5(f.read()).hexdigest()
+            mtime = datetime.fromtimestamp(os.path.getmtime(path), tz=timezone.utc)
+            self._meta[path] = {
+                "name": os.path.basename(path),
+                "size": str(os.path.getsize(path)),
+                "mimeType": mimetypes.guess_type(path)[0] or "application/octet-stream",
+                "md5Checksum": md5,
+                "modifiedTime": mtime.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            }
+        return dict(self._meta[path], id=file_id)
+
+    def list_page(self, page_size, page_token):
+        start = int(page_token or 0)
+        end = min(self.listing, start + page_size)
+        files = []
+        for i in range(start, end):
+            meta = self.metadata(f"fake-{i}", self.resolve(f"fake-{i}"))
+            ext = os.path.splitext(meta["name"])[1]
+            files.append(dict(meta, name=f"Artist {i % 40} - Track {i}{ext}"))
+        page = {"files": files}
+        if end < self.listing:
+            page["nextPageToken"] = str(end)
+        return page
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single `bytes=` range, or None if unsatisfiable."""
+    m = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+    if not m or (not m.group(1) and not m.group(2)):
+        return None
+    if not m.group(1):
+        length = int(m.group(2))
+        if length == 0:
+            return None
+        return max(0, size - length), size - 1
+    start = int(m.group(1))
+    end = int(m.group(2)) if m.group(2) else size - 1
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def make_handler(drive):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_body(self):
+            remaining = int(self.headers.get("Content-Length") or 0)
+            while remaining > 0:
+                chunk = self.rfile.read(min(CHUNK, remaining))
+                if not chunk:
+                    break
+                drive.throttle(len(chunk))
+                remaining -= len(chunk)
+            return int(self.headers.get("Content-Length") or 0)
+
+        def _batch(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode()
+            boundary = "batch_fake"
+            parts = []
+            for cid, path in re.findall(r"Content-ID: <([^>]+)>\r\n\r\nGET (\S+)", body):
+                m = re.fullmatch(r"/drive/v3/files/([^/?]+)", urlparse(path).path)
+                file_path = drive.resolve(unquote(m.group(1))) if m else None
+                if file_path:
+                    status, payload = "200 OK", drive.metadata(unquote(m.group(1)), file_path)
+                else:
+                    status, payload = "404 Not Found", {"error": {"code": 404, "message": "File not found"}}
+                parts.append(f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{cid}>\r\n\r\n"
+                             f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n\r\n{json.dumps(payload)}\r\n")
+            out = ("".join(parts) + f"--{boundary}--\r\n").encode()
+            self.send_response(200)
+            self.send_header("Content-Type", f"multipart/mixed; boundary={boundary}")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+        def do_POST(self):
+            time.sleep(drive.latency)
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if url.path == "/batch/drive/v3":
+                self._batch()
+                return
+            size = self._read_body()
+
+            if re.fullmatch(r"/drive/v3/files/[^/]+/permissions", url.path):
+                self._send_json(200, {"id": "anyoneWithLink", "role": "reader", "type": "anyone"})
+                return
+            if url.path != "/upload/drive/v3/files":
+                self._send_json(404, {"error": {"code": 404, "message": "Not found"}})
+                return
+
+            upload_id = drive.next_id()
+            if query.get("uploadType") == ["resumable"]:
+                with drive.lock:
+                    drive.sessions[upload_id] = 0
+                host = self.headers.get("Host")
+                self.send_response(200)
+                self.send_header("Location", f"http://{host}/upload/drive/v3/files?uploadType=resumable&upload_id={upload_id}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self._send_json(200, {"id": f"upload-{upload_id}", "size": str(size)})
+
+        def do_PUT(self):
+            time.sleep(drive.latency)
+            url = urlparse(self.path)
+            upload_id = int(parse_qs(url.query).get("upload_id", ["0"])[0])
+            if upload_id not in drive.sessions:
+                self._read_body()
+                self._send_json(404, {"error": {"code": 404, "message": "No such upload session"}})
+                return
+
+            m = re.fullmatch(r"bytes (\d+)-(\d+)/(\d+|\*)|bytes \*/(\d+)", self.headers.get("Content-Range", ""))
+            received = self._read_body()
+            if m and m.group(1) is not None:
+                if drive.should_fail():
+                    self._send_json(503, {"error": {"code": 503, "message": "Backend Error"}})
+                    return
+                start, total = int(m.group(1)), m.group(3)
+                with drive.lock:
+                    if start <= drive.sessions[upload_id]:
+                        drive.sessions[upload_id] = max(drive.sessions[upload_id], start + received)
+                    done_bytes = drive.sessions[upload_id]
+            else:  # status query after an interruption
+                total = m.group(4) if m else "*"
+                done_bytes = drive.sessions[upload_id]
+
+            if total != "*" and done_bytes >= int(total):
+                self._send_json(200, {"id": f"upload-{upload_id}", "size": str(done_bytes)})
+                return
+            self.send_response(308)
+            if done_bytes:
+                self.send_header("Range", f"bytes=0-{done_bytes - 1}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_GET(self):
+            time.sleep(drive.latency)
+            url = urlparse(self.path)
+            if url.path == "/drive/v3/files":
+                query = parse_qs(url.query)
+                self._send_json(200, drive.list_page(int(query.get("pageSize", ["100"])[0]),
+                                                     query.get("pageToken", [None])[0]))
+                return
+            m = re.fullmatch(r"/drive/v3/files/([^/]+)", url.path)
+            path = drive.resolve(unquote(m.group(1))) if m else None
+            if not path:
+                self._send_json(404, {"error": {"code": 404, "message": "File not found"}})
+                return
+
+            if parse_qs(url.query).get("alt") != ["media"]:
+                self._send_json(200, drive.metadata(unquote(m.group(1)), path))
+                return
+
+            size = os.path.getsize(path)
+            start, end, status = 0, size - 1, 200
+            range_header = self.headers.get("Range")
+            if range_header:
+                rng = parse_range(range_header, size)
+                if rng is None:
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{size}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                start, end, status = rng[0], rng[1], 206
+
+            self.send_response(status)
+            self.send_header("Content-Type", mimetypes.guess_type(path)[0] or "application/octet-stream")
+            self.send_header("Content-Length", str(end - start + 1))
+            self.send_header("Accept-Ranges", "bytes")
+            if status == 206:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            self.end_headers()
+
+            with open(path, "rb") as f:
+                f.seek(start)
+                remaining = end - start + 1
+                while remaining > 0:
+                    chunk = f.read(min(CHUNK, remaining))
+                    if not chunk:
+                        break
+                    drive.throttle(len(chunk))
+                    try:
+                        self.wfile.write(chunk)
+                    except (BrokenPipeError, ConnectionResetError):
+                        return  # client read what it needed (probes, aborted players)
+                    remaining -= len(chunk)
+
+    return Handler
+
+
+def start(port=0, media_dir=MEDIA_DIR, **options):
+    """Run the fake Drive in a daemon thread. Returns (server, base_url). See FakeDrive for options."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(FakeDrive(media_dir, **options)))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/drive/v3"
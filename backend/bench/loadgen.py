@@ -0,0 +1,239 @@
+# backend/bench/loadgen.py
+"""
+Socket.IO load generator for spaces.
+
+Starts the real ASGI app (main.app) under uvicorn in a child process, with
+the MySQL helper pointed at a seeded SQLite catalog, then drives
+N spaces x M clients through a mix of join_space / send_message /
+suggest_song / upvote_song / play_song / seek.
+
+Reports chat broadcast latency percentiles, event throughput, server
+event-loop lag and server memory, and writes everything to a JSON file
+so runs can be compared across commits.
+
+    cd backend && python -m bench.loadgen --spaces 10 --clients 20 --duration 30
+"""
+import os
+import sys
+import time
+import json
+import random
+import asyncio
+import argparse
+import contextlib
+import multiprocessing as mp
+
+from bench.common import summarize, rss_mb, git_commit, write_results, free_port, wait_for_port
+
+# event -> relative weight for regular members; admins also play and seek
+MEMBER_MIX = {
+    "send_message": 50,
+    "upvote_song": 25,
+    "suggest_song": 15,
+    "join_space": 10,
+}
+ADMIN_MIX = dict(MEMBER_MIX, play_song=10, seek=10)
+
+LAG_PROBE_INTERVAL = 0.05
+
+
+# ----------------------------
+# SERVER (child process)
+# ----------------------------
+async def _probe_loop_lag(samples):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(LAG_PROBE_INTERVAL)
+        samples.append(max(0.0, loop.time() - start - LAG_PROBE_INTERVAL))
+
+
+def _server_main(port, n_songs, stop_evt, stats_q, quiet):
+    import uvicorn
+    import main
+    from bench import fake_catalog
+
+    fake_catalog.install(main, n_songs=n_songs)
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+
+    async def run():
+        lags = []
+        probe = asyncio.create_task(_probe_loop_lag(lags))
+        serving = asyncio.create_task(server.serve())
+        await asyncio.get_running_loop().run_in_executor(None, stop_evt.wait)
+        report = main.lifecycle.report()
+        stats = {
+            "loop_lag_ms": summarize(lags, scale=1000),
+            "rss_mb": rss_mb(),
+            "spaces": report["space_count"],
+            "spaces_approx_bytes": report["total_approx_bytes"],
+        }
+        server.should_exit = True
+        await serving
+        probe.cancel()
+        stats_q.put(stats)
+
+    out = open(os.devnull, "w") if quiet else sys.stdout
+    with contextlib.redirect_stdout(out):
+        asyncio.run(run())
+
+
+# ----------------------------
+# CLIENTS
+# ----------------------------
+class Stats:
+    def __init__(self):
+        self.sent = {}
+        self.received = 0
+        self.latencies = []
+        self.errors = 0
+
+    def count(self, event):
+        self.sent[event] = self.sent.get(event, 0) + 1
+
+
+class SimClient:
+    def __init__(self, url, space, user, is_admin, titles, stats, rate, rng):
+        import socketio
+
+        self.url = url
+        self.space = space
+        self.user = user
+        self.is_admin = is_admin
+        self.titles = titles
+        self.stats = stats
+        self.rate = rate
+        self.rng = rng
+        self.song_ids = []
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.sio.on("chat_message", self._on_chat)
+        self.sio.on("leaderboard", self._on_leaderboard)
+
+    async def _on_chat(self, msg):
+        text = msg.get("msg", "") if isinstance(msg, dict) else ""
+        if text.startswith("lg|"):
+            sent_at = float(text.split("|", 2)[1])
+            self.stats.latencies.append(time.perf_counter() - sent_at)
+        self.stats.received += 1
+
+    async def _on_leaderboard(self, board):
+        self.song_ids = [s["id"] for s in board or []]
+        self.stats.received += 1
+
+    async def connect(self):
+        await self.sio.connect(self.url, transports=["websocket"])
+        event = "create_space" if self.is_admin else "join_space"
+        await self.sio.emit(event, {"space": self.space, "user": self.user})
+        self.stats.count(event)
+
+    async def _send(self, event):
+        data = {"space": self.space, "user": self.user, "actor": self.user}
+        if event == "send_message":
+            data["msg"] = f"lg|{time.perf_counter()!r}|{self.user}"
+        elif event == "suggest_song":
+            data["song"] = self.rng.choice(self.titles)
+        elif event == "upvote_song":
+            if not self.song_ids:
+                return
+            data["songId"] = self.rng.choice(self.song_ids)
+        elif event == "seek":
+            data["time"] = round(self.rng.uniform(0, 180), 1)
+        await self.sio.emit(event, data)
+        self.stats.count(event)
+
+    async def run(self, until):
+        mix = ADMIN_MIX if self.is_admin else MEMBER_MIX
+        events, weights = list(mix.keys()), list(mix.values())
+        while time.perf_counter() < until:
+            await asyncio.sleep(self.rng.expovariate(self.rate))
+            try:
+                await self._send(self.rng.choices(events, weights)[0])
+            except Exception:
+                self.stats.errors += 1
+
+    async def close(self):
+        with contextlib.suppress(Exception):
+            await self.sio.disconnect()
+
+
+async def drive_clients(url, args, titles):
+    stats = Stats()
+    rng = random.Random(args.seed)
+    clients = []
+    for s in range(args.spaces):
+        for c in range(args.clients):
+            clients.append(SimClient(
+                url, f"space-{s}", f"user-{s}-{c}", c == 0, titles, stats,
+                args.rate, random.Random(rng.random()),
+            ))
+
+    # admins first so the spaces exist before members join
+    await asyncio.gather(*(c.connect() for c in clients if c.is_admin))
+    await asyncio.gather(*(c.connect() for c in clients if not c.is_admin))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(c.run(start + args.duration) for c in clients))
+    elapsed = time.perf_counter() - start
+
+    await asyncio.sleep(0.5)  # let in-flight broadcasts land
+    await asyncio.gather(*(c.close() for c in clients))
+    return stats, elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Socket.IO load generator for spaces")
+    ap.add_argument("--spaces", type=int, default=5)
+    ap.add_argument("--clients", type=int, default=10, help="clients per space")
+    ap.add_argument("--duration", type=float, default=20, help="seconds of load")
+    ap.add_argument("--rate", type=float, default=1.0, help="events per second per client")
+    ap.add_argument("--songs", type=int, default=500, help="synthetic catalog size")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--url", help="target an already running server instead of spawning one")
+    ap.add_argument("--out", default="bench/results/loadgen.json")
+    ap.add_argument("--verbose", action="store_true", help="keep server prints")
+    args = ap.parse_args()
+
+    from bench import fake_catalog
+    titles = fake_catalog.titles(fake_catalog.build(n_songs=args.songs))
+
+    proc = None
+    server_stats = None
+    if args.url:
+        url = args.url
+    else:
+        ctx = mp.get_context("spawn")
+        port = free_port()
+        stop_evt, stats_q = ctx.Event(), ctx.Queue()
+        proc = ctx.Process(target=_server_main, args=(port, args.songs, stop_evt, stats_q, not args.verbose))
+        proc.start()
+        wait_for_port(port)
+        url = f"http://127.0.0.1:{port}"
+
+    try:
+        stats, elapsed = asyncio.run(drive_clients(url, args, titles))
+    finally:
+        if proc:
+            stop_evt.set()
+            server_stats = stats_q.get(timeout=30)
+            proc.join(timeout=30)
+
+    sent = sum(stats.sent.values())
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "verbose")},
+        "duration_s": round(elapsed, 2),
+        "events_sent": stats.sent,
+        "events_per_s": round(sent / elapsed, 1),
+        "broadcasts_received": stats.received,
+        "deliveries_per_s": round(stats.received / elapsed, 1),
+        "client_errors": stats.errors,
+        "chat_latency_ms": summarize(stats.latencies, scale=1000),
+        "server": server_stats,
+    }
+    print(json.dumps(results, indent=2))
+    write_results(args.out, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# backend/catalog.py
+"""
+Catalog version, cursors and response cache for the browse endpoints.
+
+The catalog version is a short hash of a fingerprint of `songs` (row
+count plus an order-independent checksum of every row's id, title,
+artist, album and audio_url), re-read at most every CATALOG_VERSION_TTL
+seconds or right after `bump()`. The fingerprint is a full scan of
+`songs`, so it runs at most once per TTL, not per request. Browse ETags are
+derived from it plus the request, so If-None-Match can be answered with
+304 before any listing query runs, and rendered pages are cached per
+ETag until the version moves on.
+
+Cursors are opaque to clients: urlsafe base64 of the last row's sort key.
+"""
+import os
+import json
+import time
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+
+# ----------------------------
+# CONFIG
+# ----------------------------
+# Seconds a catalog version is trusted before the fingerprint is re-read
+CATALOG_VERSION_TTL = float(os.getenv("CATALOG_VERSION_TTL", 30))
+
+# Rendered browse pages kept in memory
+BROWSE_CACHE_SIZE = int(os.getenv("BROWSE_CACHE_SIZE", 512))
+
+# Page size cap for ?limit=
+BROWSE_MAX_LIMIT = int(os.getenv("BROWSE_MAX_LIMIT", 500))
+
+# Full table scan: any edit to a listed column changes the checksum, even
+# one that keeps lengths and counts the same (typo fix, swapped artists)
+FINGERPRINT_SQL = """
+    SELECT COUNT(*) AS n,
+           BIT_XOR(CRC32(CONCAT_WS(CHAR(31), id, title, artist_name, album_name, audio_url))) AS checksum
+    FROM songs
+"""
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key = json.loads(raw)
+    except ValueError:
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(key, list):
+        raise InvalidCursor("Invalid cursor")
+    return key
+
+
+class CatalogVersion:
+    """
+    `fetch()` runs FINGERPRINT_SQL and returns its row(s). It should raise
+    when the DB is unreachable: the error propagates from `get()` and the
+    next request retries, so no ETag is ever minted for a failed read.
+    """
+
+    def __init__(self, fetch, ttl=CATALOG_VERSION_TTL):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.version = None
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def stale(self):
+        return self.version is None or time.monotonic() - self.checked_at > self.ttl
+
+    def get(self):
+        """Current version (blocking DB read when stale; call from a worker thread)."""
+        if not self.stale:
+            return self.version
+        with self._lock:
+            if self.stale:
+                rows = self.fetch()
+                fingerprint = json.dumps(rows[0] if rows else None, sort_keys=True, default=str)
+                self.version = hashlib.blake2b(fingerprint.encode(), digest_size=6).hexdigest()
+                self.checked_at = time.monotonic()
+        return self.version
+
+    def bump(self):
+        """Catalog changed (ingest, admin edits): re-read the fingerprint on the next request."""
+        self.checked_at = 0.0
+        self.version = None
+
+
+class PageCache:
+    """Rendered pages (http_cache.CachedBody) by ETag, least recently used dropped first."""
+
+    def __init__(self, size=BROWSE_CACHE_SIZE):
+        self.size = size
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, etag):
+        with self._lock:
+            body = self._pages.get(etag)
+            if body is not None:
+                self._pages.move_to_end(etag)
+            return body
+
+    def put(self, etag, body):
+        with self._lock:
+            self._pages[etag] = body
+            self._pages.move_to_end(etag)
+            while len(self._pages) > self.size:
+                self._pages.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+
+def etag_for(version, *request_parts):
+    digest = hashlib.blake2b(repr(request_parts).encode(), digest_size=8).hexdigest()
+    return f'"{version}-{digest}"'
@@ -0,0 +1,298 @@
+# backend/drive_meta.py
+"""
+Cached Drive file metadata (size, MIME type, md5Checksum, modifiedTime).
+
+/play needs the size and type before it opens a media stream: to answer
+HEAD, to reject bad Range requests with 416, and to answer If-None-Match /
+If-Range locally. Metadata is fetched once per file and kept for
+DRIVE_META_TTL seconds. After that, the stale entry is still served while
+a background refresh runs, and a stream whose upstream size disagrees
+with the cache invalidates the entry.
+
+Misses are fetched in batches: `get_many` / `prefetch` send up to
+DRIVE_META_BATCH_SIZE files.get calls as one Drive batch request
+(multipart/mixed). Concurrent lookups of the same file share one fetch.
+`prime` stores metadata that arrived some other way (folder listings).
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from email.utils import format_datetime
+from urllib.parse import quote_plus, urlparse
+
+import requests
+
+import metrics
+import tracing
+
+# ----------------------------
+# CONFIG
+# ----------------------------
+# Seconds before an entry is refreshed (in the background, stale copy served meanwhile)
+DRIVE_META_TTL = float(os.getenv("DRIVE_META_TTL", 15 * 60))
+
+DRIVE_META_CACHE_SIZE = int(os.getenv("DRIVE_META_CACHE_SIZE", 50000))
+
+# files.get calls per batch request (Drive allows 100)
+DRIVE_META_BATCH_SIZE = int(os.getenv("DRIVE_META_BATCH_SIZE", 100))
+
+FIELDS = "id,size,mimeType,md5Checksum,modifiedTime"
+
+
+class DriveMetaError(Exception):
+    pass
+
+
+class FileMeta:
+    __slots__ = ("id", "size", "mime_type", "md5", "modified", "fetched_at")
+
+    def __init__(self, id, size, mime_type, md5, modified, fetched_at=None):
+        self.id = id
+        self.size = size  # None for Google-native documents
+        self.mime_type = mime_type
+        self.md5 = md5
+        self.modified = modified  # RFC 3339, as Drive returns it
+        self.fetched_at = time.monotonic() if fetched_at is None else fetched_at
+
+    @classmethod
+    def from_drive(cls, item):
+        size = item.get("size")
+        return cls(item["id"], int(size) if size is not None else None,
+                   item.get("mimeType") or "application/octet-stream",
+                   item.get("md5Checksum"), item.get("modifiedTime"))
+
+    @property
+    def etag(self):
+        if self.md5:
+            return f'"{self.md5}"'
+        digest = hashlib.blake2b(f"{self.id}:{self.modified}:{self.size}".encode(), digest_size=12).hexdigest()
+        return f'"{digest}"'
+
+    @property
+    def last_modified(self):
+        """HTTP date for Last-Modified / If-Range, or None."""
+        if not self.modified:
+            return None
+        try:
+            when = datetime.fromisoformat(self.modified.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        return format_datetime(when, usegmt=True)
+
+    def headers(self):
+        """Validators and type for responses serving this file."""
+        out = {"ETag": self.etag, "Content-Type": self.mime_type, "Accept-Ranges": "bytes"}
+        if self.last_modified:
+            out["Last-Modified"] = self.last_modified
+        return out
+
+    def to_dict(self):
+        return {"id": self.id, "size": self.size, "mime_type": self.mime_type,
+                "md5": self.md5, "modified": self.modified}
+
+
+# ----------------------------
+# BATCH REQUESTS
+# ----------------------------
+_BOUNDARY_RE = re.compile(r'boundary="?([^";]+)"?')
+_STATUS_RE = re.compile(rb"HTTP/\d(?:\.\d)? (\d{3})")
+
+
+def _batch_body(paths, boundary):
+    parts = []
+    for i, path in enumerate(paths):
+        parts.append(f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <item{i}>\r\n\r\n"
+                     f"GET {path}\r\n\r\n")
+    parts.append(f"--{boundary}--\r\n")
+    return "".join(parts).encode()
+
+
+def _parse_batch(content_type, body):
+    """[(content_id, status, json_or_None)] from a multipart/mixed batch response."""
+    m = _BOUNDARY_RE.search(content_type or "")
+    if not m:
+        raise DriveMetaError("batch response without a multipart boundary")
+    out = []
+    for part in body.split(b"--" + m.group(1).encode())[1:]:
+        if part.startswith(b"--"):
+            break
+        head, _, http = part.partition(b"\r\n\r\n")
+        cid = re.search(rb"Content-ID:\s*<(?:response-)?([^>]+)>", head, re.I)
+        status = _STATUS_RE.match(http.lstrip())
+        if not cid or not status:
+            continue
+        payload = http.partition(b"\r\n\r\n")[2].strip()
+        try:
+            data = json.loads(payload) if payload else None
+        except ValueError:
+            data = None
+        out.append((cid.group(1).decode(), int(status.group(1)), data))
+    return out
+
+
+class DriveMetaCache:
+    """
+    `token()` returns a Drive bearer token and `api_base()` the v3 REST base
+    (both callables, so benchmarks can repoint them at runtime).
+    """
+
+    def __init__(self, token, api_base, ttl=DRIVE_META_TTL, size=DRIVE_META_CACHE_SIZE):
+        self.token = token
+        self.api_base = api_base
+        self.ttl = ttl
+        self.size = size
+        self._entries = OrderedDict()  # file_id -> FileMeta
+        self._inflight = {}  # file_id -> Future
+        self._lock = threading.Lock()
+        self._refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="drive-meta")
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "fetched": 0, "batches": 0, "invalidated": 0}
+
+    # ----------------------------
+    # LOOKUP
+    # ----------------------------
+    def cached(self, file_id):
+        with self._lock:
+            meta = self._entries.get(file_id)
+            if meta is not None:
+                self._entries.move_to_end(file_id)
+            return meta
+
+    def get(self, file_id):
+        """FileMeta for `file_id`, or None if Drive has no such file (blocking on a miss)."""
+        meta = self.cached(file_id)
+        if meta is not None:
+            if time.monotonic() - meta.fetched_at < self.ttl:
+                self.stats["hits"] += 1
+            else:
+                self.stats["stale_hits"] += 1
+                self.prefetch([file_id], refresh=True)
+            return meta
+        self.stats["misses"] += 1
+        return self.get_many([file_id])[file_id]
+
+    def get_many(self, file_ids):
+        """{file_id: FileMeta or None}, fetching whatever is not cached in batches."""
+        result, futures, mine = {}, {}, []
+        with self._lock:
+            for file_id in dict.fromkeys(file_ids):
+                if file_id in self._entries:
+                    result[file_id] = self._entries[file_id]
+                elif file_id in self._inflight:
+                    futures[file_id] = self._inflight[file_id]
+                else:
+                    futures[file_id] = self._inflight[file_id] = Future()
+                    mine.append(file_id)
+        if mine:
+            self._fetch_into_futures(mine)
+        for file_id, future in futures.items():
+            result[file_id] = future.result()
+        return result
+
+    def prefetch(self, file_ids, refresh=False):
+        """Fetch missing (or, with refresh, all) of `file_ids` in the background."""
+        with self._lock:
+            wanted = [f for f in dict.fromkeys(file_ids)
+                      if f not in self._inflight and (refresh or f not in self._entries)]
+            for file_id in wanted:
+                self._inflight[file_id] = Future()
+        if wanted:
+            self._refresher.submit(self._fetch_into_futures, wanted)
+
+    def prime(self, items):
+        """Store Drive file resources (dicts with at least `id`) fetched elsewhere, e.g. a files.list page."""
+        for item in items:
+            if item.get("id"):
+                self._store(FileMeta.from_drive(item))
+
+    def invalidate(self, file_id):
+        with self._lock:
+            if self._entries.pop(file_id, None) is not None:
+                self.stats["invalidated"] += 1
+
+    def report(self):
+        with self._lock:
+            entries = len(self._entries)
+            inflight = len(self._inflight)
+        return {"entries": entries, "inflight": inflight, "ttl_seconds": self.ttl, **self.stats}
+
+    def _store(self, meta):
+        with self._lock:
+            self._entries[meta.id] = meta
+            self._entries.move_to_end(meta.id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    # ----------------------------
+    # FETCH
+    # ----------------------------
+    def _fetch_into_futures(self, file_ids):
+        """Fetch `file_ids` (whose futures this caller owns) and resolve their futures."""
+        try:
+            fetched = self._fetch(file_ids)
+        except BaseException as e:
+            with self._lock:
+                for file_id in file_ids:
+                    self._inflight.pop(file_id).set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        for meta in fetched.values():
+            if meta is not None:
+                self._store(meta)
+        with self._lock:
+            for file_id in file_ids:
+                self._inflight.pop(file_id).set_result(fetched.get(file_id))
+
+    def _fetch(self, file_ids):
+        out = {}
+        headers = {"Authorization": f"Bearer {self.token()}"}
+        for i in range(0, len(file_ids), DRIVE_META_BATCH_SIZE):
+            chunk = file_ids[i:i + DRIVE_META_BATCH_SIZE]
+            with metrics.timed(metrics.drive_ttfb, "meta"), tracing.span("drive_meta.fetch", files=len(chunk)):
+                if len(chunk) == 1:
+                    out.update(self._fetch_one(chunk[0], headers))
+                else:
+                    out.update(self._fetch_batch(chunk, headers))
+            self.stats["fetched"] += len(chunk)
+        return out
+
+    def _fetch_one(self, file_id, headers):
+        resp = requests.get(f"{self.api_base()}/files/{quote_plus(file_id)}",
+                            params={"fields": FIELDS}, headers=headers, timeout=15)
+        if resp.status_code == 404:
+            return {file_id: None}
+        if resp.status_code != 200:
+            raise DriveMetaError(f"Drive metadata error {resp.status_code} for {file_id}")
+        return {file_id: FileMeta.from_drive(dict(resp.json(), id=file_id))}
+
+    def _fetch_batch(self, file_ids, headers):
+        base = self.api_base()
+        parsed = urlparse(base)
+        batch_url = f"{parsed.scheme}://{parsed.netloc}/batch{parsed.path}"
+        boundary = "drive_meta_%x" % int(time.time() * 1e6)
+        paths = [f"{parsed.path}/files/{quote_plus(f)}?fields={FIELDS}" for f in file_ids]
+        resp = requests.post(batch_url, data=_batch_body(paths, boundary), headers=dict(
+            headers, **{"Content-Type": f"multipart/mixed; boundary={boundary}"}), timeout=30)
+        self.stats["batches"] += 1
+        if resp.status_code != 200:
+            raise DriveMetaError(f"Drive batch error {resp.status_code}")
+
+        out = {}
+        for cid, status, data in _parse_batch(resp.headers.get("Content-Type"), resp.content):
+            if not cid.startswith("item"):
+                continue
+            file_id = file_ids[int(cid[4:])]
+            if status == 200 and data:
+                out[file_id] = FileMeta.from_drive(dict(data, id=file_id))
+            elif status == 404:
+                out[file_id] = None
+        missing = [f for f in file_ids if f not in out]  # per-item errors (rate limits, ...): retry singly
+        for file_id in missing:
+            out.update(self._fetch_one(file_id, headers))
+        return out
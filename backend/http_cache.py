@@ -0,0 +1,129 @@
+# backend/http_cache.py
+"""
+Cacheable JSON responses: a strong ETag, 304 on If-None-Match, and gzip
+for clients that accept it.
+
+A `CachedBody` is built once per payload and reused for every request,
+so neither the JSON nor its gzip encoding is redone per hit.
+
+`byte_range` / `if_range_ok` validate Range and If-Range requests locally
+against known file metadata (see drive_meta.py).
+"""
+import os
+import re
+import gzip
+import json
+import hashlib
+
+from fastapi.responses import Response
+
+# ----------------------------
+# CONFIG
+# ----------------------------
+# Bodies smaller than this are sent uncompressed (gzip framing would not pay off)
+GZIP_MIN_BYTES = int(os.getenv("GZIP_MIN_BYTES", 1024))
+
+GZIP_LEVEL = 6
+
+
+def _accepts_gzip(request):
+    return "gzip" in request.headers.get("accept-encoding", "").lower()
+
+
+def _etag_matches(request, etag):
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # weak comparison: gzip-ing proxies may have added W/
+    tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+    return etag in tags
+
+
+def _headers(etag, max_age):
+    return {
+        "ETag": etag,
+        "Vary": "Accept-Encoding",
+        "Cache-Control": f"public, max-age={max_age}" if max_age else "no-cache",
+    }
+
+
+def not_modified(request, etag, max_age=0):
+    """304 response if the client already holds `etag`, else None (check before doing any work)."""
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=_headers(etag, max_age))
+    return None
+
+
+class CachedBody:
+    """Serialized JSON payload plus its ETag; the gzip form is made on first use."""
+
+    def __init__(self, data, etag=None):
+        self.raw = json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        self.etag = etag or '"%s"' % hashlib.blake2b(self.raw, digest_size=12).hexdigest()
+        self._gzipped = None
+
+    @property
+    def gzipped(self):
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.raw, GZIP_LEVEL, mtime=0)
+        return self._gzipped
+
+    def response(self, request, max_age=0):
+        """200 with the body (gzip if accepted), or 304 if the client's copy is current."""
+        cached = not_modified(request, self.etag, max_age)
+        if cached:
+            return cached
+        headers = _headers(self.etag, max_age)
+        body = self.raw
+        if len(body) >= GZIP_MIN_BYTES and _accepts_gzip(request):
+            body = self.gzipped
+            headers["Content-Encoding"] = "gzip"
+        return Response(body, media_type="application/json", headers=headers)
+
+
+# ----------------------------
+# RANGE REQUESTS
+# ----------------------------
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+def byte_range(header, size):
+    """
+    (start, end) inclusive for a single `bytes=` range against `size`.
+    None when the header should be ignored (absent, malformed or multi-range:
+    the full body is sent). Raises RangeNotSatisfiable for ranges past the end.
+    """
+    if not header:
+        return None
+    m = _RANGE_RE.fullmatch(header.strip())
+    if not m or not (m.group(1) or m.group(2)):
+        return None
+    if not m.group(1):  # suffix: last N bytes
+        length = int(m.group(2))
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable(header)
+        return max(0, size - length), size - 1
+    start = int(m.group(1))
+    end = int(m.group(2)) if m.group(2) else size - 1
+    if start >= size:
+        raise RangeNotSatisfiable(header)
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def if_range_ok(request, etag, last_modified=None):
+    """False when If-Range names another version: the Range is then ignored and the full body sent."""
+    header = request.headers.get("if-range")
+    if not header:
+        return True
+    header = header.strip()
+    if header.startswith(('"', "W/")):
+        return header == etag  # strong comparison; weak tags never match
+    return last_modified is not None and header == last_modified
@@ -0,0 +1,428 @@
+# backend/ingest.py
+"""
+Bulk catalog ingestion from Drive folders into `songs`.
+
+    cd backend
+    python ingest.py <folder_id> [<folder_id> ...] --recursive --workers 16
+    python ingest.py <folder_id> --dry-run          # list + probe, no writes
+
+Pipeline:
+  1. files.list pages (1000 per page, partial `fields`) under each folder,
+     into subfolders with --recursive. The listing already carries size,
+     mimeType, md5Checksum and modifiedTime, so callers can prime the
+     /play metadata cache from it (see drive_meta.prime).
+  2. Audio files whose md5Checksum is already in `songs.drive_md5` are
+     skipped unless --force, so re-running over a folder only probes new or
+     replaced files.
+  3. ffprobe in a thread pool reads duration, bitrate and tags from the
+     first INGEST_PROBE_BYTES of each file, fetched with a Range request
+     and piped in (the bearer token stays off ffprobe's command line).
+     Files it cannot read from that prefix (MP4 with the index at the
+     end) are downloaded whole to a temp file.
+     Probes are submitted a few per worker at a time, not all up front, and
+     whatever is still queued is cancelled if a batch fails to commit.
+     Missing tags fall back to "Artist - Title" file names and the
+     Artist/Album/ folder layout.
+  4. Rows are upserted on the unique `songs.drive_file_id` with one
+     `executemany` per INGEST_BATCH_SIZE rows and one commit per batch,
+     while the probes carry on.
+
+Columns the ingest needs (drive_file_id, drive_md5, duration_s, bitrate,
+curated) are added on first run. Rows entered by hand are adopted by
+deriving drive_file_id from their audio_url, so a file is never inserted
+twice, and flagged `curated`: their title/artist/album are kept on every
+later run (--force included), only the probed fields are refreshed.
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.parse import quote_plus
+
+import requests
+
+# ----------------------------
+# CONFIG
+# ----------------------------
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 16))
+# Upper bound for a requested worker count (each one runs an ffprobe)
+INGEST_MAX_WORKERS = int(os.getenv("INGEST_MAX_WORKERS", 64))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 1000))
+
+# Probes queued ahead of the workers (per worker)
+PROBE_WINDOW_PER_WORKER = 4
+
+# ffprobe reads at most this much of each file (tags + first frames)
+INGEST_PROBE_BYTES = int(os.getenv("INGEST_PROBE_BYTES", 256 * 1024))
+
+LIST_PAGE_SIZE = 1000
+LIST_FIELDS = "nextPageToken,files(id,name,mimeType,size,md5Checksum,modifiedTime)"
+FOLDER_MIME = "application/vnd.google-apps.folder"
+# Drive ids are urlsafe base64-ish; anything else must not reach the files.list `q` string
+DRIVE_ID_RE = re.compile(r"[A-Za-z0-9_-]+")
+AUDIO_EXTENSIONS = (".mp3", ".m4a", ".aac", ".flac", ".ogg", ".opus", ".wav")
+
+SONG_COLUMNS = {
+    "drive_file_id": "VARCHAR(128) NULL",
+    "drive_md5": "CHAR(32) NULL",
+    "duration_s": "FLOAT NULL",
+    "bitrate": "INT NULL",
+    "curated": "TINYINT(1) NOT NULL DEFAULT 0",  # hand-entered: never overwrite title/artist/album
+}
+DRIVE_ID_INDEX = "songs_drive_file_id"
+
+# Curated (hand-entered, adopted) rows keep their title/artist/album
+UPSERT_SQL = """
+    INSERT INTO songs (title, artist_name, album_name, audio_url, drive_file_id, drive_md5, duration_s, bitrate)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        title = IF(curated, title, VALUES(title)),
+        artist_name = IF(curated, artist_name, VALUES(artist_name)),
+        album_name = IF(curated, album_name, VALUES(album_name)),
+        drive_md5 = VALUES(drive_md5),
+        duration_s = VALUES(duration_s),
+        bitrate = VALUES(bitrate)
+"""
+
+
+def preview_url(file_id):
+    return f"https://drive.google.com/file/d/{file_id}/preview"
+
+
+# Rows adopted before `curated` existed: not probed yet, or not on the URL ingest writes
+MARK_ADOPTED_SQL = """
+    UPDATE songs SET curated = 1
+    WHERE drive_file_id IS NOT NULL
+    AND (drive_md5 IS NULL OR audio_url <> CONCAT('https://drive.google.com/file/d/', drive_file_id, '/preview'))
+"""
+
+
+def is_audio(item):
+    return (item.get("mimeType", "").startswith("audio/")
+            or item.get("name", "").lower().endswith(AUDIO_EXTENSIONS))
+
+
+# ----------------------------
+# LISTING
+# ----------------------------
+def is_drive_id(value):
+    return isinstance(value, str) and DRIVE_ID_RE.fullmatch(value) is not None
+
+
+def clamp_workers(workers):
+    return min(max(1, int(workers)), INGEST_MAX_WORKERS)
+
+
+def list_folder(folder_id, token, api_base, recursive=False, session=None):
+    """
+    Yield Drive file resources under `folder_id`, one files.list page at a time.
+    Each item gets `folders`: the folder names from `folder_id` down to its parent.
+    """
+    session = session or requests.Session()
+    pending = [(folder_id, [])]
+    while pending:
+        parent, path = pending.pop()
+        if not is_drive_id(parent):
+            raise ValueError(f"Invalid Drive folder id {parent!r}")
+        page_token = None
+        while True:
+            params = {
+                "q": f"'{parent}' in parents and trashed = false",
+                "fields": LIST_FIELDS,
+                "pageSize": LIST_PAGE_SIZE,
+                "supportsAllDrives": "true",
+                "includeItemsFromAllDrives": "true",
+            }
+            if page_token:
+                params["pageToken"] = page_token
+            resp = session.get(f"{api_base()}/files", params=params,
+                               headers={"Authorization": f"Bearer {token()}"}, timeout=30)
+            resp.raise_for_status()
+            data = resp.json()
+            for item in data.get("files", []):
+                if item.get("mimeType") == FOLDER_MIME:
+                    if recursive:
+                        pending.append((item["id"], path + [item.get("name", "")]))
+                    continue
+                item["folders"] = path
+                yield item
+            page_token = data.get("nextPageToken")
+            if not page_token:
+                break
+
+
+# ----------------------------
+# PROBING
+# ----------------------------
+def ffprobe(source, data=None):
+    """ffprobe's format/stream JSON for a local path, or for `data` (bytes) piped to its stdin."""
+    cmd = ["ffprobe", "-v", "error", "-probesize", str(INGEST_PROBE_BYTES),
+           "-print_format", "json", "-show_format", "-show_streams",
+           "pipe:0" if data is not None else str(source)]
+    proc = subprocess.run(cmd, input=data, capture_output=True, timeout=120)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.decode(errors="replace").strip() or f"ffprobe exited {proc.returncode}")
+    return json.loads(proc.stdout)
+
+
+def _number(value, cast):
+    try:
+        return cast(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def song_row(item, probe):
+    """`songs` row for a listed Drive file from its ffprobe output (None = no tags/format info)."""
+    fmt = (probe or {}).get("format", {})
+    tags = {k.lower(): v for k, v in fmt.get("tags", {}).items()}
+    audio = {}
+    for stream in (probe or {}).get("streams", []):
+        if stream.get("codec_type") == "audio":
+            audio = stream
+            for k, v in stream.get("tags", {}).items():
+                tags.setdefault(k.lower(), v)
+            break
+    bitrate = _number(fmt.get("bit_rate"), int) or _number(audio.get("bit_rate"), int)
+    duration = _number(fmt.get("duration"), float)
+    if duration is None and bitrate and item.get("size"):
+        duration = round(int(item["size"]) * 8 / bitrate, 2)  # piped prefix: ffprobe cannot see the length
+
+    stem = os.path.splitext(item.get("name", ""))[0].strip()
+    name_artist, _, name_title = stem.partition(" - ") if " - " in stem else ("", "", stem)
+    folders = item.get("folders", [])
+    title = tags.get("title") or name_title or stem
+    artist = tags.get("artist") or tags.get("album_artist") or name_artist or (folders[-2] if len(folders) > 1 else None)
+    album = tags.get("album") or (folders[-1] if folders else None)
+    return (
+        title.strip()[:255],
+        (artist or "Unknown Artist").strip()[:255],
+        (album or "Unknown Album").strip()[:255],
+        preview_url(item["id"]),
+        item["id"],
+        item.get("md5Checksum"),
+        duration,
+        bitrate,
+    )
+
+
+def probe_item(item, token, api_base):
+    url = f"{api_base()}/files/{quote_plus(item['id'])}?alt=media"
+    headers = {"Authorization": f"Bearer {token()}"}
+    resp = requests.get(url, headers=dict(headers, Range=f"bytes=0-{INGEST_PROBE_BYTES - 1}"), timeout=60)
+    resp.raise_for_status()
+    try:
+        probe = ffprobe("pipe:0", resp.content)
+    except RuntimeError:
+        if resp.status_code != 206:  # that already was the whole file
+            raise
+        with tempfile.NamedTemporaryFile(prefix="ingest-", suffix=os.path.splitext(item.get("name", ""))[1]) as tmp:
+            with requests.get(url, headers=headers, stream=True, timeout=60) as full:
+                full.raise_for_status()
+                for chunk in full.iter_content(1024 * 1024):
+                    tmp.write(chunk)
+            tmp.flush()
+            probe = ffprobe(tmp.name)
+    return song_row(item, probe)
+
+
+# ----------------------------
+# DATABASE
+# ----------------------------
+def ensure_schema(conn, extract_file_id):
+    """Add the ingest columns, adopt hand-entered rows, then add the unique drive_file_id index."""
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute("""
+            SELECT COLUMN_NAME FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'songs'
+        """)
+        existing = {r["COLUMN_NAME"] for r in cur.fetchall()}
+        for column, ddl in SONG_COLUMNS.items():
+            if column not in existing:
+                print(f"[ingest] adding songs.{column}")
+                cur.execute(f"ALTER TABLE songs ADD COLUMN {column} {ddl}")
+                if column == "curated":
+                    cur.execute(MARK_ADOPTED_SQL)
+                    conn.commit()
+
+        cur.execute("SELECT id, audio_url FROM songs WHERE drive_file_id IS NULL AND audio_url IS NOT NULL ORDER BY id")
+        legacy = cur.fetchall()
+        cur.execute("SELECT drive_file_id FROM songs WHERE drive_file_id IS NOT NULL")
+        taken = {r["drive_file_id"] for r in cur.fetchall()}
+        adopt = []
+        for row in legacy:
+            file_id = extract_file_id(row["audio_url"])
+            if file_id and file_id not in taken:  # first (lowest id) row per file wins
+                taken.add(file_id)
+                adopt.append((file_id, row["id"]))
+        if adopt:
+            print(f"[ingest] adopting {len(adopt)} existing songs by Drive file id")
+            cur.executemany("UPDATE songs SET drive_file_id = %s, curated = 1 WHERE id = %s", adopt)
+            conn.commit()
+
+        cur.execute("""
+            SELECT 1 FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'songs' AND INDEX_NAME = %s
+            LIMIT 1
+        """, (DRIVE_ID_INDEX,))
+        if not cur.fetchall():
+            print(f"[ingest] adding unique index {DRIVE_ID_INDEX}")
+            cur.execute(f"ALTER TABLE songs ADD UNIQUE INDEX {DRIVE_ID_INDEX} (drive_file_id)")
+    finally:
+        cur.close()
+
+
+def known_checksums(conn):
+    """{drive_file_id: drive_md5} of songs already ingested."""
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT drive_file_id, drive_md5 FROM songs WHERE drive_file_id IS NOT NULL")
+        return dict(cur.fetchall())
+    finally:
+        cur.close()
+
+
+def upsert(conn, rows):
+    """One multi-row INSERT ... ON DUPLICATE KEY UPDATE and one commit for `rows`."""
+    cur = conn.cursor()
+    try:
+        cur.executemany(UPSERT_SQL, rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+# ----------------------------
+# DRIVER
+# ----------------------------
+def run(folder_ids, token, api_base, connect, extract_file_id, recursive=False, force=False,
+        dry_run=False, workers=INGEST_WORKERS, batch_size=INGEST_BATCH_SIZE,
+        on_listed=None, on_batch=None, log=print):
+    """
+    Ingest every audio file under `folder_ids`. Returns a summary dict.
+
+    `token()` / `api_base()` give the Drive bearer token and v3 base,
+    `connect()` a MySQL connection. `on_listed(items)` sees each listing
+    page (e.g. drive_meta.prime) and `on_batch(rows)` each committed batch
+    (e.g. bump the catalog version), so a running server updates as it goes.
+    """
+    bad = [f for f in folder_ids if not is_drive_id(f)]
+    if bad:
+        raise ValueError(f"Invalid Drive folder id(s): {', '.join(map(repr, bad))}")
+    if shutil.which("ffprobe") is None:
+        raise RuntimeError("ffprobe is required for ingestion (install ffmpeg)")
+    start = time.perf_counter()
+    stats = {"listed": 0, "audio": 0, "unchanged": 0, "probed": 0, "failed": 0, "upserted": 0, "batches": 0}
+    failures = []
+
+    conn = None if dry_run else connect()
+    try:
+        if conn is not None:
+            ensure_schema(conn, extract_file_id)
+        known = {} if (force or conn is None) else known_checksums(conn)
+
+        todo = []
+        session = requests.Session()
+        for folder_id in folder_ids:
+            page = []
+            for item in list_folder(folder_id, token, api_base, recursive, session):
+                stats["listed"] += 1
+                page.append(item)
+                if on_listed and len(page) >= LIST_PAGE_SIZE:
+                    on_listed(page)
+                    page = []
+                if not is_audio(item):
+                    continue
+                stats["audio"] += 1
+                if item.get("md5Checksum") and known.get(item["id"]) == item["md5Checksum"]:
+                    stats["unchanged"] += 1
+                    continue
+                todo.append(item)
+            if on_listed and page:
+                on_listed(page)
+        log(f"[ingest] listed {stats['listed']} files, {stats['audio']} audio, "
+            f"{len(todo)} to probe ({stats['unchanged']} unchanged)")
+
+        batch = []
+
+        def flush():
+            if batch and conn is not None:
+                upsert(conn, batch)
+                stats["upserted"] += len(batch)
+                stats["batches"] += 1
+                if on_batch:
+                    on_batch(list(batch))
+            batch.clear()
+
+        # at most `window` probes queued at once, so a failed upsert leaves little to cancel
+        workers = clamp_workers(workers)
+        window = workers * PROBE_WINDOW_PER_WORKER
+        queue = iter(todo)
+        futures = {}
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest-probe") as pool:
+            def top_up():
+                for item in islice(queue, window - len(futures)):
+                    futures[pool.submit(probe_item, item, token, api_base)] = item
+
+            try:
+                top_up()
+                while futures:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        item = futures.pop(future)
+                        try:
+                            batch.append(future.result())
+                            stats["probed"] += 1
+                        except Exception as e:
+                            stats["failed"] += 1
+                            failures.append({"id": item["id"], "name": item.get("name"), "error": str(e)[:300]})
+                    if len(batch) >= batch_size:
+                        flush()
+                        log(f"[ingest] {stats['probed']}/{len(todo)} probed, {stats['upserted']} upserted")
+                    top_up()
+                flush()
+            except BaseException:
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+    finally:
+        if conn is not None:
+            conn.close()
+
+    elapsed = time.perf_counter() - start
+    return dict(stats, seconds=round(elapsed, 2),
+                files_per_second=round(stats["probed"] / elapsed, 1) if elapsed else None,
+                dry_run=dry_run, failures=failures[:100])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python ingest.py", description="Ingest Drive folders into songs")
+    parser.add_argument("folders", nargs="+", help="Drive folder ids")
+    parser.add_argument("--recursive", action="store_true", help="descend into subfolders")
+    parser.add_argument("--force", action="store_true", help="re-probe files whose checksum is unchanged")
+    parser.add_argument("--dry-run", action="store_true", help="list and probe only; no DB writes")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="parallel ffprobe processes")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="rows per executemany/commit")
+    args = parser.parse_args(argv)
+
+    # same credentials / DB settings as the server
+    import main as server
+    summary = run(args.folders, server.get_drive_access_token, lambda: server.DRIVE_API_BASE,
+                  server.get_db_connection, server.extract_drive_file_id, recursive=args.recursive,
+                  force=args.force, dry_run=args.dry_run, workers=args.workers, batch_size=args.batch_size)
+    print(json.dumps(summary, indent=2))
+    return 0 if not summary["failed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
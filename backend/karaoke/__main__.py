@@ -0,0 +1,42 @@
+"""
+Command line for the karaoke pipeline:
+
+    cd backend
+    python -m karaoke song "<title>" [--mode fast]
+    python -m karaoke backfill [--workers N] [--shard i/n] ...
+    python -m karaoke migrate          # add the cache columns to karaoke_assets
+
+Lives here rather than under karaoke.karaoke's `if __name__ == "__main__"`,
+so the pipeline module is imported once (as karaoke.karaoke) and not a
+second time as __main__ with its own model registry and pools.
+"""
+import json
+import argparse
+
+from karaoke import backfill, cache
+from karaoke import karaoke
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m karaoke", description="Karaoke generation")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    one = sub.add_parser("song", help="process a single song by title")
+    one.add_argument("song_name")
+    one.add_argument("--mode", choices=karaoke.SEPARATION_MODES)
+
+    backfill.add_arguments(sub.add_parser("backfill", help="render every song without karaoke assets"))
+    sub.add_parser("migrate", help="add the result-cache columns to karaoke_assets")
+
+    args = parser.parse_args(argv)
+    if args.command == "song":
+        print(json.dumps(karaoke.ensure_karaoke(args.song_name, mode=args.mode), indent=2))
+    elif args.command == "migrate":
+        with karaoke.db_cursor() as cur:
+            print(json.dumps({"added": cache.migrate(cur)}))
+    else:
+        print(json.dumps(backfill.run(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
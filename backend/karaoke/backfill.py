@@ -0,0 +1,232 @@
+"""
+Catalog-wide karaoke backfill.
+
+Renders every song that has no processed karaoke_assets row, sharded
+across worker processes:
+
+    cd backend
+    python -m karaoke backfill --workers 4 --mode fast
+    python -m karaoke backfill --shard 0/2      # this box takes half the catalog
+
+Each worker keeps its models loaded across songs (karaoke.models.registry)
+and downloads the next song of its batch while the current one renders.
+Every finished song is appended to a JSONL checkpoint, so a rerun after a
+crash skips what is already done.
+"""
+import os
+import json
+import time
+import logging
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from karaoke import cache
+
+log = logging.getLogger("karaoke")
+
+# ============================================
+# CONFIGURATION
+# ============================================
+CHECKPOINT_FILE = os.getenv("KARAOKE_BACKFILL_CHECKPOINT", "temp_karaoke/backfill.jsonl")
+
+# Songs handed to a worker at once (the unit of prefetching)
+BATCH_SIZE = int(os.getenv("KARAOKE_BACKFILL_BATCH", 4))
+
+
+# ============================================
+# SELECTION
+# ============================================
+def pending_songs(cur, include_stale=False, version=None):
+    """
+    Songs without processed karaoke assets (LEFT JOIN karaoke_assets).
+    With `include_stale`, songs rendered by another pipeline version too
+    (every rendered song while the pipeline_version column is missing).
+    """
+    stale = ""
+    params = []
+    if include_stale and version:
+        if cache.columns_ready(cur):
+            stale = "OR k.pipeline_version IS NULL OR k.pipeline_version <> %s"
+            params.append(str(version))
+        else:
+            stale = "OR TRUE"
+    sql = f"""
+        SELECT s.id, s.title, s.audio_url
+        FROM songs s
+        LEFT JOIN karaoke_assets k ON k.song_id = s.id AND k.processed = 1
+        WHERE s.audio_url IS NOT NULL AND s.audio_url <> ''
+          AND (k.song_id IS NULL {stale})
+        ORDER BY s.id
+    """
+    cur.execute(sql, params)
+    return cur.fetchall()
+
+
+def in_shard(song_id, shard):
+    index, count = shard
+    return count <= 1 or int(song_id) % count == index
+
+
+def parse_shard(value):
+    """'i/n' → (i, n)."""
+    index, count = (int(x) for x in value.split("/"))
+    if not 0 <= index < count:
+        raise ValueError(f"shard index must be in [0, {count})")
+    return index, count
+
+
+# ============================================
+# CHECKPOINT
+# ============================================
+def load_checkpoint(path):
+    """{song_id: last record} from a checkpoint file (missing file → empty)."""
+    done = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # torn last line after a crash
+                done[rec["song_id"]] = rec
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def append_checkpoint(path, record):
+    # one write() per line on an O_APPEND fd: workers never interleave records
+    line = (json.dumps(record) + "\n").encode()
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# ============================================
+# WORKERS
+# ============================================
+def _init_worker(threads):
+    import torch
+    torch.set_num_threads(threads)
+
+
+def _prefetch(karaoke, song, scratch):
+    """Download a song's source ahead of time; returns the local path or None."""
+    file_id = karaoke.drive_file_id(song["audio_url"])
+    if not file_id:
+        return None
+    path = Path(scratch) / f"prefetch-{song['id']}"
+    karaoke.download_from_drive(file_id, path)
+    return path
+
+
+def run_batch(songs, mode, device, checkpoint):
+    """Worker entry point: render `songs` in order, checkpointing each one."""
+    from karaoke import karaoke
+
+    device = device or karaoke.default_device()
+    results = []
+    with karaoke.job_workdir() as scratch, ThreadPoolExecutor(max_workers=1) as io_pool:
+        upcoming = io_pool.submit(_prefetch, karaoke, songs[0], scratch)
+        for i, song in enumerate(songs):
+            start = time.perf_counter()
+            record = {"song_id": song["id"], "title": song["title"], "mode": mode, "pid": os.getpid()}
+            try:
+                local_audio = upcoming.result()
+            except Exception as e:
+                log.warning("Prefetch failed for %s: %s", song["title"], e)
+                local_audio = None
+            if i + 1 < len(songs):
+                upcoming = io_pool.submit(_prefetch, karaoke, songs[i + 1], scratch)
+            try:
+                result = karaoke.process_song_row(song, device, mode=mode, local_audio=local_audio)
+                record.update(status="done", cached=result.get("cached", False))
+            except Exception as e:
+                log.error("Backfill failed for %s (%s): %s", song["title"], song["id"], e)
+                record.update(status="failed", error=str(e))
+            record["seconds"] = round(time.perf_counter() - start, 2)
+            record["finished_at"] = time.time()
+            append_checkpoint(checkpoint, record)
+            results.append(record)
+    return results
+
+
+# ============================================
+# DRIVER
+# ============================================
+def add_arguments(parser):
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 4),
+                        help="worker processes (each holds its own models)")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="torch threads per worker (default: cores / workers)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--mode", help="separation mode (default: KARAOKE_SEPARATION_MODE)")
+    parser.add_argument("--device", help="cpu / cuda (default: auto)")
+    parser.add_argument("--shard", default="0/1", help="i/n: only songs with id %% n == i")
+    parser.add_argument("--limit", type=int, help="at most this many songs")
+    parser.add_argument("--include-stale", action="store_true",
+                        help="also re-render songs made by another pipeline version")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="retry songs the checkpoint records as failed")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE)
+
+
+def run(args):
+    from karaoke import karaoke
+
+    mode = args.mode or karaoke.SEPARATION_MODE
+    if mode not in karaoke.SEPARATION_MODES:
+        raise ValueError(f"Unknown separation mode '{mode}'")
+    shard = parse_shard(args.shard)
+
+    with karaoke.db_cursor() as cur:
+        songs = pending_songs(cur, args.include_stale, karaoke.pipeline_version(mode))
+
+    checkpoint = load_checkpoint(args.checkpoint)
+    skip = {sid for sid, rec in checkpoint.items()
+            if rec.get("mode") == mode and (rec["status"] == "done" or not args.retry_failed)}
+    todo = [s for s in songs if in_shard(s["id"], shard) and s["id"] not in skip]
+    if args.limit:
+        todo = todo[:args.limit]
+
+    log.info("Backfill: %d pending, %d in shard %s after checkpoint, mode=%s, %d workers",
+             len(songs), len(todo), args.shard, mode, args.workers)
+    if not todo:
+        return {"songs": 0}
+
+    Path(args.checkpoint).parent.mkdir(parents=True, exist_ok=True)
+    threads = args.threads or max(1, (os.cpu_count() or 1) // args.workers)
+    batches = [todo[i:i + args.batch_size] for i in range(0, len(todo), args.batch_size)]
+
+    done = failed = 0
+    start = time.perf_counter()
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=ctx,
+                             initializer=_init_worker, initargs=(threads,)) as pool:
+        futures = [pool.submit(run_batch, batch, mode, args.device, args.checkpoint) for batch in batches]
+        for future in as_completed(futures):
+            try:
+                records = future.result()
+            except Exception as e:  # worker died (OOM kill, ...): its songs stay pending
+                log.error("Backfill worker crashed: %s", e)
+                continue
+            done += sum(1 for r in records if r["status"] == "done")
+            failed += sum(1 for r in records if r["status"] == "failed")
+            elapsed = time.perf_counter() - start
+            log.info("Backfill: %d/%d done, %d failed, %.1f songs/hour",
+                     done, len(todo), failed, done / elapsed * 3600)
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        "songs": len(todo),
+        "done": done,
+        "failed": failed,
+        "hours": round(elapsed / 3600, 3),
+        "songs_per_hour": round(done / elapsed * 3600, 1) if elapsed else None,
+    }
+    log.info("Backfill finished: %s", summary)
+    return summary
@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+from pathlib import Path
+
+log = logging.getLogger("karaoke")
+
+# ============================================
+# CONFIGURATION
+# ============================================
+# Content-addressed store: <dir>/<hash[:2]>/<hash>/<pipeline version>/
+CACHE_DIR = Path(os.getenv("KARAOKE_CACHE_DIR", "temp_karaoke/cache"))
+
+# Keep stems + lyrics locally (not just the result URLs)
+STORE_ARTIFACTS = os.getenv("KARAOKE_CACHE_ARTIFACTS", "1") == "1"
+
+# Byte budget for stored stems + lyrics; least recently used entries are
+# pruned past it (result.json files are tiny and always kept). 0 = unbounded
+CACHE_MAX_BYTES = int(os.getenv("KARAOKE_CACHE_MAX_BYTES", 10 * 1024 ** 3))
+
+# Entries used this recently are never pruned (a job may be reading them)
+PRUNE_MIN_AGE = float(os.getenv("KARAOKE_CACHE_PRUNE_MIN_AGE", 60 * 60))
+
+RESULT_FILE = "result.json"
+
+# karaoke_assets columns the cache needs; added by `migrate` (python -m karaoke migrate),
+# never by the server itself. Until they exist, only the local store is consulted.
+CACHE_COLUMNS = {
+    "source_hash": "VARCHAR(64) NULL",
+    "pipeline_version": "VARCHAR(32) NULL",
+}
+
+_columns_ready = False
+_warned_missing = False
+
+
+# ============================================
+# HASHING
+# ============================================
+def file_digest(path, chunk_size=1024 * 1024):
+    """MD5 of a local file (same algorithm as Drive's md5Checksum)."""
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# ============================================
+# LOCAL CONTENT-ADDRESSED STORE
+# ============================================
+def entry_dir(content_hash, version):
+    return CACHE_DIR / content_hash[:2] / content_hash / str(version)
+
+
+def load_result(content_hash, version):
+    """Previously published result (URLs + sample lyrics) for this audio, or None."""
+    path = entry_dir(content_hash, version) / RESULT_FILE
+    if not path.exists():
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def store_result(content_hash, version, result):
+    d = entry_dir(content_hash, version)
+    d.mkdir(parents=True, exist_ok=True)
+    tmp = d / (RESULT_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+    os.replace(tmp, d / RESULT_FILE)
+
+
+def load_artifacts(content_hash, version, names):
+    """{name: path} if every named artifact is in the store, else None."""
+    d = entry_dir(content_hash, version)
+    paths = {name: d / name for name in names}
+    if all(p.exists() for p in paths.values()):
+        _touch(d)
+        return {name: str(p) for name, p in paths.items()}
+    return None
+
+
+def store_artifacts(content_hash, version, files):
+    """Copy (hard-link when possible) {name: path} into the store, then prune to CACHE_MAX_BYTES."""
+    if not STORE_ARTIFACTS:
+        return
+    d = entry_dir(content_hash, version)
+    d.mkdir(parents=True, exist_ok=True)
+    for name, src in files.items():
+        dst = d / name
+        if dst.exists():
+            continue
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+    _touch(d)
+    prune_artifacts()
+
+
+def _touch(d):
+    """An entry's directory mtime is its last use (the LRU order for pruning)."""
+    try:
+        os.utime(d)
+    except OSError:
+        pass
+
+
+def _artifact_entries():
+    """[(last used, bytes, artifact paths)] for every store entry holding artifacts."""
+    out = []
+    for d in CACHE_DIR.glob("*/*/*"):
+        try:
+            files = [p for p in d.iterdir() if p.name != RESULT_FILE and not p.name.endswith(".tmp")]
+            if files:
+                out.append((d.stat().st_mtime, sum(p.stat().st_size for p in files), files))
+        except OSError:
+            continue  # not a directory, or pruned by another process meanwhile
+    return out
+
+
+def prune_artifacts(budget=None):
+    """Delete stored artifacts, least recently used first, until they fit `budget`. Returns bytes freed."""
+    budget = CACHE_MAX_BYTES if budget is None else budget
+    if not budget:
+        return 0
+    entries = sorted(_artifact_entries(), key=lambda e: e[0])
+    excess = sum(size for _, size, _ in entries) - budget
+    freed = 0
+    cutoff = time.time() - PRUNE_MIN_AGE
+    for used, size, files in entries:
+        if freed >= excess or used > cutoff:
+            break
+        for p in files:
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+        freed += size
+    if freed:
+        log.info("Pruned %.1f MB of stored karaoke artifacts", freed / 1024 ** 2)
+    return freed
+
+
+# ============================================
+# DATABASE LOOKUP
+# ============================================
+def missing_columns(cur):
+    """CACHE_COLUMNS not yet on karaoke_assets (`cur` must be a dictionary cursor)."""
+    cur.execute("""
+        SELECT COLUMN_NAME FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'karaoke_assets'
+    """)
+    existing = {r["COLUMN_NAME"] for r in cur.fetchall()}
+    return [column for column in CACHE_COLUMNS if column not in existing]
+
+
+def columns_ready(cur):
+    """
+    Whether the cache columns exist. Only a positive answer is remembered,
+    so a migration run while the server is up is picked up without a restart.
+    """
+    global _columns_ready, _warned_missing
+    if _columns_ready:
+        return True
+    try:
+        missing = missing_columns(cur)
+    except Exception as e:
+        log.error("karaoke_assets cache columns unavailable: %s", e)
+        return False
+    if missing and not _warned_missing:
+        log.warning("karaoke_assets lacks %s; run `python -m karaoke migrate`", ", ".join(missing))
+        _warned_missing = True
+    _columns_ready = not missing
+    return _columns_ready
+
+
+def migrate(cur):
+    """Add the missing cache columns to karaoke_assets. Returns the ones added."""
+    added = missing_columns(cur)
+    for column in added:
+        log.info("Adding karaoke_assets.%s", column)
+        cur.execute(f"ALTER TABLE karaoke_assets ADD COLUMN {column} {CACHE_COLUMNS[column]}")
+    return added
+
+
+def lookup_db(cur, song_id, content_hash, version):
+    """Published asset URLs for this song if they were built from the same audio + pipeline."""
+    if not columns_ready(cur):
+        return None
+    cur.execute("""
+        SELECT vocals_url, accompaniment_url, lyrics_url
+        FROM karaoke_assets
+        WHERE song_id = %s AND processed = 1
+          AND source_hash = %s AND pipeline_version = %s
+        LIMIT 1
+    """, (song_id, content_hash, str(version)))
+    return cur.fetchone()
@@ -0,0 +1,84 @@
+import os
+import logging
+import subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger("karaoke")
+
+# ============================================
+# CONFIGURATION
+# ============================================
+# Format of the published stems: "mp3", "m4a" (AAC), "opus" or "wav" (no
+# encoding). MP3 by default: Ogg/Opus does not play reliably in Safari/iOS
+# <audio>, so it is opt-in.
+STEM_FORMAT = os.getenv("KARAOKE_STEM_FORMAT", "mp3")
+STEM_BITRATE = os.getenv("KARAOKE_STEM_BITRATE", "128k")
+
+# ffmpeg processes allowed at once (per worker process)
+ENCODE_WORKERS = int(os.getenv("KARAOKE_ENCODE_WORKERS", 2))
+
+# format → (extension, mimetype, ffmpeg codec args)
+FORMATS = {
+    "mp3": (".mp3", "audio/mpeg", ["-c:a", "libmp3lame"]),
+    "m4a": (".m4a", "audio/mp4", ["-c:a", "aac", "-movflags", "+faststart"]),
+    "opus": (".opus", "audio/ogg", ["-c:a", "libopus", "-vbr", "on"]),
+    "wav": (".wav", "audio/wav", None),
+}
+
+# threads start on first use
+_pool = ThreadPoolExecutor(max_workers=ENCODE_WORKERS, thread_name_prefix="karaoke-encode")
+
+
+def _format(fmt):
+    fmt = fmt or STEM_FORMAT
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown stem format '{fmt}'")
+    return fmt
+
+
+def stem_name(stem, fmt=None):
+    """File name of a published stem, e.g. stem_name("vocals") → "vocals.mp3"."""
+    return stem + FORMATS[_format(fmt)][0]
+
+
+def mime_type(fmt=None):
+    return FORMATS[_format(fmt)][1]
+
+
+# ============================================
+# ENCODING
+# ============================================
+def encode(src, fmt=None, bitrate=None):
+    """
+    Encode a WAV stem next to itself with ffmpeg and return the new path.
+    "wav" returns `src` unchanged.
+    """
+    fmt = _format(fmt)
+    ext, _, codec = FORMATS[fmt]
+    if codec is None:
+        return str(src)
+
+    dst = Path(src).with_suffix(ext)
+    cmd = ["ffmpeg", "-nostdin", "-loglevel", "error", "-y", "-i", str(src), "-vn",
+           *codec, "-b:a", bitrate or STEM_BITRATE, str(dst)]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True)
+    except FileNotFoundError:
+        raise RuntimeError("ffmpeg is required to encode stems (or set KARAOKE_STEM_FORMAT=wav)")
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"ffmpeg failed on {src}: {e.stderr.decode(errors='replace').strip()}")
+
+    log.info("Encoded %s → %s (%.1f MB → %.1f MB)", Path(src).name, dst.name,
+             os.path.getsize(src) / 1e6, os.path.getsize(dst) / 1e6)
+    return str(dst)
+
+
+def background(fn, *args):
+    """Run another ffmpeg-bound task (e.g. waveform peaks) on the encode pool."""
+    return _pool.submit(fn, *args)
+
+
+def submit(src, fmt=None, bitrate=None):
+    """Start encoding in the background; returns a Future resolving to the encoded path."""
+    return _pool.submit(encode, src, fmt, bitrate)
@@ -0,0 +1,326 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import tracing
+
+log = logging.getLogger("karaoke")
+
+# ============================================
+# CONFIGURATION
+# ============================================
+# Karaoke jobs allowed to run at the same time
+KARAOKE_WORKERS = int(os.getenv("KARAOKE_WORKERS", 1))
+
+# "thread" runs jobs in this process; "process" runs each job in a worker
+# process (spawned, so CUDA works) so several songs use separate cores
+KARAOKE_EXECUTOR = os.getenv("KARAOKE_EXECUTOR", "thread")
+
+# Jobs waiting + running before new submissions are refused
+KARAOKE_MAX_PENDING = int(os.getenv("KARAOKE_MAX_PENDING", 20))
+
+# How long finished jobs stay queryable (seconds)
+KARAOKE_JOB_TTL = float(os.getenv("KARAOKE_JOB_TTL", 3600))
+
+# Pipeline stages in order, with the share of total progress each one ends at
+STAGES = [
+    ("queued", 0.0),
+    ("lookup", 0.02),
+    ("download", 0.10),
+    ("separate", 0.55),
+    ("align", 0.82),
+    ("encode", 0.87),
+    ("upload", 0.97),
+    ("save", 1.0),
+]
+STAGE_PROGRESS = dict(STAGES)
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+# trace track the stage spans are drawn on (stays valid with executor="process",
+# where spans inside the runner are not collected)
+STAGE_TRACK = 1
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _run_in_child(runner, job_id, song_name, options, progress_q):
+    """Entry point inside a pool process; stage updates travel back over a queue."""
+    return runner(song_name, lambda stage, **info: progress_q.put((job_id, stage, info)), **options)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class KaraokeJob:
+    def __init__(self, song_key, song_name, options=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.song_key = song_key
+        self.song_name = song_name
+        self.options = dict(options or {})
+        self.status = QUEUED
+        self.stage = "queued"
+        self.stage_started = time.time()
+        self.stage_seconds = {}
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.error_status = None  # HTTP status for a failed job: 404 on FileNotFoundError, else 500
+        self.spaces = set()
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.preview_path = None
+        self.trace = None
+        self.done = threading.Event()
+        self.waiters = []  # (loop, future) of requests awaiting the result
+
+    @property
+    def active(self):
+        return self.status in (QUEUED, RUNNING)
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "song_name": self.song_name,
+            "options": self.options,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": round(self.progress, 3),
+            "stage_seconds": {k: round(v, 2) for k, v in self.stage_seconds.items()},
+            "result": self.result,
+            "error": self.error,
+            "error_status": self.error_status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "preview_url": f"/karaoke_jobs/{self.id}/preview" if self.preview_path and self.active else None,
+        }
+
+
+class JobManager:
+    """
+    Runs karaoke jobs off the event loop with bounded concurrency.
+
+    `runner(song_name, progress, **options)` does the actual work and calls
+    `progress(stage)` as it moves through STAGES (`progress(stage, preview=path)`
+    once an early accompaniment preview exists). `on_update(job)` is an
+    optional coroutine scheduled on the event loop after every state change
+    (used to push Socket.IO progress events). `on_stage(job, stage, seconds)`
+    is called from worker threads each time a stage ends, the last time
+    after the job's final status is set.
+
+    With executor="process" the runner must be picklable (a module-level
+    function); each worker process keeps its own model registry.
+    """
+
+    def __init__(self, runner, workers=KARAOKE_WORKERS, max_pending=KARAOKE_MAX_PENDING,
+                 ttl=KARAOKE_JOB_TTL, on_update=None, executor=KARAOKE_EXECUTOR, on_stage=None):
+        self.runner = runner
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.on_update = on_update
+        self.on_stage = on_stage
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="karaoke")
+        self.jobs = {}
+        self.active_by_song = {}
+        self._lock = threading.Lock()
+        self._loop = None
+
+        self._procs = None
+        self._progress_q = None
+        if executor == "process":
+            ctx = multiprocessing.get_context("spawn")
+            self._procs = ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+            self._manager = ctx.Manager()
+            self._progress_q = self._manager.Queue()
+            threading.Thread(target=self._drain_progress, daemon=True).start()
+
+    # ------------------------------------
+    # submission / lookup
+    # ------------------------------------
+    def submit(self, song_name, space=None, options=None):
+        """
+        Queue a job for `song_name`, or join the active job for the same song
+        and options (extra runner kwargs, e.g. {"mode": "fast"}).
+        Returns (job, created).
+        """
+        if self._loop is None:
+            try:
+                self._loop = asyncio.get_running_loop()
+            except RuntimeError:
+                pass
+
+        options = {k: v for k, v in (options or {}).items() if v is not None}
+        key = song_name.strip().lower()
+        if options:
+            key += "|" + "|".join(f"{k}={options[k]}" for k in sorted(options))
+        with self._lock:
+            self._prune()
+            job = self.active_by_song.get(key)
+            if job:
+                if space:
+                    job.spaces.add(space)
+                return job, False
+
+            pending = sum(1 for j in self.jobs.values() if j.active)
+            if pending >= self.max_pending:
+                raise QueueFull(f"{pending} karaoke jobs already pending")
+
+            job = KaraokeJob(key, song_name.strip(), options)
+            # traced request → traced job (else TRACE_SAMPLE_RATE decides)
+            job.trace = tracing.start(f"karaoke_job {job.song_name}", forced=tracing.current() is not None)
+            if space:
+                job.spaces.add(space)
+            self.jobs[job.id] = job
+            self.active_by_song[key] = job
+
+        self.executor.submit(self._run, job)
+        self._notify(job)
+        return job, True
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    async def wait(self, job, timeout):
+        """
+        Wait until the job finishes or `timeout` passes. The worker resolves
+        a future on the caller's loop, so no thread is parked meanwhile.
+        """
+        loop = asyncio.get_running_loop()
+        waiter = (loop, loop.create_future())
+        with self._lock:
+            if job.done.is_set():
+                return job
+            job.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                if waiter in job.waiters:
+                    job.waiters.remove(waiter)
+        return job
+
+    def _wake_waiters(self, job):
+        with self._lock:
+            waiters, job.waiters = job.waiters, []
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:  # loop already closed
+                pass
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        for job_id, job in list(self.jobs.items()):
+            if not job.active and job.finished_at and job.finished_at < cutoff:
+                del self.jobs[job_id]
+
+    # ------------------------------------
+    # execution
+    # ------------------------------------
+    def _end_stage(self, job):
+        now = time.time()
+        seconds = now - job.stage_started
+        job.stage_seconds[job.stage] = job.stage_seconds.get(job.stage, 0.0) + seconds
+        if job.trace:
+            end = time.perf_counter()
+            job.trace.thread_names[STAGE_TRACK] = "karaoke stages"
+            job.trace.add_span(job.stage, end - seconds, end, tid=STAGE_TRACK)
+        job.stage_started = now
+        if self.on_stage:
+            try:
+                self.on_stage(job, job.stage, seconds)
+            except Exception as e:
+                log.warning("on_stage hook failed: %s", e)
+
+    def _set_stage(self, job, stage, preview=None):
+        if preview:
+            job.preview_path = preview
+        if stage != job.stage:
+            self._end_stage(job)
+        job.stage = stage
+        job.progress = max(job.progress, STAGE_PROGRESS.get(stage, job.progress))
+        self._notify(job)
+
+    def _call_runner(self, job):
+        if self._procs is None:
+            return self.runner(job.song_name, lambda stage, **info: self._set_stage(job, stage, **info),
+                               **job.options)
+        future = self._procs.submit(_run_in_child, self.runner, job.id, job.song_name,
+                                    job.options, self._progress_q)
+        return future.result()
+
+    def _drain_progress(self):
+        while True:
+            try:
+                item = self._progress_q.get()
+            except (EOFError, OSError):
+                return
+            if item is None:
+                return
+            job_id, stage, info = item
+            job = self.jobs.get(job_id)
+            if job and job.active:
+                self._set_stage(job, stage, **info)
+
+    def _run(self, job):
+        job.status = RUNNING
+        job.started_at = time.time()
+        self._notify(job)
+        try:
+            with tracing.activate(job.trace):
+                job.result = self._call_runner(job)
+            job.status = DONE
+        except Exception as e:
+            log.error("Karaoke job %s (%s) failed: %s", job.id, job.song_name, e)
+            job.status = FAILED
+            job.error = str(e)
+            job.error_status = 404 if isinstance(e, FileNotFoundError) else 500
+        finally:
+            self._end_stage(job)
+            if job.status == DONE:
+                job.stage = "done"
+                job.progress = 1.0
+            job.finished_at = time.time()
+            tracing.finish(job.trace)
+            with self._lock:
+                if self.active_by_song.get(job.song_key) is job:
+                    del self.active_by_song[job.song_key]
+            job.done.set()
+            self._wake_waiters(job)
+            self._notify(job)
+
+    def _notify(self, job):
+        if not self.on_update or self._loop is None or self._loop.is_closed():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.on_update(job), self._loop)
+        except RuntimeError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self.jobs.values())
+        counts = {}
+        for j in jobs:
+            counts[j.status] = counts.get(j.status, 0) + 1
+        return {"jobs": counts, "active_songs": sorted(self.active_by_song.keys())}
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self._procs is not None:
+            self._procs.shutdown(wait=False, cancel_futures=True)
+            self._progress_q.put(None)
+            self._manager.shutdown()
@@ -2,24 +2,27 @@ import os
 import re
 import json
 import shutil
+import tempfile
+import subprocess
 import logging
-import argparse
+import threading
 from pathlib import Path
+from contextlib import contextmanager
 from datetime import datetime
+from typing import Optional
 
 import mysql.connector
-import torch
-import torchaudio
 
-from demucs import pretrained
-from demucs.apply import apply_model
+# torch / torchaudio / demucs / whisperx / soundfile and the Google client
+# are imported where they are used, so importing this module (main.py does)
+# stays cheap; preload() pulls them in ahead of the first job.
 
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
-import io
-
-import whisperx
+from karaoke.models import registry
+from karaoke import cache
+from karaoke import encode
+from karaoke import vad
+from tracing import traced
+import peaks
 # ============================================
 # FASTAPI WRAPPER FOR MAIN.PY
 # ============================================
@@ -42,13 +45,74 @@ DB_USER = "root"
 DB_PASS = "IkhVcxwZGDffmOyXscESAdoSqSDepypx"
 DB_NAME = "railway"
 
-# Temporary working directory
+# Temporary working directory (each job gets its own subdirectory)
 TMP = Path("temp_karaoke")
 TMP.mkdir(exist_ok=True)
 
+# Keep per-job scratch directories after the job (debugging)
+KEEP_WORKDIRS = os.getenv("KARAOKE_KEEP_WORKDIRS", "0") == "1"
+
 # For testing without changing DB or Drive
 DRY_RUN = False
 
+# Models (loaded once per process through karaoke.models.registry)
+DEMUCS_MODEL = "mdx_extra"
+
+# Separation modes, both Demucs (drums+bass+other summed to accompaniment):
+# "quality" = DEMUCS_MODEL (mdx_extra, a bag of 4 models), "fast" =
+# FAST_DEMUCS_MODEL (htdemucs, a single model: roughly a quarter of the work)
+SEPARATION_MODES = ("quality", "fast")
+SEPARATION_MODE = os.getenv("KARAOKE_SEPARATION_MODE", "quality")
+FAST_DEMUCS_MODEL = os.getenv("KARAOKE_FAST_DEMUCS_MODEL", "htdemucs")
+DEMUCS_SAMPLERATE = 44100
+
+WHISPER_MODEL = "base"
+ALIGN_LANGUAGE = "en"
+
+# Audio segments transcribed per WhisperX forward pass
+WHISPER_BATCH_SIZE = int(os.getenv("KARAOKE_WHISPER_BATCH_SIZE", 8))
+
+# "full" transcribes the whole vocal stem; "vad" only its voiced regions
+# (karaoke.vad), stitched together and mapped back afterwards; "auto" = vad on CPU
+ASR_MODE = os.getenv("KARAOKE_ASR_MODE", "auto")
+
+# CTranslate2 compute type (default: int8 on CPU, float16 on CUDA) and CPU threads
+WHISPER_COMPUTE_TYPE = os.getenv("KARAOKE_WHISPER_COMPUTE_TYPE", "")
+WHISPER_THREADS = int(os.getenv("KARAOKE_WHISPER_THREADS", os.cpu_count() or 4))
+WHISPER_SAMPLE_RATE = 16000
+
+# Separate in overlapping windows so peak memory stays flat and the first
+# window is usable early: "auto" (CPU only), "1" (always) or "0" (never)
+STREAM_SEPARATION = os.getenv("KARAOKE_STREAM_SEPARATION", "auto")
+SEGMENT_SECONDS = float(os.getenv("KARAOKE_SEGMENT_SECONDS", 30))
+OVERLAP_SECONDS = float(os.getenv("KARAOKE_OVERLAP_SECONDS", 2))
+
+# Bump whenever models or processing change the output; cached results
+# from other versions are ignored and recomputed.
+# "2": windowed (streaming) separation. Streamed and whole-track stems share
+# one version on purpose: the crossfaded windows are an accepted substitute,
+# and a per-device tag would make CPU and GPU hosts recompute each other's
+# results. Changing SEGMENT/OVERLAP defaults needs a bump like any other
+# output change.
+PIPELINE_VERSION = "2"
+
+
+def pipeline_version(mode=None):
+    """
+    Cache version for a separation mode + stem format; "quality" with WAV
+    stems keeps the original tag.
+    """
+    mode = mode or SEPARATION_MODE
+    version = PIPELINE_VERSION if mode == "quality" else f"{PIPELINE_VERSION}-{mode}"
+    if encode.STEM_FORMAT != "wav":
+        version += f"-{encode.STEM_FORMAT}{encode.STEM_BITRATE}"
+    return version
+
+
+def artifact_names():
+    """Files a finished render publishes and keeps in the content-addressed store."""
+    return (encode.stem_name("vocals"), encode.stem_name("accompaniment"), "lyrics.json")
+
 
 # ============================================
 # LOGGING
@@ -64,6 +128,9 @@ log = logging.getLogger("karaoke")
 # GOOGLE DRIVE
 # ============================================
 def drive_service():
+    from google.oauth2 import service_account
+    from googleapiclient.discovery import build
+
     creds = service_account.Credentials.from_service_account_file(
         SERVICE_ACCOUNT_FILE,
         scopes=["https://www.googleapis.com/auth/drive"]
@@ -71,50 +138,85 @@ def drive_service():
     return build("drive", "v3", credentials=creds, cache_discovery=False)
 
 
-gdrive = drive_service()
+_transfers = None
+_transfers_lock = threading.Lock()
+
 
+def drive_transfers():
+    """Per-thread Drive clients with chunked, resumable, concurrent transfers (built on first use)."""
+    global _transfers
+    with _transfers_lock:
+        if _transfers is None:
+            from karaoke.transfer import DriveTransfers
+            _transfers = DriveTransfers(drive_service)
+        return _transfers
 
+
+@traced
 def download_from_drive(file_id, out_path):
     """Downloads a Drive file to a local path safely."""
     log.info("Downloading from Drive: %s", file_id)
     try:
-        request = gdrive.files().get_media(fileId=file_id)
-        fh = io.FileIO(out_path, "wb")
-        downloader = MediaIoBaseDownload(fh, request)
-
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
-            if status:
-                log.info("Download %d%%", int(status.progress() * 100))
-
+        drive_transfers().download(file_id, out_path)
     except Exception as e:
         log.error("🔥 ERROR DURING GOOGLE DRIVE DOWNLOAD")
         log.error("Type: %s", type(e).__name__)
         log.error("Message: %s", str(e))
         raise
 
+@traced
 def upload_to_drive(local_path, filename, folder_id, mime):
-    """Uploads a file to Drive & returns (file_id, preview_url)."""
+    """Uploads a file to Drive, makes it public & returns (file_id, preview_url)."""
     if DRY_RUN:
         return f"DRY-{filename}", f"https://drive.google.com/file/d/DRY-{filename}/preview"
+    return drive_transfers().upload(local_path, filename, folder_id, mime)
 
-    metadata = {"name": filename, "parents": [folder_id]}
-    media = MediaFileUpload(local_path, mimetype=mime)
 
-    file = gdrive.files().create(
-        body=metadata, media_body=media, fields="id"
-    ).execute()
+@traced
+def upload_all_to_drive(uploads):
+    """Concurrent upload_to_drive for a list of (local_path, filename, folder_id, mime)."""
+    if DRY_RUN:
+        return [upload_to_drive(*u) for u in uploads]
+    return drive_transfers().upload_many(uploads)
 
-    file_id = file["id"]
 
-    # Make public
-    gdrive.permissions().create(
-        fileId=file_id,
-        body={"role": "reader", "type": "anyone"}
-    ).execute()
+def drive_file_id(audio_url):
+    if "drive.google.com" in audio_url:
+        return audio_url.split("/d/")[1].split("/")[0]
+    return None
 
-    return file_id, f"https://drive.google.com/file/d/{file_id}/preview"
+
+def source_fingerprint(audio_url):
+    """
+    Content hash of the source audio without downloading it:
+    Drive's md5Checksum, or the MD5 of a local file. None if unknown.
+    """
+    file_id = drive_file_id(audio_url)
+    if file_id is None:
+        return cache.file_digest(audio_url) if os.path.exists(audio_url) else None
+    try:
+        meta = drive_transfers().service().files().get(fileId=file_id, fields="md5Checksum").execute()
+        return meta.get("md5Checksum")
+    except Exception as e:
+        log.error("Drive metadata lookup failed for %s: %s", file_id, e)
+        return None
+
+
+# ============================================
+# PER-JOB SCRATCH SPACE
+# ============================================
+@contextmanager
+def job_workdir(prefix="job-"):
+    """
+    Private scratch directory for one job, removed afterwards.
+    Concurrent jobs never share input/stem/lyrics paths.
+    """
+    workdir = Path(tempfile.mkdtemp(prefix=prefix, dir=TMP))
+    try:
+        yield workdir
+    finally:
+        if not KEEP_WORKDIRS:
+            shutil.rmtree(workdir, ignore_errors=True)
 
 
 # ============================================
@@ -130,33 +232,161 @@ def db_conn():
     )
 
 
+@contextmanager
+def db_cursor(commit=False):
+    """
+    Dictionary cursor on a connection of its own, both closed on exit
+    (committed first on a clean exit with `commit`). Keep the block to the
+    DB work itself: a job must not hold a connection through a render.
+    """
+    conn = db_conn()
+    cur = conn.cursor(dictionary=True)
+    try:
+        yield cur
+        if commit:
+            conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+
 # ============================================
-# GPU DEMUCS SEPARATION (MDX23)
+# MODEL REGISTRY HOOKS
 # ============================================
-def demucs_separate(audio_path, device):
+def _load_demucs(name, device):
+    from demucs import pretrained
+
+    model = pretrained.get_model(name)
+    model.to(device)
+    model.eval()
+    return model
+
+
+def _load_whisper(device, compute_type):
+    import whisperx
+    return whisperx.load_model(WHISPER_MODEL, device=device, compute_type=compute_type,
+                               threads=WHISPER_THREADS)
+
+
+def _load_align(device):
+    import whisperx
+    return whisperx.load_align_model(language_code=ALIGN_LANGUAGE, device=device)
+
+
+def demucs_model(device, name=DEMUCS_MODEL):
+    key = ("demucs", name, device)
+    registry.register(key, lambda: _load_demucs(name, device))
+    return key
+
+
+def whisper_model(device, compute_type=None):
+    compute_type = compute_type or WHISPER_COMPUTE_TYPE or ("float16" if device == "cuda" else "int8")
+    key = ("whisperx", WHISPER_MODEL, device, compute_type)
+    registry.register(key, lambda: _load_whisper(device, compute_type))
+    return key
+
+
+def align_model(device):
+    key = ("whisperx-align", ALIGN_LANGUAGE, device)
+    registry.register(key, lambda: _load_align(device))
+    return key
+
+
+def default_device():
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def preload():
     """
-    Returns: (vocals_path, accompaniment_path)
+    Import the pipeline's heavy dependencies (no model weights); used by
+    main.py's background warm-up. Returns {module: seconds}.
     """
-    log.info("Loading MDX23 Demucs model…")
-    model = pretrained.get_model("mdx_extra")
-    model.to(device)
+    import importlib
+    import time
+
+    timings = {}
+    for name in ("torch", "torchaudio", "soundfile", "demucs.apply", "demucs.pretrained",
+                 "whisperx", "googleapiclient.discovery", "karaoke.transfer"):
+        start = time.perf_counter()
+        importlib.import_module(name)
+        timings[name] = round(time.perf_counter() - start, 3)
+    return timings
+
+
+def warm_models(device=None, mode=None):
+    """Load every pipeline model up front so the first job skips the load."""
+    device = device or default_device()
+    mode = mode or SEPARATION_MODE
+    sep = demucs_model(device, FAST_DEMUCS_MODEL if mode == "fast" else DEMUCS_MODEL)
+    registry.warm([sep, whisper_model(device), align_model(device)])
+    return registry.stats()
+
+
+# ============================================
+# SOURCE SEPARATION (Demucs MDX23 / HTDemucs)
+# ============================================
+def _split_stems(model, sources):
+    """(vocals, accompaniment) from Demucs output shaped (sources, channels, time)."""
+    names = list(getattr(model, "sources", ["drums", "bass", "other", "vocals"]))
+    vocals = sources[names.index("vocals")]
+    return vocals, sources.sum(dim=0) - vocals
+
+
+@contextmanager
+def separator(mode, device):
+    """
+    Yields (samplerate, split) for the chosen mode's Demucs model, where
+    split(wav) takes a (2, time) tensor at `samplerate` and returns
+    (vocals, accompaniment) CPU tensors of the same shape.
+    """
+    import torch
+
+    mode = mode or SEPARATION_MODE
+    if mode not in SEPARATION_MODES:
+        raise ValueError(f"Unknown separation mode '{mode}'")
+
+    key = demucs_model(device, FAST_DEMUCS_MODEL if mode == "fast" else DEMUCS_MODEL)
+    from demucs.apply import apply_model
+    with registry.use(key) as model, torch.no_grad():
+        def split(wav):
+            sources = apply_model(model, wav.unsqueeze(0).to(device), device=device)[0]
+            return tuple(t.cpu() for t in _split_stems(model, sources))
+        yield getattr(model, "samplerate", DEMUCS_SAMPLERATE), split
+
+
+def _use_streaming(device):
+    if STREAM_SEPARATION == "auto":
+        return device == "cpu"
+    return STREAM_SEPARATION == "1"
+
+
+@traced
+def demucs_separate(audio_path, device, workdir, on_partial=None, mode=None):
+    """
+    Returns: (vocals_path, accompaniment_path), both inside `workdir`.
+    `mode` picks the backend (SEPARATION_MODES); `on_partial(path)` gets an
+    early accompaniment preview in streaming mode.
+    """
+    if _use_streaming(device):
+        return demucs_separate_streaming(audio_path, device, workdir, on_partial, mode=mode)
+
+    import torchaudio
 
-    wav, sr = torchaudio.load(audio_path)
+    wav, sr_in = torchaudio.load(audio_path)
 
     # Convert mono → stereo if needed
     if wav.shape[0] == 1:
         wav = wav.repeat(2, 1)
 
-    wav = wav.to(device)
+    log.info("Running %s separation on %s…", mode or SEPARATION_MODE, device)
+    with separator(mode, device) as (sr, split):
+        if sr_in != sr:
+            wav = torchaudio.functional.resample(wav, sr_in, sr)
+        vocals, accomp = split(wav[:2])
 
-    log.info("Running Demucs separation on GPU…")
-    sources = apply_model(model, wav.unsqueeze(0), device=device)[0]
-
-    vocals = sources[0].cpu()
-    accomp = (sources[1] + sources[2] + sources[3]).cpu()
-
-    vocals_path = str(TMP / "vocals.wav")
-    accomp_path = str(TMP / "accompaniment.wav")
+    vocals_path = str(Path(workdir) / "vocals.wav")
+    accomp_path = str(Path(workdir) / "accompaniment.wav")
 
     torchaudio.save(vocals_path, vocals, sr)
     torchaudio.save(accomp_path, accomp, sr)
@@ -164,43 +394,168 @@ def demucs_separate(audio_path, device):
     return vocals_path, accomp_path
 
 
+def _open_audio(audio_path, workdir):
+    """Seekable reader for the input; decodes to WAV with ffmpeg if libsndfile can't read it."""
+    import soundfile as sf
+
+    try:
+        return sf.SoundFile(str(audio_path))
+    except RuntimeError:
+        wav_path = str(Path(workdir) / "input_decoded.wav")
+        subprocess.run(
+            ["ffmpeg", "-nostdin", "-loglevel", "error", "-y", "-i", str(audio_path), wav_path],
+            check=True,
+        )
+        return sf.SoundFile(wav_path)
+
+
+def demucs_separate_streaming(audio_path, device, workdir, on_partial=None,
+                              segment_seconds=None, overlap_seconds=None, mode=None):
+    """
+    Windowed separation: SEGMENT_SECONDS windows overlapping by
+    OVERLAP_SECONDS, crossfaded linearly and appended to the stem files as
+    they finish. Memory depends on the window, not the song length.
+    Returns: (vocals_path, accompaniment_path)
+    """
+    import torch
+    import torchaudio
+    import soundfile as sf
+
+    segment_seconds = segment_seconds or SEGMENT_SECONDS
+    overlap_seconds = overlap_seconds if overlap_seconds is not None else OVERLAP_SECONDS
+    if overlap_seconds >= segment_seconds:
+        raise ValueError("overlap must be shorter than the segment")
+
+    vocals_path = str(Path(workdir) / "vocals.wav")
+    accomp_path = str(Path(workdir) / "accompaniment.wav")
+    preview_path = str(Path(workdir) / "accompaniment_preview.wav")
+
+    with separator(mode, device) as (sr, split), _open_audio(audio_path, workdir) as src:
+        sr_in = src.samplerate
+        seg = int(segment_seconds * sr_in)
+        hop = seg - int(overlap_seconds * sr_in)
+        overlap_out = int(overlap_seconds * sr)
+
+        log.info("Streaming %s separation on %s (%.0fs windows)…", mode or SEPARATION_MODE, device, segment_seconds)
+        with sf.SoundFile(vocals_path, "w", sr, 2, subtype="FLOAT") as v_out, \
+                sf.SoundFile(accomp_path, "w", sr, 2, subtype="FLOAT") as a_out:
+            tail_v = tail_a = None
+            pos = 0
+            first = True
+            while True:
+                src.seek(pos)
+                block = src.read(seg, dtype="float32", always_2d=True)
+                if len(block) == 0:
+                    break
+                last = pos + len(block) >= src.frames
+
+                wav = torch.from_numpy(block.T.copy())
+                if wav.shape[0] == 1:
+                    wav = wav.repeat(2, 1)
+                wav = wav[:2]
+                if sr_in != sr:
+                    wav = torchaudio.functional.resample(wav, sr_in, sr)
+
+                vocals, accomp = split(wav)
+
+                # crossfade the held-back tail of the previous window into this one
+                if tail_v is not None:
+                    n = min(tail_v.shape[1], vocals.shape[1])
+                    ramp = torch.linspace(0.0, 1.0, n)
+                    vocals[:, :n] = tail_v[:, :n] * (1 - ramp) + vocals[:, :n] * ramp
+                    accomp[:, :n] = tail_a[:, :n] * (1 - ramp) + accomp[:, :n] * ramp
+
+                if last or overlap_out == 0:
+                    keep = 0
+                else:
+                    keep = min(overlap_out, vocals.shape[1])
+                cut = vocals.shape[1] - keep
+                tail_v, tail_a = vocals[:, cut:], accomp[:, cut:]
+
+                v_out.write(vocals[:, :cut].T.numpy())
+                a_out.write(accomp[:, :cut].T.numpy())
+
+                if first:
+                    first = False
+                    if on_partial:
+                        sf.write(preview_path, accomp[:, :cut].T.numpy(), sr, subtype="FLOAT")
+                        on_partial(preview_path)
+
+                if last:
+                    break
+                pos += hop
+
+    return vocals_path, accomp_path
+
+
 # ============================================
 # WHISPERX ALIGNMENT (GPU)
 # ============================================
-def align_lyrics_whisperx(vocals_path, device):
+def _asr_mode(device, asr_mode=None):
+    asr_mode = asr_mode or ASR_MODE
+    if asr_mode == "auto":
+        return "vad" if device == "cpu" else "full"
+    return asr_mode
+
+
+@traced
+def transcribe_words(vocals_path, device, asr_mode=None, compute_type=None):
     """
-    Returns: (lyrics_json_path, lines)
+    WhisperX transcription + forced alignment of a vocal stem.
+    Returns word segments ({"word", "start", "end", ...}) on the original timeline.
     """
-    log.info("Loading WhisperX model on GPU (%s)…", device)
-    model = whisperx.load_model("base", device=device)
+    import whisperx
+
+    audio = whisperx.load_audio(vocals_path)  # 16 kHz mono float32
+    timeline = None
+    if _asr_mode(device, asr_mode) == "vad":
+        regions = vad.voiced_regions(audio, WHISPER_SAMPLE_RATE)
+        timeline = vad.Timeline(audio, WHISPER_SAMPLE_RATE, regions)
+        log.info("VAD: transcribing %.0fs of %.0fs in %d voiced regions",
+                 timeline.seconds, len(audio) / WHISPER_SAMPLE_RATE, len(regions))
+        audio = timeline.audio
+        if not len(audio):
+            return []
 
     log.info("Transcribing vocals…")
-    result = model.transcribe(vocals_path)
+    with registry.use(whisper_model(device, compute_type)) as model:
+        result = model.transcribe(audio, batch_size=WHISPER_BATCH_SIZE)
     segments = result["segments"]
 
-    log.info("Loading alignment model…")
-    align_model, metadata = whisperx.load_align_model(
-        language_code="en",
-        device=device
-    )
-
     log.info("Performing forced alignment…")
-    alignment = whisperx.align(
-        segments,
-        align_model,
-        metadata,
-        vocals_path,
-        device=device
-    )
+    with registry.use(align_model(device)) as (model_a, metadata):
+        alignment = whisperx.align(
+            segments,
+            model_a,
+            metadata,
+            audio,
+            device=device
+        )
 
     words = alignment["word_segments"]
+    if timeline:
+        for w in words:
+            for key in ("start", "end"):
+                if key in w:
+                    w[key] = timeline.to_original(w[key])
+    return words
+
+
+@traced
+def align_lyrics_whisperx(vocals_path, device, workdir):
+    """
+    Returns: (lyrics_json_path, lines), the JSON written inside `workdir`.
+    """
+    words = transcribe_words(vocals_path, device)
 
     # Group words into lyric lines
     lines = []
     curr = []
 
     for w in words:
-        word = w["text"]
+        if "start" not in w or "end" not in w:
+            continue  # tokens the aligner could not place (digits, symbols)
+        word = w.get("word", w.get("text", ""))
         start = round(float(w["start"]), 3)
         end = round(float(w["end"]), 3)
 
@@ -214,7 +569,7 @@ def align_lyrics_whisperx(vocals_path, device):
     if curr:
         lines.append(curr)
 
-    lyrics_path = TMP / "lyrics.json"
+    lyrics_path = Path(workdir) / "lyrics.json"
     with open(lyrics_path, "w", encoding="utf-8") as f:
         json.dump({"lines": lines}, f, indent=2)
 
@@ -224,31 +579,87 @@ def align_lyrics_whisperx(vocals_path, device):
 # ============================================
 # FULL PROCESSING PIPELINE
 # ============================================
-def process_song(song_name, device):
+def _stage(progress, name, **info):
+    if progress:
+        progress(name, **info)
+
+
+def render_karaoke(input_path, device, workdir, progress=None, mode=None):
     """
-    Full pipeline:
-      1. Fetch song from DB
-      2. Resolve audio path (local or Drive)
-      3. Demucs separation on GPU
-      4. WhisperX alignment on GPU
-      5. Upload accompaniment/vocals/lyrics to Drive
-      6. Save metadata in DB
+    Local compute part of the pipeline (no DB / Drive):
+    separation, then alignment while ffmpeg compresses the stems, with
+    every output written under `workdir`. The returned stem paths are the
+    encoded files (see karaoke.encode.STEM_FORMAT).
     """
+    # ------------------------------------
+    # 1) Separation (Demucs)
+    # ------------------------------------
+    _stage(progress, "separate")
+    vocals_path, accomp_path = demucs_separate(
+        str(input_path), device, workdir,
+        on_partial=lambda path: _stage(progress, "separate", preview=path),
+        mode=mode,
+    )
 
-    conn = db_conn()
-    cur = conn.cursor(dictionary=True)
+    # encode in ffmpeg subprocesses while alignment runs
+    vocals_enc = encode.submit(vocals_path)
+    accomp_enc = encode.submit(accomp_path)
 
-    cur.execute("""
-        SELECT id, title, audio_url
-        FROM songs
-        WHERE LOWER(title) LIKE %s
-        LIMIT 1
-    """, (f"%{song_name.lower()}%",))
+    # ------------------------------------
+    # 2) WhisperX Alignment (GPU)
+    # ------------------------------------
+    _stage(progress, "align")
+    lyrics_json_path, lines = align_lyrics_whisperx(vocals_path, device, workdir)
+
+    _stage(progress, "encode")
+    return {
+        "vocals_path": vocals_enc.result(),
+        "accompaniment_path": accomp_enc.result(),
+        "lyrics_path": lyrics_json_path,
+        "lines": lines,
+    }
+
+
+def _build_peaks(song_id, input_path, audio_url):
+    """Peaks are a nice-to-have: a failure is logged, never fails the job."""
+    try:
+        peaks.ensure(song_id, input_path, audio_url)
+    except Exception as e:
+        log.warning("Waveform peaks for song %s failed: %s", song_id, e)
 
-    song = cur.fetchone()
+
+@traced
+def process_song(song_name, device, progress=None, mode=None):
+    """
+    Full pipeline:
+      1. Fetch song from DB
+      2. Return cached URLs if this audio + pipeline version was done before
+      3. Resolve audio path (local or Drive)
+      4. Source separation (`mode`: "quality" mdx_extra or "fast" htdemucs)
+      5. WhisperX alignment on GPU (stems compressed meanwhile)
+      6. Upload accompaniment/vocals/lyrics to Drive
+      7. Save metadata in DB (with source hash + pipeline version)
+
+    `progress(stage)` is called as each stage starts (see karaoke.jobs.STAGES).
+    """
+    _stage(progress, "lookup")
+    with db_cursor() as cur:
+        song = _find_song(cur, song_name)
     if not song:
         raise Exception(f"Song '{song_name}' not found in DB.")
 
+    return process_song_row(song, device, progress, mode)
+
+
+@traced
+def process_song_row(song, device, progress=None, mode=None, local_audio=None):
+    """
+    Steps 2-7 of process_song for a `songs` row (id, title, audio_url).
+    `local_audio` is an already downloaded copy of the source (backfill prefetch).
+    """
+    mode = mode or SEPARATION_MODE
+    version = pipeline_version(mode)
+
     song_id = song["id"]
     title = song["title"]
     audio_url = song["audio_url"]
@@ -256,70 +667,119 @@ def process_song(song_name, device):
     log.info("Song found: %s (%s)", title, song_id)
 
     # ------------------------------------
-    # GET LOCAL AUDIO INPUT
-    # ------------------------------------
-    local_input_path = TMP / "input.mp3"
-
-    if "drive.google.com" in audio_url:
-        file_id = audio_url.split("/d/")[1].split("/")[0]
-        download_from_drive(file_id, local_input_path)
-    else:
-        shutil.copy(audio_url, local_input_path)
-
-    # ------------------------------------
-    # 1) Demucs (GPU)
+    # CACHE: same audio + same pipeline → reuse
     # ------------------------------------
-    vocals_path, accomp_path = demucs_separate(str(local_input_path), device)
-
-    # ------------------------------------
-    # 2) WhisperX Alignment (GPU)
-    # ------------------------------------
-    lyrics_json_path, lines = align_lyrics_whisperx(vocals_path, device)
-
-    # ------------------------------------
-    # 3) Upload to Drive
-    # ------------------------------------
-    clean_title = re.sub(r"[^\w]+", "_", title)
-
-    vocals_url = upload_to_drive(
-        vocals_path, f"{clean_title}_vocals.wav",
-        DRIVE_VOCALS_FOLDER, "audio/wav"
-    )[1]
-
-    accomp_url = upload_to_drive(
-        accomp_path, f"{clean_title}_accompaniment.wav",
-        DRIVE_ACCOMP_FOLDER, "audio/wav"
-    )[1]
-
-    lyrics_url = upload_to_drive(
-        lyrics_json_path, f"{clean_title}_lyrics.json",
-        DRIVE_LYRICS_FOLDER, "application/json"
-    )[1]
+    content_hash = source_fingerprint(audio_url)
+    if content_hash:
+        hit = _cached_result(song_id, title, content_hash, version)
+        if hit:
+            return hit
+
+    with job_workdir() as workdir:
+        # ------------------------------------
+        # GET LOCAL AUDIO INPUT
+        # ------------------------------------
+        _stage(progress, "download")
+        local_input_path = workdir / "input.mp3"
+
+        file_id = drive_file_id(audio_url)
+        if local_audio:
+            shutil.move(str(local_audio), local_input_path)
+        elif file_id:
+            download_from_drive(file_id, local_input_path)
+        else:
+            shutil.copy(audio_url, local_input_path)
+
+        # waveform overview for /peaks while the song renders
+        peaks_job = encode.background(_build_peaks, song_id, local_input_path, audio_url)
+        try:
+            if not content_hash:
+                content_hash = cache.file_digest(local_input_path)
+                hit = _cached_result(song_id, title, content_hash, version)
+                if hit:
+                    return hit
+
+            # ------------------------------------
+            # 1) Demucs + 2) WhisperX (skipped if the stems are already stored)
+            # ------------------------------------
+            vocals_name, accomp_name, lyrics_name = artifact_names()
+            stored = cache.load_artifacts(content_hash, version, artifact_names())
+            if stored:
+                log.info("Reusing stored stems for %s", content_hash)
+                with open(stored[lyrics_name], encoding="utf-8") as f:
+                    lines = json.load(f)["lines"]
+                rendered = {
+                    "vocals_path": stored[vocals_name],
+                    "accompaniment_path": stored[accomp_name],
+                    "lyrics_path": stored[lyrics_name],
+                    "lines": lines,
+                }
+            else:
+                rendered = render_karaoke(local_input_path, device, workdir, progress, mode)
+                lines = rendered["lines"]
+                cache.store_artifacts(content_hash, version, {
+                    vocals_name: rendered["vocals_path"],
+                    accomp_name: rendered["accompaniment_path"],
+                    lyrics_name: rendered["lyrics_path"],
+                })
+
+            # ------------------------------------
+            # 3) Upload to Drive
+            # ------------------------------------
+            _stage(progress, "upload")
+            clean_title = re.sub(r"[^\w]+", "_", title)
+
+            (_, vocals_url), (_, accomp_url), (_, lyrics_url) = upload_all_to_drive([
+                (rendered["vocals_path"], f"{clean_title}_{vocals_name}", DRIVE_VOCALS_FOLDER, encode.mime_type()),
+                (rendered["accompaniment_path"], f"{clean_title}_{accomp_name}", DRIVE_ACCOMP_FOLDER, encode.mime_type()),
+                (rendered["lyrics_path"], f"{clean_title}_lyrics.json", DRIVE_LYRICS_FOLDER, "application/json"),
+            ])
+            peaks_job.result()  # built from the input: wait for it on success
+        finally:
+            # the input file goes away with the workdir: drop the peaks job
+            # if it has not started (early return, failure), else let it finish
+            if not peaks_job.cancel():
+                peaks_job.result()
 
     # ------------------------------------
     # 4) Save to Karaoke DB Table
     # ------------------------------------
+    _stage(progress, "save")
     now = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
 
-    sql = """
-        INSERT INTO karaoke_assets
-        (song_id, vocals_url, accompaniment_url, lyrics_url, processed, created_at, updated_at)
-        VALUES (%s, %s, %s, %s, 1, %s, %s)
-        ON DUPLICATE KEY UPDATE
-            vocals_url = VALUES(vocals_url),
-            accompaniment_url = VALUES(accompaniment_url),
-            lyrics_url = VALUES(lyrics_url),
-            updated_at = VALUES(updated_at)
-    """
-
     if not DRY_RUN:
-        cur.execute(sql, (song_id, vocals_url, accomp_url, lyrics_url, now, now))
-        conn.commit()
-
-    cur.close()
-    conn.close()
-
-    return {
+        with db_cursor(commit=True) as cur:
+            if cache.columns_ready(cur):
+                sql = """
+                    INSERT INTO karaoke_assets
+                    (song_id, vocals_url, accompaniment_url, lyrics_url, processed,
+                     source_hash, pipeline_version, created_at, updated_at)
+                    VALUES (%s, %s, %s, %s, 1, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE
+                        vocals_url = VALUES(vocals_url),
+                        accompaniment_url = VALUES(accompaniment_url),
+                        lyrics_url = VALUES(lyrics_url),
+                        source_hash = VALUES(source_hash),
+                        pipeline_version = VALUES(pipeline_version),
+                        updated_at = VALUES(updated_at)
+                """
+                params = (song_id, vocals_url, accomp_url, lyrics_url,
+                          content_hash, version, now, now)
+            else:
+                sql = """
+                    INSERT INTO karaoke_assets
+                    (song_id, vocals_url, accompaniment_url, lyrics_url, processed, created_at, updated_at)
+                    VALUES (%s, %s, %s, %s, 1, %s, %s)
+                    ON DUPLICATE KEY UPDATE
+                        vocals_url = VALUES(vocals_url),
+                        accompaniment_url = VALUES(accompaniment_url),
+                        lyrics_url = VALUES(lyrics_url),
+                        updated_at = VALUES(updated_at)
+                """
+                params = (song_id, vocals_url, accomp_url, lyrics_url, now, now)
+            cur.execute(sql, params)
+
+    result = {
         "song_id": song_id,
         "title": title,
         "vocals_url": vocals_url,
@@ -327,12 +787,70 @@ def process_song(song_name, device):
         "lyrics_url": lyrics_url,
         "sample_lyrics": lines[:1]
     }
+    if not DRY_RUN:
+        cache.store_result(content_hash, version, result)
+    return dict(result, cached=False)
+
+
+def _find_song(cur, song_name):
+    cur.execute("""
+        SELECT id, title, audio_url
+        FROM songs
+        WHERE LOWER(title) LIKE %s
+        LIMIT 1
+    """, (f"%{song_name.lower()}%",))
+    return cur.fetchone()
+
+
+def find_cached_karaoke(song_name, mode=None):
+    """
+    Cheap pre-check used before queueing a job: the cached result for this
+    song's current audio, or None if it has to be (re)processed.
+    """
+    with db_cursor() as cur:
+        song = _find_song(cur, song_name.lower())
+    if not song or not song["audio_url"]:
+        return None
+    # Drive round trip: no connection held meanwhile
+    content_hash = source_fingerprint(song["audio_url"])
+    if not content_hash:
+        return None
+    return _cached_result(song["id"], song["title"], content_hash, pipeline_version(mode))
+
+
+def _cached_result(song_id, title, content_hash, version):
+    """
+    Result for already-processed audio (local store first, then
+    karaoke_assets, on a connection opened only for that lookup).
+    """
+    result = cache.load_result(content_hash, version)
+    if result and result.get("song_id") == song_id:
+        log.info("Cache hit (local) for %s", title)
+        return dict(result, cached=True)
+
+    with db_cursor() as cur:
+        row = cache.lookup_db(cur, song_id, content_hash, version)
+    if row:
+        log.info("Cache hit (karaoke_assets) for %s", title)
+        result = {
+            "song_id": song_id,
+            "title": title,
+            "vocals_url": row["vocals_url"],
+            "accompaniment_url": row["accompaniment_url"],
+            "lyrics_url": row["lyrics_url"],
+            "sample_lyrics": [],
+        }
+        cache.store_result(content_hash, version, result)
+        return dict(result, cached=True)
+    return None
 
 class SongRequest(BaseModel):
     song_name: str
+    space: Optional[str] = None
+    mode: Optional[str] = None  # "quality" / "fast" (default: KARAOKE_SEPARATION_MODE)
 
 
-def ensure_karaoke(song_name: str):
+def ensure_karaoke(song_name: str, progress=None, mode: Optional[str] = None):
     """
     FastAPI wrapper used by main.py
     - case-insensitive match
@@ -341,12 +859,14 @@ def ensure_karaoke(song_name: str):
 
     if not song_name:
         raise ValueError("Song name is empty")
+    if mode and mode not in SEPARATION_MODES:
+        raise ValueError(f"Unknown separation mode '{mode}'")
 
     # GPU if available
-    device = "cuda" if torch.cuda.is_available() else "cpu"
+    device = default_device()
 
     # Use the full pipeline
-    result = process_song(song_name.lower(), device)
+    result = process_song(song_name.lower(), device, progress, mode)
 
     return {
         "song_id": result["song_id"],
@@ -355,4 +875,5 @@ def ensure_karaoke(song_name: str):
         "accompaniment_url": result["accompaniment_url"],
         "lyrics_url": result["lyrics_url"],
         "sample_lyrics": result["sample_lyrics"],
+        "cached": result.get("cached", False),
     }
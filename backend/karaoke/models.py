@@ -0,0 +1,219 @@
+import os
+import gc
+import time
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+log = logging.getLogger("karaoke")
+
+# ============================================
+# CONFIGURATION
+# ============================================
+# Max models kept resident at once (LRU beyond that)
+MAX_RESIDENT_MODELS = int(os.getenv("KARAOKE_MAX_MODELS", 4))
+
+# Loading a model while free memory (RAM, and VRAM on CUDA) is below this
+# evicts an idle one first
+MIN_FREE_MB = int(os.getenv("KARAOKE_MIN_FREE_MB", 0))
+
+
+def available_ram_mb():
+    """MemAvailable from /proc/meminfo, or None when it cannot be read."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def available_vram_mb():
+    try:
+        import torch
+        if torch.cuda.is_available():
+            free, _ = torch.cuda.mem_get_info()
+            return free / (1024 * 1024)
+    except Exception:
+        pass
+    return None
+
+
+class _Entry:
+    __slots__ = ("model", "load_seconds", "hits", "in_use", "last_used")
+
+    def __init__(self, model, load_seconds):
+        self.model = model
+        self.load_seconds = load_seconds
+        self.hits = 0
+        self.in_use = 0
+        self.last_used = time.monotonic()
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded models.
+
+    Each model is loaded once per key (name + device) and shared by every
+    job; concurrent first requests for the same key wait on one load.
+    Models held through use() are never evicted; idle ones are dropped
+    LRU-first when the resident count crosses its limit, or when a load is
+    about to start while free memory is below MIN_FREE_MB.
+    """
+
+    def __init__(self, max_models=MAX_RESIDENT_MODELS, min_free_mb=MIN_FREE_MB):
+        self.max_models = max_models
+        self.min_free_mb = min_free_mb
+        self._loaders = {}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._load_log = []
+
+    def register(self, key, loader):
+        """Associate a key with a zero-argument loader callable."""
+        self._loaders[key] = loader
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _acquire(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                entry.hits += 1
+                entry.in_use += 1
+                entry.last_used = time.monotonic()
+                self._entries.move_to_end(key)
+                return entry
+
+        with self._key_lock(key):
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry:
+                    entry.hits += 1
+                    entry.in_use += 1
+                    entry.last_used = time.monotonic()
+                    self._entries.move_to_end(key)
+                    return entry
+
+            if key not in self._loaders:
+                raise KeyError(f"No loader registered for model {key!r}")
+
+            self.make_room(incoming=1)
+            log.info("Loading model %s…", key)
+            start = time.perf_counter()
+            model = self._loaders[key]()
+            elapsed = time.perf_counter() - start
+            log.info("Loaded model %s in %.2fs", key, elapsed)
+
+            entry = _Entry(model, elapsed)
+            entry.in_use = 1
+            with self._lock:
+                self._entries[key] = entry
+                self._load_log.append({"key": str(key), "seconds": round(elapsed, 3)})
+            return entry
+
+    def _release(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                entry.in_use = max(0, entry.in_use - 1)
+                entry.last_used = time.monotonic()
+
+    @contextmanager
+    def use(self, key):
+        """Borrow a model for the duration of a block; it cannot be evicted meanwhile."""
+        entry = self._acquire(key)
+        try:
+            yield entry.model
+        finally:
+            self._release(key)
+            self.make_room()
+
+    def get(self, key):
+        """Return a loaded model without pinning it (it may be evicted later)."""
+        entry = self._acquire(key)
+        self._release(key)
+        return entry.model
+
+    def warm(self, keys):
+        for key in keys:
+            try:
+                self.get(key)
+            except Exception as e:
+                log.error("Warm-up failed for %s: %s", key, e)
+
+    def _under_pressure(self):
+        if not self.min_free_mb:
+            return False
+        for free in (available_ram_mb(), available_vram_mb()):
+            if free is not None and free < self.min_free_mb:
+                return True
+        return False
+
+    def make_room(self, incoming=0):
+        """
+        Evict idle models (LRU first) until `incoming` more fit the count
+        limit. Memory pressure only counts when a load is coming, and then
+        frees one idle model per incoming load: freed memory shows up in
+        MemAvailable late (if at all), so re-checking after each eviction
+        would empty the registry on every release.
+        """
+        pressure_evictions = incoming if incoming and self._under_pressure() else 0
+        while True:
+            with self._lock:
+                over_count = len(self._entries) + incoming > self.max_models
+                if not over_count and not pressure_evictions:
+                    return
+                idle = [k for k, e in self._entries.items() if e.in_use == 0]
+                if not idle:
+                    return
+                victim = idle[0]
+            if self.evict(victim) and not over_count:
+                pressure_evictions -= 1
+
+    def evict(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        log.info("Evicting model %s", key)
+        del entry
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except Exception:
+            pass
+        return True
+
+    def clear(self):
+        for key in list(self._entries.keys()):
+            self.evict(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "resident": [
+                    {
+                        "key": str(k),
+                        "load_seconds": round(e.load_seconds, 3),
+                        "hits": e.hits,
+                        "in_use": e.in_use,
+                        "idle_seconds": round(time.monotonic() - e.last_used, 1),
+                    }
+                    for k, e in self._entries.items()
+                ],
+                "loads": list(self._load_log),
+                "max_models": self.max_models,
+                "min_free_mb": self.min_free_mb,
+            }
+
+
+registry = ModelRegistry()
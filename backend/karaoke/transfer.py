@@ -0,0 +1,145 @@
+import io
+import os
+import time
+import random
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
+
+import tracing
+
+log = logging.getLogger("karaoke")
+
+# ============================================
+# CONFIGURATION
+# ============================================
+# Bytes per request for downloads and resumable uploads (multiple of 256 KiB)
+DRIVE_CHUNK_MB = int(os.getenv("DRIVE_CHUNK_MB", 16))
+
+# Retries per failed chunk, with exponential backoff; uploads resume from
+# the last byte Drive acknowledged
+DRIVE_RETRIES = int(os.getenv("DRIVE_RETRIES", 5))
+
+# Uploads (+ permission grants) in flight at once
+DRIVE_UPLOAD_WORKERS = int(os.getenv("DRIVE_UPLOAD_WORKERS", 3))
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+def _retryable(e):
+    if isinstance(e, HttpError):
+        return e.resp.status in RETRYABLE_STATUS
+    return isinstance(e, OSError)  # dropped connections, timeouts, SSL errors
+
+
+def preview_url(file_id):
+    return f"https://drive.google.com/file/d/{file_id}/preview"
+
+
+class DriveTransfers:
+    """
+    Chunked, retrying Drive downloads and resumable uploads.
+
+    googleapiclient services wrap an httplib2 connection that must not be
+    shared between threads, so every thread builds its own through
+    `service_factory`. Uploads of one job run concurrently, each followed
+    by its "anyone can read" permission grant.
+    """
+
+    def __init__(self, service_factory, chunk_mb=DRIVE_CHUNK_MB, retries=DRIVE_RETRIES,
+                 workers=DRIVE_UPLOAD_WORKERS):
+        self.service_factory = service_factory
+        self.chunk_size = max(1, chunk_mb * 4) * 256 * 1024
+        self.retries = retries
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="drive")
+        self._local = threading.local()
+
+    def service(self):
+        svc = getattr(self._local, "service", None)
+        if svc is None:
+            svc = self._local.service = self.service_factory()
+        return svc
+
+    def _with_resume(self, step, what):
+        """
+        Call `step()` (one chunk) until it reports completion; a chunk that
+        still fails after googleapiclient's own retries is retried here with
+        backoff, continuing from the last byte the server acknowledged.
+        """
+        failures = 0
+        while True:
+            try:
+                done, result = step()
+            except Exception as e:
+                failures += 1
+                if not _retryable(e) or failures > self.retries:
+                    raise
+                delay = min(30, 2 ** (failures - 1)) + random.random()
+                log.warning("%s interrupted (%s), resuming in %.1fs", what, e, delay)
+                time.sleep(delay)
+                continue
+            failures = 0
+            if done:
+                return result
+
+    # ------------------------------------
+    # download
+    # ------------------------------------
+    @tracing.traced(name="drive.download")
+    def download(self, file_id, out_path):
+        request = self.service().files().get_media(fileId=file_id)
+        with io.FileIO(str(out_path), "wb") as fh:
+            downloader = MediaIoBaseDownload(fh, request, chunksize=self.chunk_size)
+            logged = [0]
+
+            def step():
+                status, done = downloader.next_chunk(num_retries=self.retries)
+                pct = int(status.progress() * 100) if status else 100
+                if pct >= logged[0] + 25 or done:
+                    logged[0] = pct
+                    log.info("Download %s %d%%", file_id, pct)
+                return done, None
+
+            self._with_resume(step, f"Download {file_id}")
+
+    # ------------------------------------
+    # upload
+    # ------------------------------------
+    @tracing.traced(name="drive.upload")
+    def upload(self, local_path, filename, folder_id, mime, public=True):
+        """Resumable upload; returns (file_id, preview_url)."""
+        svc = self.service()
+        media = MediaFileUpload(str(local_path), mimetype=mime, resumable=True, chunksize=self.chunk_size)
+        request = svc.files().create(
+            body={"name": filename, "parents": [folder_id]}, media_body=media, fields="id"
+        )
+
+        def step():
+            # no retries inside googleapiclient: it would resend an already
+            # consumed file slice. A failed chunk leaves the request in its
+            # error state, so the next call asks Drive how far it got first.
+            status, response = request.next_chunk()
+            return response is not None, response
+
+        file_id = self._with_resume(step, f"Upload {filename}")["id"]
+
+        if public:
+            svc.permissions().create(
+                fileId=file_id, body={"role": "reader", "type": "anyone"}, fields="id"
+            ).execute(num_retries=self.retries)
+
+        log.info("Uploaded %s (%.1f MB)", filename, os.path.getsize(local_path) / 1e6)
+        return file_id, preview_url(file_id)
+
+    def upload_many(self, uploads):
+        """
+        Run several uploads concurrently.
+        `uploads`: list of (local_path, filename, folder_id, mime) → list of (file_id, preview_url).
+        """
+        # each upload runs in the caller's context (trace spans land in its trace)
+        futures = [self.pool.submit(contextvars.copy_context().run, self.upload, *args) for args in uploads]
+        return [f.result() for f in futures]
@@ -0,0 +1,111 @@
+import os
+
+import numpy as np
+
+# ============================================
+# CONFIGURATION
+# ============================================
+# Frames quieter than this (dB below the loudest frames) count as silence
+VAD_THRESHOLD_DB = float(os.getenv("KARAOKE_VAD_THRESHOLD_DB", 35))
+
+# Frames below this level (dBFS) are always silence (separation bleed)
+VAD_FLOOR_DB = float(os.getenv("KARAOKE_VAD_FLOOR_DB", -60))
+
+# Voiced regions closer than this are merged; shorter ones are dropped
+VAD_MIN_GAP = float(os.getenv("KARAOKE_VAD_MIN_GAP", 1.0))
+VAD_MIN_SPEECH = float(os.getenv("KARAOKE_VAD_MIN_SPEECH", 0.25))
+
+# Context kept around each region so word onsets/offsets are not clipped
+VAD_PAD = float(os.getenv("KARAOKE_VAD_PAD", 0.3))
+
+FRAME_SECONDS = 0.03
+
+
+# ============================================
+# DETECTION
+# ============================================
+def voiced_regions(audio, sr, threshold_db=None, min_gap=None, min_speech=None, pad=None):
+    """
+    Energy VAD for a separated vocal stem (mono float array).
+    Returns sorted, non-overlapping [(start_s, end_s), ...].
+
+    Separated vocals are near-silent outside singing, so a threshold
+    relative to the loudest frames (99th percentile RMS) plus an absolute
+    floor is enough; no model.
+    """
+    threshold_db = VAD_THRESHOLD_DB if threshold_db is None else threshold_db
+    min_gap = VAD_MIN_GAP if min_gap is None else min_gap
+    min_speech = VAD_MIN_SPEECH if min_speech is None else min_speech
+    pad = VAD_PAD if pad is None else pad
+
+    frame = max(1, int(FRAME_SECONDS * sr))
+    n = len(audio) // frame
+    if n == 0:
+        return []
+    frames = np.asarray(audio[:n * frame], dtype=np.float32).reshape(n, frame)
+    rms_db = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+    voiced = (rms_db > np.percentile(rms_db, 99) - threshold_db) & (rms_db > VAD_FLOOR_DB)
+
+    # rising / falling edges → frame index runs
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], voiced.astype(np.int8), [0]))))
+    runs = edges.reshape(-1, 2) * frame / sr
+
+    regions = []
+    for start, end in runs:
+        if regions and start - regions[-1][1] < min_gap:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+
+    duration = len(audio) / sr
+    out = []
+    for start, end in regions:
+        if end - start < min_speech:
+            continue
+        start, end = max(0.0, start - pad), min(duration, end + pad)
+        if out and start <= out[-1][1]:
+            out[-1] = (out[-1][0], float(end))
+        else:
+            out.append((float(start), float(end)))
+    return out
+
+
+# ============================================
+# COMPACT TIMELINE
+# ============================================
+class Timeline:
+    """
+    Voiced regions cut out of a track and joined with `gap` seconds of
+    silence, plus the mapping from compact time back to the original.
+    """
+
+    def __init__(self, audio, sr, regions, gap=0.2):
+        self.sr = sr
+        self.offsets = []  # (compact_start, original_start, length)
+        parts = []
+        silence = np.zeros(int(gap * sr), dtype=np.float32)
+        t = 0.0
+        for start, end in regions:
+            a, b = int(start * sr), int(end * sr)
+            if b <= a:
+                continue
+            if parts:
+                parts.append(silence)
+                t += len(silence) / sr
+            parts.append(np.asarray(audio[a:b], dtype=np.float32))
+            self.offsets.append((t, a / sr, (b - a) / sr))
+            t += (b - a) / sr
+        self.audio = np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
+        self._starts = np.array([o[0] for o in self.offsets])
+
+    @property
+    def seconds(self):
+        return len(self.audio) / self.sr
+
+    def to_original(self, t):
+        """Map a compact-timeline time to the original track (clamped into its region)."""
+        if not self.offsets:
+            return t
+        i = max(0, int(np.searchsorted(self._starts, t, side="right")) - 1)
+        compact_start, original_start, length = self.offsets[i]
+        return original_start + min(max(t - compact_start, 0.0), length)
@@ -0,0 +1,85 @@
+# backend/lyrics_index.py
+"""
+Compact, time-indexed lyrics for /lyrics/{song_id}.
+
+The pipeline stores lyrics as {"lines": [[{"text", "start", "end"}, ...], ...]}.
+Served columnar instead:
+
+    {
+      "v": 1,
+      "words": ["I", "don't", ...],   unique word strings
+      "w":     [0, 1, ...],           index into `words` per word
+      "start": [15560, ...],          word start, integer milliseconds
+      "end":   [16460, ...],          word end, integer milliseconds
+      "lines": [0, 12, ...]           index of each line's first word
+    }
+
+Line i covers words lines[i] .. lines[i + 1] - 1 (the last one runs to the
+end). Both arrays are sorted by time, so a client finds the active word
+with a binary search instead of scanning every line per frame.
+"""
+from bisect import bisect_right
+
+FORMAT_VERSION = 1
+
+
+def _ms(seconds):
+    return int(round(float(seconds) * 1000))
+
+
+def encode(lines):
+    """Columnar form of `lines` (the pipeline's list of word-dict lists)."""
+    table = {}
+    words, w, start, end, offsets = [], [], [], [], []
+    for line in lines:
+        offsets.append(len(w))
+        for word in line:
+            text = word.get("text", "")
+            idx = table.get(text)
+            if idx is None:
+                idx = table[text] = len(words)
+                words.append(text)
+            w.append(idx)
+            start.append(_ms(word["start"]))
+            end.append(_ms(word["end"]))
+    return {"v": FORMAT_VERSION, "words": words, "w": w, "start": start, "end": end, "lines": offsets}
+
+
+def decode(doc):
+    """Inverse of encode() (times back in seconds), for Python clients and benchmarks."""
+    words, w, start, end, offsets = doc["words"], doc["w"], doc["start"], doc["end"], doc["lines"]
+    bounds = list(offsets) + [len(w)]
+    return [
+        [{"text": words[w[k]], "start": start[k] / 1000, "end": end[k] / 1000}
+         for k in range(bounds[i], bounds[i + 1])]
+        for i in range(len(offsets))
+    ]
+
+
+class LyricsIndex:
+    """One song's lyrics with line start times for O(log n) lookups."""
+
+    def __init__(self, lines):
+        self.lines = [line for line in lines if line]
+        self.line_starts = [float(line[0]["start"]) for line in self.lines]
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data.get("lines") or [])
+
+    def line_at(self, t):
+        """Index of the line sung at (or last started before) `t` seconds; -1 before the first."""
+        return bisect_right(self.line_starts, t) - 1
+
+    def window(self, t, before=1, after=2):
+        """Columnar slice: the line at `t` plus `before` / `after` lines around it."""
+        i = self.line_at(t)
+        lo = max(0, i - before)
+        hi = min(len(self.lines), max(i, 0) + after + 1)
+        doc = encode(self.lines[lo:hi])
+        doc["first_line"] = lo
+        doc["active_line"] = i
+        return doc
+
+    def encode(self):
+        return encode(self.lines)
@@ -1,24 +1,44 @@
 # backend/main.py
 import os
 import io
+import re
+import hmac
 import uvicorn
 import socketio
 import random
 import mysql.connector
 import mimetypes
+import threading
+import time
+from collections import OrderedDict
 from urllib.parse import quote_plus
-from fastapi import FastAPI, Body, HTTPException, Request, Response
+from fastapi import FastAPI, Body, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 import asyncio
 
-# Google API / Auth
-from google.oauth2 import service_account
-from google.auth.transport.requests import Request as GoogleAuthRequest
+# Google auth is imported on first token request (see get_drive_access_token)
 import requests
 
-# Local karaoke helper (ensure ensure_karaoke returns Drive preview URLs)
-from karaoke.karaoke import ensure_karaoke, SongRequest
+# Local karaoke helper (ensure ensure_karaoke returns Drive preview URLs).
+# Cheap to import: torch / demucs / whisperx load on first use or in the
+# background preload below.
+from karaoke.karaoke import ensure_karaoke, find_cached_karaoke, SongRequest, warm_models, preload, SEPARATION_MODES
+from karaoke.models import registry as model_registry
+from karaoke.jobs import JobManager, QueueFull
+from space_lifecycle import SpaceLifecycle, SPACE_SWEEP_INTERVAL
+import space_store
+import socket_codec
+from socket_codec import SocketCodecs
+from http_cache import CachedBody, not_modified, byte_range, if_range_ok, RangeNotSatisfiable
+import catalog
+from lyrics_index import LyricsIndex
+import metrics
+import tracing
+import peaks
+import drive_meta
+import trending
+import ingest
 
 # ----------------------------
 # CONFIG
@@ -33,6 +53,9 @@ DB_NAME = os.getenv("RAILWAY_DB", "railway")
 # Service account JSON (must be mounted into the container)
 SERVICE_ACCOUNT_FILE = os.getenv("SERVICE_ACCOUNT_FILE", "service_account.json")
 
+# Drive REST base (overridable so benchmarks can point at a local stand-in)
+DRIVE_API_BASE = os.getenv("DRIVE_API_BASE", "https://www.googleapis.com/drive/v3")
+
 # Temporary directory for any local caching (not required for Drive streaming)
 TEMP_DIR = os.path.join(os.getcwd(), "temp")
 os.makedirs(TEMP_DIR, exist_ok=True)
@@ -40,6 +63,21 @@ os.makedirs(TEMP_DIR, exist_ok=True)
 # Developer-uploaded local path (return as 'url' so your tool will transform it)
 UPLOADED_SAMPLE_LOCAL_PATH = "/mnt/data/18766534-f1a8-48ce-8f2d-af442bd121af.png"
 
+# Import the karaoke ML stack in the background after startup
+KARAOKE_PRELOAD = os.getenv("KARAOKE_PRELOAD", "1") == "1"
+
+# Load Demucs/WhisperX at startup instead of on the first karaoke job
+KARAOKE_WARM_MODELS = os.getenv("KARAOKE_WARM_MODELS", "0") == "1"
+
+# Upper bound for POST /generate_karaoke?wait=<seconds>; clients poll status_url for longer jobs
+KARAOKE_MAX_WAIT = float(os.getenv("KARAOKE_MAX_WAIT", 30))
+
+# Songs whose parsed lyrics (+ encoded body) stay in memory for /lyrics
+LYRICS_CACHE_SIZE = int(os.getenv("LYRICS_CACHE_SIZE", 256))
+
+# Shared secret for /admin/* endpoints and /metrics (unset = they answer 503)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
 # ----------------------------
 # APP + CORS + SOCKET.IO
 # ----------------------------
@@ -54,6 +92,9 @@ sio = socketio.AsyncServer(
 )
 fastapi_app = FastAPI()
 
+# per-client JSON / msgpack negotiation for room events
+socket_codecs = SocketCodecs(sio)
+
 fastapi_app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],   # allow deployed frontend + local dev
@@ -62,6 +103,13 @@ fastapi_app.add_middleware(
     allow_headers=["*"],
 )
 
+# per-route latency histograms for /metrics
+if metrics.METRICS_ENABLED:
+    fastapi_app.add_middleware(metrics.HttpMetrics)
+
+# opt-in Chrome traces (X-Trace header / TRACE_SAMPLE_RATE), see tracing.py
+fastapi_app.add_middleware(tracing.TraceMiddleware, admin_token=ADMIN_TOKEN)
+
 app = None  # assigned at bottom as ASGI app
 
 # ----------------------------
@@ -70,6 +118,34 @@ app = None  # assigned at bottom as ASGI app
 spaces = {}
 song_counter = 0
 
+# sid -> (space, user) for sockets that created/joined a space
+socket_members = {}
+
+# last-activity tracking + idle eviction for `spaces`
+lifecycle = SpaceLifecycle(spaces)
+
+# append-only log + snapshots of `spaces` under SPACE_STORE_DIR, restored on startup
+space_log = space_store.SpaceStore(spaces)
+
+# decayed suggest / vote / play counts across spaces (bounded sketches), served at /trending
+trending_songs = trending.Trending()
+
+def record_play(song):
+    if song:
+        trending_songs.record("play", song.get("db_song_id"), song.get("name"), song.get("artist"))
+
+def _remember_member(sid, space, user):
+    socket_members[sid] = (space, user)
+    lifecycle.touch(space)
+
+def require_admin(request: Request):
+    # X-Admin-Token, or "Authorization: Bearer <token>" for scrapers (/metrics)
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=503, detail="Admin endpoints are disabled (ADMIN_TOKEN not set)")
+    token = request.headers.get("x-admin-token") or request.headers.get("authorization", "").removeprefix("Bearer ")
+    if not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
 # ----------------------------
 # DB HELPERS (Railway only)
 # ----------------------------
@@ -84,45 +160,79 @@ def get_db_connection():
         connection_timeout=10,
     )
 
-def execute_read_query(query, params=None):
+_query_tables = {}
+
+def query_table(query):
+    """First table a query reads (metrics label); cached per query string."""
+    table = _query_tables.get(query)
+    if table is None:
+        m = re.search(r"\bFROM\s+`?(\w+)", query, re.IGNORECASE)
+        table = _query_tables[query] = m.group(1) if m else "other"
+    return table
+
+def execute_read_query(query, params=None, raise_errors=False):
+    """
+    Rows as dicts. A DB error is logged and returns [] unless
+    `raise_errors`, for callers that must not mistake an outage for an
+    empty result (anything cached or ETag'd).
+    """
     conn = None
     cur = None
+    table = query_table(query)
+    start = time.perf_counter()
     try:
-        conn = get_db_connection()
-        cur = conn.cursor(dictionary=True)
-        cur.execute(query, params or ())
-        rows = cur.fetchall()
+        with tracing.span("execute_read_query", table=table):
+            conn = get_db_connection()
+            cur = conn.cursor(dictionary=True)
+            cur.execute(query, params or ())
+            rows = cur.fetchall()
         return rows
     except mysql.connector.Error as e:
         print("SQL error:", e)
+        metrics.db_errors.inc(table)
+        if raise_errors:
+            raise
         return []
     finally:
         if cur:
             cur.close()
         if conn:
             conn.close()
+        metrics.db_latency.observe(table, value=time.perf_counter() - start)
 
 # ----------------------------
 # GOOGLE DRIVE AUTH UTILS
 # ----------------------------
+_drive_creds = None
+_drive_creds_lock = threading.Lock()
+
 def get_drive_access_token():
     """
     Uses the service account JSON to produce a short-lived bearer token for Drive API.
+    The credentials are loaded once and only refreshed when the token expires.
     """
-    if not os.path.exists(SERVICE_ACCOUNT_FILE):
-        raise FileNotFoundError(f"Service account file not found at '{SERVICE_ACCOUNT_FILE}'")
-    creds = service_account.Credentials.from_service_account_file(
-        SERVICE_ACCOUNT_FILE, scopes=["https://www.googleapis.com/auth/drive"]
-    )
-    request = GoogleAuthRequest()
-    creds.refresh(request)  # obtains access token
-    if not creds.token:
-        raise RuntimeError("Failed to obtain Drive access token from service account.")
-    return creds.token
+    global _drive_creds
+    with _drive_creds_lock:
+        if _drive_creds is None:
+            if not os.path.exists(SERVICE_ACCOUNT_FILE):
+                raise FileNotFoundError(f"Service account file not found at '{SERVICE_ACCOUNT_FILE}'")
+            from google.oauth2 import service_account
+            _drive_creds = service_account.Credentials.from_service_account_file(
+                SERVICE_ACCOUNT_FILE, scopes=["https://www.googleapis.com/auth/drive"]
+            )
+        if not _drive_creds.valid:
+            from google.auth.transport.requests import Request as GoogleAuthRequest
+            _drive_creds.refresh(GoogleAuthRequest())  # obtains access token
+        if not _drive_creds.token:
+            raise RuntimeError("Failed to obtain Drive access token from service account.")
+        return _drive_creds.token
 
 # ----------------------------
 # DRIVE STREAMING PROXY
 # ----------------------------
+# size / type / md5 per Drive file, for HEAD, Range checks and ETags without opening a stream
+drive_meta_cache = drive_meta.DriveMetaCache(lambda: get_drive_access_token(), lambda: DRIVE_API_BASE)
+
 def extract_drive_file_id(drive_url: str):
     """
     Extract Drive file ID from URLs like:
@@ -150,10 +260,11 @@ def extract_drive_file_id(drive_url: str):
 
     return None
 
-async def stream_drive_file(file_id: str, range_header: str = None):
+async def stream_drive_file(file_id: str, range_header: str = None, meta: drive_meta.FileMeta = None):
     """
     Stream bytes from Google Drive using HTTP 'alt=media' endpoint while forwarding Range header.
     Returns a FastAPI StreamingResponse prepared with proper headers/status.
+    With `meta`, its type and validators are used (and the cache entry dropped if Drive disagrees).
     """
     token = get_drive_access_token()
     headers = {"Authorization": f"Bearer {token}"}
@@ -162,11 +273,12 @@ async def stream_drive_file(file_id: str, range_header: str = None):
         headers["Range"] = range_header
 
     # Drive direct media URL
-    url = f"https://www.googleapis.com/drive/v3/files/{quote_plus(file_id)}?alt=media"
+    url = f"{DRIVE_API_BASE}/files/{quote_plus(file_id)}?alt=media"
 
     # Stream request to Drive
     session = requests.Session()
-    resp = session.get(url, headers=headers, stream=True, timeout=30)
+    with metrics.timed(metrics.drive_ttfb, "stream"), tracing.span("stream_drive_file", range=range_header):
+        resp = session.get(url, headers=headers, stream=True, timeout=30)
 
     if resp.status_code in (401, 403):
         # Permission or auth issue
@@ -180,16 +292,31 @@ async def stream_drive_file(file_id: str, range_header: str = None):
     content_range = resp.headers.get("Content-Range")  # present for partial responses
     content_length = resp.headers.get("Content-Length")
     # For MP3:
-    mime_type = "audio/mpeg"
+    mime_type = meta.mime_type if meta else "audio/mpeg"
+    if meta:
+        upstream_size = content_range.rpartition("/")[2] if content_range else content_length
+        if resp.status_code == 416 or (upstream_size and upstream_size != str(meta.size)):
+            drive_meta_cache.invalidate(file_id)  # file replaced on Drive: refetch next time
 
     # Prepare streaming generator to yield chunks as they arrive from Drive
+    trace = tracing.current()
+
     def iter_chunks(response, chunk_size=256 * 1024):
+        metrics.active_streams.inc()
+        start = time.perf_counter()
+        sent = 0
         try:
             for chunk in response.iter_content(chunk_size=chunk_size):
                 if not chunk:
                     continue
+                metrics.drive_bytes.inc("stream", amount=len(chunk))
+                sent += len(chunk)
                 yield chunk
         finally:
+            metrics.active_streams.dec()
+            if trace:
+                # spans across yields: the generator may resume on different threads
+                trace.add_span("stream_drive_file.body", start, time.perf_counter(), bytes=sent)
             try:
                 response.close()
                 session.close()
@@ -200,6 +327,8 @@ async def stream_drive_file(file_id: str, range_header: str = None):
         "Accept-Ranges": "bytes",
         "Content-Type": mime_type,
     }
+    if meta:
+        headers_out.update(meta.headers())
     if content_length:
         headers_out["Content-Length"] = content_length
     if content_range:
@@ -215,8 +344,9 @@ async def progress_sync_task():
                 if info.get("is_playing") and song:
                     song.setdefault("position", 0)
                     song["position"] += 1  # +1 sec
+                    space_log.ticked(space)
 
-                    await sio.emit(
+                    await socket_codecs.emit(
                         "progress",
                         {"time": song["position"]},
                         room=space
@@ -226,15 +356,115 @@ async def progress_sync_task():
 
         await asyncio.sleep(1)  # ping every second
 
+async def space_eviction_task():
+    while True:
+        await asyncio.sleep(SPACE_SWEEP_INTERVAL)
+        try:
+            evicted = lifecycle.sweep()
+            if evicted:
+                print(f"[spaces] evicted idle spaces: {evicted}")
+                for name in evicted:
+                    metrics.forget_room(name)
+                    space_log.changed(name)
+                await sio.emit("spaces_list", list(spaces.keys()))
+        except Exception as e:
+            print("[spaces] sweep error:", e)
+
+# karaoke stack readiness: idle → loading → ready / failed
+started_at = time.time()
+karaoke_state = {"state": "idle", "imports": {}, "error": None}
+
+def load_karaoke_stack():
+    """Background warm-up: heavy imports, then (optionally) the models."""
+    karaoke_state["state"] = "loading"
+    try:
+        karaoke_state["imports"] = preload()
+        if KARAOKE_WARM_MODELS:
+            warm_models()
+        karaoke_state["state"] = "ready"
+    except Exception as e:
+        print("karaoke preload failed:", e)
+        karaoke_state["state"] = "failed"
+        karaoke_state["error"] = str(e)
+
+def restore_spaces():
+    """Reload persisted spaces; song ids continue after the highest restored one."""
+    global song_counter
+    restored = space_log.restore()
+    for name in restored:
+        lifecycle.touch(name)
+        state = spaces[name]
+        songs = state.get("leaderboard", []) + [state.get("current_song") or {}]
+        song_counter = max([song_counter] + [s["id"] for s in songs if isinstance(s.get("id"), int)])
+    if restored:
+        print(f"[spaces] restored {len(restored)} spaces in {space_log.stats['restore_ms']} ms")
+    return restored
+
+async def drop_unclaimed_members(grace):
+    """After a restore, remove members whose socket did not rejoin within `grace` seconds."""
+    await asyncio.sleep(grace)
+    claimed = set(socket_members.values())
+    for name, state in list(spaces.items()):
+        users = state.get("users", [])
+        gone = [u for u in users if (name, u) not in claimed]
+        if not gone:
+            continue
+        state["users"] = [u for u in users if (name, u) in claimed]
+        lifecycle.touch(name)
+        space_log.changed(name)
+        await socket_codecs.emit("user_list", state["users"], room=name)
+
+@fastapi_app.on_event("startup")
+async def start_background_tasks():
+    if restore_spaces():
+        asyncio.create_task(drop_unclaimed_members(space_store.SPACE_REJOIN_GRACE))
+    asyncio.create_task(space_log.run())
+    asyncio.create_task(space_eviction_task())
+    if KARAOKE_PRELOAD or KARAOKE_WARM_MODELS:
+        asyncio.get_running_loop().run_in_executor(None, load_karaoke_stack)
+
+@fastapi_app.on_event("shutdown")
+async def persist_spaces():
+    space_log.close()
+
+@fastapi_app.get("/ready")
+async def ready(require: str = ""):
+    """
+    Readiness probe. The streaming/chat API is ready once the app has
+    started; ?require=karaoke also waits for the karaoke stack (503 until loaded).
+    """
+    body = {
+        "status": "ready",
+        "uptime_s": round(time.time() - started_at, 3),
+        "karaoke": karaoke_state,
+    }
+    if require == "karaoke" and karaoke_state["state"] != "ready":
+        body["status"] = "starting" if karaoke_state["state"] in ("idle", "loading") else "degraded"
+        return JSONResponse(body, status_code=503)
+    return body
+
 # ----------------------------
 # /play/<song_id> endpoint (streaming)
 # ----------------------------
-@fastapi_app.get("/play/{song_id}")
+async def load_drive_meta(file_id: str):
+    """Cached FileMeta; 404 if Drive has no such file, None if Drive could not be asked."""
+    try:
+        meta = await asyncio.get_running_loop().run_in_executor(
+            None, tracing.bind(drive_meta_cache.get, file_id))
+    except Exception as e:
+        print(f"[drive_meta] lookup failed for {file_id}: {e}")
+        return None
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Drive file not found")
+    return meta
+
+@fastapi_app.api_route("/play/{song_id}", methods=["GET", "HEAD"])
 async def play_song(song_id: int, request: Request):
     """
     Streams MP3 stored on Google Drive. No redirect.
     Connects browser -> backend -> Google Drive.
-    Supports Range.
+    Supports Range, If-Range and If-None-Match; HEAD and bad ranges (416)
+    are answered from cached file metadata without contacting Drive.
     """
     # 1) Lookup audio_url in DB
     rows = execute_read_query(
@@ -259,33 +489,256 @@ async def play_song(song_id: int, request: Request):
     # 3) Handle Range header
     range_header = request.headers.get("range")
 
+    meta = await load_drive_meta(file_id)
+    if meta is None or meta.size is None:
+        if request.method == "HEAD":
+            raise HTTPException(status_code=502, detail="Drive metadata unavailable")
+        return await stream_drive_file(file_id, range_header, meta)
+
+    headers = meta.headers()
+    cached = not_modified(request, meta.etag)
+    if cached:
+        if meta.last_modified:
+            cached.headers["Last-Modified"] = meta.last_modified
+        return cached
+
+    rng = None
+    if range_header and if_range_ok(request, meta.etag, meta.last_modified):
+        try:
+            rng = byte_range(range_header, meta.size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{meta.size}"})
+
+    if request.method == "HEAD":
+        if rng:
+            headers["Content-Range"] = f"bytes {rng[0]}-{rng[1]}/{meta.size}"
+        headers["Content-Length"] = str(rng[1] - rng[0] + 1 if rng else meta.size)
+        return Response(status_code=206 if rng else 200, headers=headers)
+
     # 4) Stream from Drive through backend proxy
-    return await stream_drive_file(file_id, range_header)
+    return await stream_drive_file(file_id, f"bytes={rng[0]}-{rng[1]}" if rng else None, meta)
 
 # ----------------------------
-# /generate_karaoke endpoint (unchanged)
+# /generate_karaoke endpoint (background jobs)
 # ----------------------------
+async def push_karaoke_progress(job):
+    """Socket.IO progress for every space that asked for this song."""
+    payload = job.to_dict()
+    for space in list(job.spaces):
+        await sio.emit("karaoke_progress", payload, room=space)
+
+karaoke_jobs = JobManager(ensure_karaoke, on_update=push_karaoke_progress,
+                          on_stage=metrics.observe_karaoke_stage)
+
+def karaoke_job_response(job, display_name=None):
+    body = job.to_dict()
+    body["status_url"] = f"/karaoke_jobs/{job.id}"
+    if job.result:
+        # keep the old flat response shape for finished jobs
+        body.update(job.result)
+    if display_name:
+        body["display_name"] = display_name
+    return body
+
 @fastapi_app.post("/generate_karaoke")
-async def generate_karaoke_endpoint(req: SongRequest = Body(...)):
-    try:
-        raw_name = req.song_name or ""
-        normalized = raw_name.strip().lower()
+async def generate_karaoke_endpoint(req: SongRequest = Body(...), wait: float = 0):
+    """
+    Queues karaoke generation and returns immediately with a job id.
+    Identical songs share one job. Pass ?wait=<seconds> (capped at
+    KARAOKE_MAX_WAIT) to hold the request until the job finishes or the wait
+    runs out, then poll status_url; "mode": "fast" in the body picks the
+    quicker single-model (htdemucs) separation.
+    """
+    raw_name = req.song_name or ""
+    normalized = raw_name.strip().lower()
+
+    if not normalized:
+        raise HTTPException(status_code=400, detail="Song name cannot be empty")
+    if req.mode and req.mode not in SEPARATION_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(SEPARATION_MODES)}")
 
-        if not normalized:
-            raise HTTPException(status_code=400, detail="Song name cannot be empty")
+    # already rendered from the same audio → answer without queueing
+    try:
+        cached = await asyncio.get_running_loop().run_in_executor(
+            None, tracing.bind(find_cached_karaoke, normalized, req.mode))
+    except Exception as e:
+        print("karaoke cache lookup failed:", e)
+        cached = None
+    if cached:
+        cached["display_name"] = raw_name.strip()
+        cached["status"] = "done"
+        return cached
 
+    try:
         # internally use normalized version to avoid duplicates
-        karaoke_info = ensure_karaoke(normalized)
+        job, _ = karaoke_jobs.submit(normalized, space=req.space, options={"mode": req.mode})
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    if wait > 0:
+        await karaoke_jobs.wait(job, min(wait, KARAOKE_MAX_WAIT))
+        if job.status == "failed":
+            raise HTTPException(status_code=job.error_status, detail=job.error)
+
+    # but frontend gets original display name
+    body = karaoke_job_response(job, raw_name.strip())
+    return JSONResponse(body, status_code=200 if job.status == "done" else 202)
+
+@fastapi_app.get("/karaoke_jobs/{job_id}")
+async def karaoke_job_status(job_id: str):
+    job = karaoke_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return karaoke_job_response(job)
+
+@fastapi_app.get("/karaoke_jobs/{job_id}/preview")
+async def karaoke_job_preview(job_id: str):
+    """First separated window of the accompaniment while the rest renders."""
+    job = karaoke_jobs.get(job_id)
+    if not job or not job.active or not job.preview_path or not os.path.exists(job.preview_path):
+        raise HTTPException(status_code=404, detail="No preview available")
+    return FileResponse(job.preview_path, media_type="audio/wav")
 
-        # but frontend gets original display name
-        karaoke_info["display_name"] = raw_name.strip()
+# ----------------------------
+# /lyrics/<song_id> (compact, time-indexed)
+# ----------------------------
+# song_id -> (lyrics_url, LyricsIndex, CachedBody), least recently used first
+lyrics_cache = OrderedDict()
+lyrics_cache_lock = threading.Lock()
 
-        return karaoke_info
+def fetch_drive_json(file_id: str):
+    token = get_drive_access_token()
+    with metrics.timed(metrics.drive_ttfb, "lyrics"):
+        resp = requests.get(f"{DRIVE_API_BASE}/files/{quote_plus(file_id)}?alt=media",
+                            headers={"Authorization": f"Bearer {token}"}, timeout=30)
+    metrics.drive_bytes.inc("lyrics", amount=len(resp.content))
+    if resp.status_code == 404:
+        raise HTTPException(status_code=404, detail="Lyrics file not found on Drive")
+    resp.raise_for_status()
+    return resp.json()
 
-    except FileNotFoundError as e:
-        raise HTTPException(status_code=404, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+def load_lyrics(song_id: int):
+    """(LyricsIndex, CachedBody) for a song's published lyrics; refetched when the URL changes."""
+    rows = execute_read_query(
+        "SELECT lyrics_url FROM karaoke_assets WHERE song_id = %s AND processed = 1 LIMIT 1",
+        (song_id,)
+    )
+    lyrics_url = rows[0].get("lyrics_url") if rows else None
+    if not lyrics_url:
+        raise HTTPException(status_code=404, detail="No karaoke lyrics for this song")
+
+    with lyrics_cache_lock:
+        entry = lyrics_cache.get(song_id)
+        if entry and entry[0] == lyrics_url:
+            lyrics_cache.move_to_end(song_id)
+            return entry[1], entry[2]
+
+    file_id = extract_drive_file_id(lyrics_url)
+    if not file_id:
+        raise HTTPException(status_code=400, detail=f"Invalid Drive preview URL: {lyrics_url}")
+    index = LyricsIndex.from_json(fetch_drive_json(file_id))
+    body = CachedBody(index.encode())
+
+    with lyrics_cache_lock:
+        lyrics_cache[song_id] = (lyrics_url, index, body)
+        lyrics_cache.move_to_end(song_id)
+        while len(lyrics_cache) > LYRICS_CACHE_SIZE:
+            lyrics_cache.popitem(last=False)
+    return index, body
+
+@fastapi_app.get("/lyrics/{song_id}")
+async def get_lyrics(song_id: int, request: Request, t: float = None, before: int = 1, after: int = 2):
+    """
+    Columnar lyrics (see lyrics_index.py), gzip'd and ETag'd.
+    ?t=<seconds> returns only the lines around that time (binary search).
+    """
+    index, body = await asyncio.get_running_loop().run_in_executor(None, tracing.bind(load_lyrics, song_id))
+    if t is None:
+        return body.response(request)
+    window = index.window(t, before=max(0, before), after=max(0, after))
+    return CachedBody(window).response(request)
+
+# ----------------------------
+# /peaks/<song_id> (waveform overview)
+# ----------------------------
+def load_peaks(song_id: int):
+    """The song's peak pyramid, decoded from Drive on first use (see peaks.py)."""
+    rows = execute_read_query("SELECT audio_url FROM songs WHERE id = %s", (song_id,))
+    audio_url = rows[0].get("audio_url") if rows else None
+    if not audio_url:
+        raise HTTPException(status_code=404, detail="Song not found")
+
+    file_id = extract_drive_file_id(audio_url)
+    if file_id:
+        source = f"{DRIVE_API_BASE}/files/{quote_plus(file_id)}?alt=media"
+        headers = {"Authorization": f"Bearer {get_drive_access_token()}"}
+    else:
+        source, headers = audio_url, None
+    try:
+        with tracing.span("peaks.ensure", song_id=song_id):
+            return peaks.ensure(song_id, source, audio_url, headers)
+    except peaks.PeaksUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@fastapi_app.get("/peaks/{song_id}")
+async def get_peaks(song_id: int, request: Request, px: int = 800, format: str = "json",
+                    start: float = Query(0.0, alias="from"), end: float = Query(None, alias="to")):
+    """
+    Exactly `px` min/max pairs (int8, -128..127) between ?from= and ?to= seconds.
+    format=bin returns them as raw interleaved bytes (min0, max0, min1, ...).
+    """
+    data = await asyncio.get_running_loop().run_in_executor(None, tracing.bind(load_peaks, song_id))
+    try:
+        mins, maxs, seconds_per_px = data.window(start, end, px)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if format == "bin":
+        body = peaks.interleave(mins, maxs)
+        return Response(body, media_type="application/octet-stream", headers={
+            "X-Peaks-Duration": str(round(data.duration, 3)),
+            "X-Peaks-Seconds-Per-Px": repr(seconds_per_px),
+            "Cache-Control": "public, max-age=3600",
+        })
+    return CachedBody({
+        "song_id": song_id,
+        "duration": round(data.duration, 3),
+        "from": start,
+        "to": end if end is not None else round(data.duration, 3),
+        "px": len(mins),
+        "seconds_per_px": seconds_per_px,
+        "min": mins.tolist(),
+        "max": maxs.tolist(),
+    }).response(request, max_age=3600)
+
+# ----------------------------
+# /trending (approximate, decayed popularity across spaces)
+# ----------------------------
+@fastapi_app.get("/trending")
+async def get_trending(limit: int = 20):
+    """
+    Top songs by decayed suggest/vote/play score (see trending.py), plus
+    how many spaces are playing each song right now.
+    """
+    limit = max(1, min(limit, trending_songs.k))
+    playing = trending.now_playing(spaces)
+    return {
+        "half_life_s": trending_songs.half_life,
+        "songs": trending_songs.top_songs(limit),
+        "now_playing": sorted(
+            ({"song_id": song_id, **label, "spaces": count} for song_id, (label, count) in playing.items()),
+            key=lambda r: -r["spaces"])[:limit],
+    }
+
+# ----------------------------
+# /metrics (Prometheus text format)
+# ----------------------------
+@fastapi_app.get("/metrics")
+async def metrics_endpoint(request: Request):
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics disabled")
+    require_admin(request)
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 # ----------------------------
 # /uploaded_sample endpoint (developer instruction)
@@ -296,57 +749,247 @@ async def uploaded_sample():
     return {"url": UPLOADED_SAMPLE_LOCAL_PATH}
 
 # ----------------------------
-# Browse / search endpoints (unchanged, use Railway)
+# Admin: space lifecycle / memory
 # ----------------------------
-@fastapi_app.get("/artists")
-async def get_artists():
-    rows = execute_read_query("""
+@fastapi_app.get("/admin/spaces")
+async def admin_spaces(request: Request):
+    require_admin(request)
+    return {**lifecycle.report(), "persistence": space_log.report()}
+
+@fastapi_app.get("/admin/models")
+async def admin_models(request: Request):
+    require_admin(request)
+    return model_registry.stats()
+
+@fastapi_app.get("/admin/karaoke_jobs")
+async def admin_karaoke_jobs(request: Request):
+    require_admin(request)
+    return karaoke_jobs.stats()
+
+@fastapi_app.get("/admin/trending")
+async def admin_trending(request: Request):
+    require_admin(request)
+    return trending_songs.report()
+
+@fastapi_app.get("/admin/drive_meta")
+async def admin_drive_meta(request: Request):
+    require_admin(request)
+    return drive_meta_cache.report()
+
+@fastapi_app.get("/admin/tracing")
+async def admin_tracing(request: Request):
+    require_admin(request)
+    return tracing.settings()
+
+@fastapi_app.post("/admin/tracing")
+async def admin_configure_tracing(request: Request, data: dict = Body(...)):
+    """{"sample_rate": 0.05, "profile_slowest": 10}: change tracing without a redeploy."""
+    require_admin(request)
+    return tracing.configure(data.get("sample_rate"), data.get("profile_slowest"))
+
+@fastapi_app.delete("/admin/spaces/{space_name}")
+async def admin_evict_space(space_name: str, request: Request):
+    require_admin(request)
+    if not lifecycle.evict(space_name):
+        raise HTTPException(status_code=404, detail="Space not found")
+    metrics.forget_room(space_name)
+    space_log.changed(space_name)
+    await sio.emit("spaces_list", list(spaces.keys()))
+    return {"evicted": space_name}
+
+# ----------------------------
+# Browse / search endpoints (Railway; ETag'd by catalog version, opt-in ?limit=&after= paging)
+# ----------------------------
+catalog_version = catalog.CatalogVersion(lambda: execute_read_query(catalog.FINGERPRINT_SQL, raise_errors=True))
+browse_pages = catalog.PageCache()
+
+def list_artists(after, limit):
+    where, params = "", []
+    if after:
+        where, params = "AND TRIM(artist_name) > %s", [after[0]]
+    rows = execute_read_query(f"""
         SELECT DISTINCT TRIM(artist_name) AS artist_name
         FROM songs 
-        WHERE artist_name IS NOT NULL AND artist_name <> ''
+        WHERE artist_name IS NOT NULL AND artist_name <> '' {where}
         ORDER BY artist_name ASC
-    """)
-    return [r["artist_name"] for r in rows]
-
-@fastapi_app.get("/albums/{artist_name}")
-async def get_albums(artist_name: str):
-    rows = execute_read_query("""
+        {"LIMIT %s" if limit else ""}
+    """, tuple(params + ([limit] if limit else [])), raise_errors=True)
+    return [r["artist_name"] for r in rows], lambda item: [item]
+
+def list_albums(artist_name, after, limit):
+    where, params = "", [artist_name]
+    if after:
+        where = "AND TRIM(album_name) > %s"
+        params.append(after[0])
+    rows = execute_read_query(f"""
         SELECT DISTINCT TRIM(album_name) AS album_name
         FROM songs
-        WHERE LOWER(TRIM(artist_name)) = LOWER(%s)
+        WHERE LOWER(TRIM(artist_name)) = LOWER(%s) {where}
         ORDER BY album_name ASC
-    """, (artist_name.strip(),))
-    
-    return [r["album_name"] for r in rows]
-
-@fastapi_app.get("/songs/{artist_name}/{album_name}")
-async def get_songs(artist_name: str, album_name: str):
-    rows = execute_read_query("""
+        {"LIMIT %s" if limit else ""}
+    """, tuple(params + ([limit] if limit else [])), raise_errors=True)
+    return [r["album_name"] for r in rows], lambda item: [item]
+
+def list_songs(artist_name, album_name, after, limit):
+    where, params = "", [artist_name, album_name]
+    if after:
+        if len(after) != 2:
+            raise catalog.InvalidCursor("Invalid cursor")
+        # (title, id) keyset: ids break ties between equal titles
+        where = "AND (title > %s OR (title = %s AND id > %s))"
+        params += [after[0], after[0], after[1]]
+    rows = execute_read_query(f"""
         SELECT id, title
         FROM songs
         WHERE LOWER(TRIM(artist_name)) = LOWER(%s)
-        AND LOWER(TRIM(album_name)) = LOWER(%s)
-        ORDER BY title ASC
-    """, (artist_name.strip(), album_name.strip()))
-    
-    return rows
+        AND LOWER(TRIM(album_name)) = LOWER(%s) {where}
+        ORDER BY title ASC, id ASC
+        {"LIMIT %s" if limit else ""}
+    """, tuple(params + ([limit] if limit else [])), raise_errors=True)
+    return rows, lambda item: [item["title"], item["id"]]
+
+def browse_page(lister, args, after, limit):
+    """
+    Without `limit`: the full list (original response shape).
+    With it: {"items", "next"} where `next` is the cursor for ?after=.
+    """
+    if not limit:
+        items, _ = lister(*args, None, None)
+        return items
+    cursor = catalog.decode_cursor(after) if after else None
+    items, key = lister(*args, cursor, limit + 1)  # one extra row tells whether a next page exists
+    more = len(items) > limit
+    items = items[:limit]
+    return {"items": items, "next": catalog.encode_cursor(key(items[-1])) if more and items else None}
+
+async def browse(request: Request, lister, args, after=None, limit=None):
+    """
+    Cached, conditional browse response: the ETag is derived from the
+    catalog version and the request alone, so a matching If-None-Match is
+    answered before any listing query runs. DB errors are a 503, never a
+    cached (or ETag'd) empty page.
+    """
+    if limit is not None and not 1 <= limit <= catalog.BROWSE_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {catalog.BROWSE_MAX_LIMIT}")
+    loop = asyncio.get_running_loop()
+    version = catalog_version.version
+    if catalog_version.stale:
+        try:
+            version = await loop.run_in_executor(None, tracing.bind(catalog_version.get))
+        except mysql.connector.Error:
+            raise HTTPException(status_code=503, detail="Catalog temporarily unavailable")
+
+    etag = catalog.etag_for(version, lister.__name__, args, after, limit)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    body = browse_pages.get(etag)
+    if body is None:
+        try:
+            data = await loop.run_in_executor(None, tracing.bind(browse_page, lister, args, after, limit))
+        except catalog.InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except mysql.connector.Error:
+            raise HTTPException(status_code=503, detail="Catalog temporarily unavailable")
+        body = CachedBody(data, etag=etag)
+        browse_pages.put(etag, body)
+    return body.response(request)
+
+@fastapi_app.get("/artists")
+async def get_artists(request: Request, limit: int = None, after: str = None):
+    return await browse(request, list_artists, (), after, limit)
+
+@fastapi_app.get("/albums/{artist_name}")
+async def get_albums(artist_name: str, request: Request, limit: int = None, after: str = None):
+    return await browse(request, list_albums, (artist_name.strip(),), after, limit)
+
+@fastapi_app.get("/songs/{artist_name}/{album_name}")
+async def get_songs(artist_name: str, album_name: str, request: Request, limit: int = None, after: str = None):
+    return await browse(request, list_songs, (artist_name.strip(), album_name.strip()), after, limit)
+
+# ----------------------------
+# Admin: bulk ingestion from Drive folders (see ingest.py)
+# ----------------------------
+ingest_state = {"running": False, "request": None, "started_at": None, "result": None, "error": None}
+
+def catalog_changed(rows=None):
+    """Songs were written: next browse request re-reads the catalog version, old pages go."""
+    catalog_version.bump()
+    browse_pages.clear()
+
+def run_ingest(options, loop):
+    try:
+        ingest_state["result"] = ingest.run(
+            options["folders"], get_drive_access_token, lambda: DRIVE_API_BASE, get_db_connection,
+            extract_drive_file_id, recursive=options["recursive"], force=options["force"],
+            dry_run=options["dry_run"], workers=options["workers"],
+            on_listed=drive_meta_cache.prime,
+            # browse state belongs to the event loop
+            on_batch=lambda rows: loop.call_soon_threadsafe(catalog_changed, rows))
+    except Exception as e:
+        print("[ingest] failed:", e)
+        ingest_state["error"] = str(e)
+    finally:
+        ingest_state["running"] = False
+
+@fastapi_app.post("/admin/ingest", status_code=202)
+async def admin_start_ingest(request: Request, data: dict = Body(...)):
+    """{"folders": ["<drive folder id>", ...], "recursive": true, "force": false, "dry_run": false, "workers": 16}"""
+    require_admin(request)
+    folders = data.get("folders") or ([data["folder"]] if data.get("folder") else [])
+    if not folders or not isinstance(folders, list):
+        raise HTTPException(status_code=400, detail="Missing folders")
+    bad = [f for f in folders if not ingest.is_drive_id(f)]
+    if bad:
+        raise HTTPException(status_code=400, detail=f"Invalid Drive folder id(s): {bad}")
+    try:
+        # clamped to 1..INGEST_MAX_WORKERS
+        workers = ingest.clamp_workers(data.get("workers") or ingest.INGEST_WORKERS)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="workers must be an integer")
+    if ingest_state["running"]:
+        raise HTTPException(status_code=409, detail="An ingest is already running")
+    options = {
+        "folders": folders,
+        "recursive": bool(data.get("recursive", False)),
+        "force": bool(data.get("force", False)),
+        "dry_run": bool(data.get("dry_run", False)),
+        "workers": workers,
+    }
+    ingest_state.update(running=True, request=options, started_at=time.time(), result=None, error=None)
+    # a run takes minutes: own thread, not one of the default executor's
+    threading.Thread(target=run_ingest, args=(options, asyncio.get_running_loop()),
+                     name="ingest", daemon=True).start()
+    return ingest_state
+
+@fastapi_app.get("/admin/ingest")
+async def admin_ingest_status(request: Request):
+    require_admin(request)
+    return ingest_state
 
 # ----------------------------
 # Socket.IO + spaces logic (kept as-is per request)
 # ----------------------------
 @sio.event
-async def connect(sid, environ):
-    print(f"[socket] connect: {sid}")
+async def connect(sid, environ, auth=None):
+    codec = socket_codecs.register(sid, environ, auth)
+    print(f"[socket] connect: {sid} ({codec})")
 
 @sio.event
 async def disconnect(sid):
     print(f"[socket] disconnect: {sid}")
-    # best-effort cleanup
-    for space_name, data in list(spaces.items()):
-        users = data.get("users", [])
-        if sid in users:
-            users.remove(sid)
-            await sio.emit("user_list", users, room=space_name)
+    socket_codecs.forget(sid)
+    # best-effort cleanup: drop the user unless another socket still holds the same seat
+    member = socket_members.pop(sid, None)
+    if not member:
+        return
+    space_name, user = member
+    users = spaces.get(space_name, {}).get("users", [])
+    if user in users and member not in socket_members.values():
+        users.remove(user)
+        lifecycle.touch(space_name)
+        space_log.changed(space_name)
+        await socket_codecs.emit("user_list", users, room=space_name)
 
 def _ensure_space_entry(space_name, creator=None):
     if space_name not in spaces:
@@ -374,11 +1017,12 @@ async def create_space(sid, data):
         spaces[space_name] = {"users": [], "leaderboard": [], "current_song": None, "admins": [user], "votes": {}, "is_playing": False}
     if user not in spaces[space_name]["users"]:
         spaces[space_name]["users"].append(user)
-    await sio.enter_room(sid, space_name)
+    _remember_member(sid, space_name, user)
+    await socket_codecs.enter_room(sid, space_name)
     await sio.emit("spaces_list", list(spaces.keys()))
-    await sio.emit("user_list", spaces[space_name]["users"], room=space_name)
-    await sio.emit("leaderboard", spaces[space_name]["leaderboard"], room=space_name)
-    await sio.emit("current_song", spaces[space_name]["current_song"], room=sid)
+    await socket_codecs.emit("user_list", spaces[space_name]["users"], room=space_name)
+    await socket_codecs.emit("leaderboard", spaces[space_name]["leaderboard"], room=space_name)
+    await socket_codecs.emit("current_song", spaces[space_name]["current_song"], room=sid)
     await sio.emit("admin_data", {"isAdmin": True}, room=sid)
 
 @sio.on("join_space")
@@ -393,10 +1037,11 @@ async def join_space(sid, data):
         return
     if user not in spaces[space]["users"]:
         spaces[space]["users"].append(user)
-    await sio.enter_room(sid, space)
-    await sio.emit("user_list", spaces[space]["users"], room=space)
-    await sio.emit("leaderboard", spaces[space]["leaderboard"], room=space)
-    await sio.emit("current_song", spaces[space]["current_song"], room=sid)
+    _remember_member(sid, space, user)
+    await socket_codecs.enter_room(sid, space)
+    await socket_codecs.emit("user_list", spaces[space]["users"], room=space)
+    await socket_codecs.emit("leaderboard", spaces[space]["leaderboard"], room=space)
+    await socket_codecs.emit("current_song", spaces[space]["current_song"], room=sid)
     is_admin = user in spaces[space].get("admins", [])
     await sio.emit("admin_data", {"isAdmin": is_admin}, room=sid)
 
@@ -407,6 +1052,7 @@ async def send_message(sid, data):
     msg_text = data.get("msg")
     if not space or not user or msg_text is None:
         return
+    lifecycle.touch(space)
     msg = {"user": user, "msg": msg_text}
     await sio.emit("chat_message", msg, room=space)
 
@@ -426,7 +1072,7 @@ async def suggest_song(sid, data):
     # ---- (1) Check DB for exact song match, case-insensitive ----
     try:
         rows = execute_read_query(
-            "SELECT id, title, artist_name FROM songs WHERE LOWER(title) = %s LIMIT 1",
+            "SELECT id, title, artist_name, audio_url FROM songs WHERE LOWER(title) = %s LIMIT 1",
             (song_name,)
         )
     except Exception as e:
@@ -448,6 +1094,11 @@ async def suggest_song(sid, data):
     proper_title = db_song["title"]
     proper_artist = db_song["artist_name"]
 
+    # warm the Drive metadata /play will need for HEAD / Range (background, batched)
+    file_id = extract_drive_file_id(db_song.get("audio_url"))
+    if file_id:
+        drive_meta_cache.prefetch([file_id])
+
     space_entry = spaces.setdefault(space, {
         "users": [],
         "leaderboard": [],
@@ -456,6 +1107,7 @@ async def suggest_song(sid, data):
         "votes": {},
         "is_playing": False,
     })
+    lifecycle.touch(space)
 
     # 1️⃣ This is the FIX — use song_name, not undefined "song"
     rows = execute_read_query(
@@ -482,13 +1134,14 @@ async def suggest_song(sid, data):
 
     # ---- (4) Add to leaderboard ----
     space_entry["leaderboard"].append(song_obj)
+    trending_songs.record("suggest", db_song["id"], proper_title, proper_artist)
     space_entry["votes"][str(song_obj["id"])] = set()
 
     # sort by votes
     space_entry["leaderboard"].sort(key=lambda s: -s["votes"])
 
     # ---- (5) Send updates ----
-    await sio.emit("leaderboard", space_entry["leaderboard"], room=space)
+    await socket_codecs.emit("leaderboard", space_entry["leaderboard"], room=space)
     await sio.emit("chat_message",
                    {"user": user, "msg": f"🎶 Suggested: {proper_title}"},
                    room=space)
@@ -506,6 +1159,7 @@ async def upvote_song(sid, data):
         return
     if space not in spaces:
         return
+    lifecycle.touch(space)
     song_id_str = str(song_id)
     spaces[space].setdefault("votes", {})
     spaces[space]["votes"].setdefault(song_id_str, set())
@@ -517,20 +1171,22 @@ async def upvote_song(sid, data):
         if str(s["id"]) == song_id_str:
             s["votes"] += 1
             song_name = s["name"]
+            trending_songs.record("vote", s.get("db_song_id"), s["name"], s.get("artist"))
             break
     if not song_name:
         await sio.emit("chat_message", {"user": "SYSTEM", "msg": f"❌ Song ID {song_id} not found in leaderboard."}, room=space)
         return
     spaces[space]["votes"][song_id_str].add(user)
     spaces[space]["leaderboard"].sort(key=lambda x: -x["votes"])
-    await sio.emit("leaderboard", spaces[space]["leaderboard"], room=space)
+    await socket_codecs.emit("leaderboard", spaces[space]["leaderboard"], room=space)
     await sio.emit("chat_message", {"user": "SYSTEM", "msg": f"👍 {user} upvoted '{song_name}'"}, room=space)
     if spaces[space].get("is_playing"):
         top_song = spaces[space]["leaderboard"][0] if spaces[space]["leaderboard"] else None
         current_song = spaces[space]["current_song"]
         if top_song and current_song and top_song["id"] != current_song["id"]:
             spaces[space]["current_song"] = top_song
-            await sio.emit("current_song", top_song, room=space)
+            record_play(top_song)
+            await socket_codecs.emit("current_song", top_song, room=space)
             await sio.emit("chat_message", {"user": "SYSTEM", "msg": f"🔥 '{top_song['name']}' took the lead and is now playing!"}, room=space)
 
 @sio.on("start_playlist")
@@ -538,6 +1194,7 @@ async def start_playlist(sid, data):
     space = data.get("space"); actor = data.get("actor")
     if not space or not actor: return
     if space not in spaces: return
+    lifecycle.touch(space)
     if actor not in spaces[space].get("admins", []):
         await sio.emit("chat_message", {"user": "SYSTEM", "msg": f"❌ {actor} is not an admin and cannot start the playlist."}, room=space)
         return
@@ -548,7 +1205,8 @@ async def start_playlist(sid, data):
     top_song = leaderboard[0]
     spaces[space]["current_song"] = top_song
     spaces[space]["is_playing"] = True
-    await sio.emit("current_song", top_song, room=space)
+    record_play(top_song)
+    await socket_codecs.emit("current_song", top_song, room=space)
     await sio.emit("song_playing", {"song": top_song}, room=space)
     await sio.emit("chat_message", {"user": "SYSTEM", "msg": f"▶️ '{top_song['name']}' is now playing!"}, room=space)
 
@@ -560,6 +1218,7 @@ async def delete_song(sid, data):
 
     if not space or song_id is None:
         return
+    lifecycle.touch(space)
 
     # admin check
     if actor not in spaces.get(space, {}).get("admins", []):
@@ -589,8 +1248,9 @@ async def delete_song(sid, data):
             next_song = lb[0]
             spaces[space]["current_song"] = next_song
             spaces[space]["is_playing"] = True
+            record_play(next_song)
 
-            await sio.emit("current_song", next_song, room=space)
+            await socket_codecs.emit("current_song", next_song, room=space)
             await sio.emit("song_playing", {"song": next_song}, room=space)
             await sio.emit("chat_message",
                         {"user": "SYSTEM",
@@ -601,7 +1261,7 @@ async def delete_song(sid, data):
             spaces[space]["current_song"] = None
             spaces[space]["is_playing"] = False
 
-            await sio.emit("current_song", None, room=space)
+            await socket_codecs.emit("current_song", None, room=space)
             await sio.emit("chat_message",
                         {"user": "SYSTEM",
                             "msg": "Playlist ended"},
@@ -628,7 +1288,7 @@ async def delete_song(sid, data):
             db_song_id = next_song.get("db_song_id")
             next_song["audio_url"] = f"/play/{db_song_id}" if db_song_id else None
 
-            await sio.emit("current_song", next_song, room=space)
+            await socket_codecs.emit("current_song", next_song, room=space)
             await sio.emit("song_playing", {"song": next_song}, room=space)
             await sio.emit(
                 "chat_message",
@@ -640,7 +1300,7 @@ async def delete_song(sid, data):
             spaces[space]["current_song"] = None
             spaces[space]["is_playing"] = False
 
-            await sio.emit("current_song", None, room=space)
+            await socket_codecs.emit("current_song", None, room=space)
             await sio.emit("song_playing", {"song": None}, room=space)
             await sio.emit(
                 "chat_message",
@@ -649,7 +1309,7 @@ async def delete_song(sid, data):
             )
 
     # 4 — Refresh playlist UI
-    await sio.emit("leaderboard", spaces[space]["leaderboard"], room=space)
+    await socket_codecs.emit("leaderboard", spaces[space]["leaderboard"], room=space)
 
     # 5 — Show delete message
     await sio.emit(
@@ -667,8 +1327,9 @@ async def kick_user(sid, data):
         return
     if user_to_kick in spaces[space]["users"]:
         spaces[space]["users"].remove(user_to_kick)
+        lifecycle.touch(space)
         await sio.emit("user_kicked", {"user": user_to_kick}, room=space)
-        await sio.emit("user_list", spaces[space]["users"], room=space)
+        await socket_codecs.emit("user_list", spaces[space]["users"], room=space)
         await sio.emit("chat_message", {"user": "SYSTEM", "msg": f"🔨 {user_to_kick} was removed by {actor}"}, room=space)
 
 @sio.on("play_song")
@@ -686,6 +1347,7 @@ async def play_song_event(sid, data):
 
     if space not in spaces:
         return
+    lifecycle.touch(space)
 
     # admin check
     if actor not in spaces[space].get("admins", []):
@@ -701,7 +1363,7 @@ async def play_song_event(sid, data):
         spaces[space]["current_song"] = None
         spaces[space]["is_playing"] = False
 
-        await sio.emit("current_song", None, room=space)
+        await socket_codecs.emit("current_song", None, room=space)
         await sio.emit("song_playing", {"song": None}, room=space)
         await sio.emit("chat_message",
                        {"user": "SYSTEM", "msg": "🚫 No songs available to play."},
@@ -714,6 +1376,7 @@ async def play_song_event(sid, data):
 
     spaces[space]["is_playing"] = True
     current_song = spaces[space]["current_song"]
+    record_play(current_song)
 
     # This is the DB song id we stored earlier
     db_song_id = current_song.get("db_song_id")
@@ -735,7 +1398,7 @@ async def play_song_event(sid, data):
 
     # Broadcast updated "Now Playing"
     await sio.emit("song_playing", {"song": current_song}, room=space)
-    await sio.emit("current_song", current_song, room=space)
+    await socket_codecs.emit("current_song", current_song, room=space)
 
     await sio.emit("chat_message",
                    {"user": "SYSTEM", "msg": f"▶️ Now playing '{song_name}'"},
@@ -749,6 +1412,7 @@ async def pause_song_event(sid, data):
         await sio.emit("chat_message", {"user": "SYSTEM", "msg": f"⛔ {actor} not authorized to pause."}, room=space)
         return
     spaces[space]["is_playing"] = False
+    lifecycle.touch(space)
     await sio.emit("song_paused", {"actor": actor}, room=space)
     await sio.emit("chat_message", {"user": "SYSTEM", "msg": f"⏸️ Playback paused by {actor}"}, room=space)
 
@@ -758,6 +1422,9 @@ async def song_finished(sid, data):
     finished_song = data.get("song")
     if not space or not finished_song:
         return
+    if space not in spaces:
+        return
+    lifecycle.touch(space)
 
     # Remove from leaderboard
     spaces[space]["leaderboard"] = [
@@ -772,14 +1439,15 @@ async def song_finished(sid, data):
         next_song = lb[0]
         spaces[space]["current_song"] = next_song
         spaces[space]["is_playing"] = True
+        record_play(next_song)
 
-        await sio.emit("current_song", next_song, room=space)
+        await socket_codecs.emit("current_song", next_song, room=space)
         await sio.emit("song_playing", {"song": next_song}, room=space)
     else:
         # No songs left
         spaces[space]["current_song"] = None
         spaces[space]["is_playing"] = False
-        await sio.emit("current_song", None, room=space)
+        await socket_codecs.emit("current_song", None, room=space)
 
 @sio.on("seek")
 async def seek_event(sid, data):
@@ -809,6 +1477,7 @@ async def seek_event(sid, data):
 
     # store in backend so new users get synced
     current_song["position"] = float(new_time)
+    lifecycle.touch(space)
 
     # broadcast seek update
     await sio.emit(
@@ -870,6 +1539,27 @@ async def autopath_recommend(data: dict):
 # ----------------------------
 # FINAL ASGI APP
 # ----------------------------
+def socket_room_label(room):
+    """
+    Metrics label for an emit target: the space name (up to
+    METRICS_MAX_ROOMS of them, then "other_spaces"), "direct" for one sid,
+    "all" for broadcasts.
+    """
+    if room is None:
+        return "all"
+    if isinstance(room, str):
+        room = room.removesuffix(socket_codec.PACKED_ROOM_SUFFIX)
+        if room in spaces:
+            return metrics.room_label(room)
+    return "direct"
+
+# persist the space named in each mutating event once its handler is done
+space_store.instrument_socketio(sio, space_log, skip={
+    "connect", "disconnect", "get_spaces", "send_message", "get_current_song_position"})
+
+if metrics.METRICS_ENABLED:
+    metrics.instrument_socketio(sio, socket_room_label)
+
 app = socketio.ASGIApp(sio, fastapi_app)
 
 if __name__ == "__main__":
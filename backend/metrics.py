@@ -0,0 +1,333 @@
+# backend/metrics.py
+"""
+In-process metrics in the Prometheus text format (served at /metrics).
+
+No client library: counters, gauges and histograms are small dicts
+keyed by label values behind one lock each, so recording a sample is a
+dict lookup plus an add. Histograms keep per-bucket counts and only
+accumulate them when scraped.
+
+Instrumentation points:
+  HttpMetrics            ASGI middleware, latency per route template
+  instrument_socketio    handler duration / count per event, bytes sent per room
+  timed(...)             context manager for DB queries, Drive calls, ...
+"""
+import os
+import time
+import threading
+import contextvars
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# ----------------------------
+# CONFIG
+# ----------------------------
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# Seconds; covers a cached JSON hit up to a cold Drive stream start
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Karaoke stages run from under a second (lookup) to many minutes (separate)
+STAGE_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+
+# Spaces with a room label of their own; the rest share OVERFLOW_ROOM
+METRICS_MAX_ROOMS = int(os.getenv("METRICS_MAX_ROOMS", 50))
+OVERFLOW_ROOM = "other_spaces"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def remove(self, *labels):
+        with self._lock:
+            self._values.pop(labels, None)
+
+    def remove_matching(self, label, value):
+        """Drop every series whose `label` equals `value` (e.g. an evicted room)."""
+        i = self.label_names.index(label)
+        with self._lock:
+            for key in [k for k in self._values if k[i] == value]:
+                del self._values[key]
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self._header() + [f"{self.name}{_labels(self.label_names, k)} {_num(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *labels, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # per-bucket counts (+Inf last), then sum
+                series = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def render(self):
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        lines = self._header()
+        for key, series in items:
+            total = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                total += count
+                le = 'le="%s"' % _num(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {total}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_num(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {total}")
+        return lines
+
+
+# ----------------------------
+# REGISTRY
+# ----------------------------
+_registry = []
+
+
+def _register(metric):
+    _registry.append(metric)
+    return metric
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+http_requests = _register(Counter(
+    "http_requests_total", "HTTP requests by route template, method and status", ("route", "method", "status")))
+http_latency = _register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency until the response is sent", ("route", "method")))
+
+socket_events = _register(Counter(
+    "socketio_events_total", "Socket.IO events handled", ("event", "outcome")))
+socket_latency = _register(Histogram(
+    "socketio_handler_duration_seconds", "Socket.IO handler duration", ("event",)))
+socket_sent_bytes = _register(Counter(
+    "socketio_sent_bytes_total", "Socket.IO payload bytes sent, per recipient, by room", ("room",)))
+socket_sent_packets = _register(Counter(
+    "socketio_sent_packets_total", "Socket.IO packets sent, per recipient, by room", ("room",)))
+
+db_latency = _register(Histogram(
+    "db_query_duration_seconds", "MySQL query latency (connect + execute + fetch) by table", ("table",)))
+db_errors = _register(Counter(
+    "db_query_errors_total", "MySQL queries that raised", ("table",)))
+
+drive_ttfb = _register(Histogram(
+    "drive_ttfb_seconds", "Time until Drive answered with response headers", ("op",)))
+drive_bytes = _register(Counter(
+    "drive_bytes_total", "Bytes read from Drive", ("op",)))
+active_streams = _register(Gauge(
+    "drive_active_streams", "Drive audio streams currently being proxied"))
+active_streams.set(value=0)
+
+karaoke_stage = _register(Histogram(
+    "karaoke_stage_duration_seconds", "Karaoke job time spent per pipeline stage", ("stage",),
+    buckets=STAGE_BUCKETS))
+karaoke_jobs = _register(Counter(
+    "karaoke_jobs_total", "Finished karaoke jobs", ("status",)))
+
+
+@contextmanager
+def timed(histogram, *labels, errors=None):
+    """Observe the block's duration; count it in `errors` too if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        if errors is not None:
+            errors.inc(*labels)
+        raise
+    finally:
+        histogram.observe(*labels, value=time.perf_counter() - start)
+
+
+# ----------------------------
+# HTTP
+# ----------------------------
+class HttpMetrics:
+    """
+    Pure ASGI middleware (no BaseHTTPMiddleware: streaming bodies pass
+    through untouched). Requests are labelled by route template
+    ("/play/{song_id}"), so ids do not create new series; unmatched
+    paths share one label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            http_latency.observe(path, method, value=time.perf_counter() - start)
+            http_requests.inc(path, method, str(status[0]))
+
+
+# ----------------------------
+# SOCKET.IO
+# ----------------------------
+_emit_room = contextvars.ContextVar("metrics_emit_room", default="other")
+
+
+def _wrap_handler(event, handler):
+    async def wrapped(*args):
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            return await handler(*args)
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            socket_latency.observe(event, value=time.perf_counter() - start)
+            socket_events.inc(event, outcome)
+    wrapped.__wrapped__ = handler
+    return wrapped
+
+
+def instrument_socketio(sio, room_label):
+    """
+    Time every registered (async) handler and count bytes sent per room.
+
+    Call after all handlers are registered. `room_label(room)` maps an
+    emit target to a bounded label (e.g. the space name, or "direct" for
+    a single sid). Each recipient's packet is counted once it is handed to
+    Engine.IO, so a room of 20 listeners counts a payload 20 times.
+    """
+    for handlers in sio.handlers.values():
+        for event, handler in list(handlers.items()):
+            if not hasattr(handler, "__wrapped__"):
+                handlers[event] = _wrap_handler(event, handler)
+
+    manager_emit = sio.manager.emit
+    send_eio_packet = sio._send_eio_packet
+
+    async def emit(event, data, namespace, room=None, **kwargs):
+        # tasks spawned by the manager copy this context → the send hook sees the label
+        token = _emit_room.set(room_label(kwargs.get("to") or room))
+        try:
+            return await manager_emit(event, data, namespace, room=room, **kwargs)
+        finally:
+            _emit_room.reset(token)
+
+    async def send(eio_sid, pkt):
+        label = _emit_room.get()
+        data = pkt.data
+        socket_sent_packets.inc(label)
+        socket_sent_bytes.inc(label, amount=len(data) if isinstance(data, (str, bytes)) else 0)
+        return await send_eio_packet(eio_sid, pkt)
+
+    sio.manager.emit = emit
+    sio._send_eio_packet = send
+
+
+_room_labels = set()
+_room_labels_lock = threading.Lock()
+
+
+def room_label(room):
+    """
+    `room` itself while fewer than METRICS_MAX_ROOMS rooms are labelled
+    (or it already is), else OVERFLOW_ROOM: the series count stays bounded
+    however many spaces are open at once.
+    """
+    with _room_labels_lock:
+        if room in _room_labels:
+            return room
+        if len(_room_labels) < METRICS_MAX_ROOMS:
+            _room_labels.add(room)
+            return room
+    return OVERFLOW_ROOM
+
+
+def forget_room(room):
+    """Drop a closed room's series (and free its label slot) so evicted spaces do not pile up."""
+    with _room_labels_lock:
+        _room_labels.discard(room)
+    for metric in (socket_sent_bytes, socket_sent_packets):
+        metric.remove_matching("room", room)
+
+
+# ----------------------------
+# KARAOKE JOBS
+# ----------------------------
+def observe_karaoke_stage(job, stage, seconds):
+    """JobManager on_stage hook: `stage` of `job` took `seconds`."""
+    karaoke_stage.observe(stage, value=seconds)
+    if not job.active:  # last stage of a finished job
+        karaoke_jobs.inc(job.status)
@@ -0,0 +1,227 @@
+# backend/peaks.py
+"""
+Waveform peak pyramids for /peaks/{song_id}.
+
+Each song is decoded once with ffmpeg (mono, PEAKS_SAMPLE_RATE) into
+min/max pairs over BASE_SAMPLES_PER_PEAK samples. Coarser levels halve
+the previous one until a whole song fits in a few hundred peaks. Values
+are int8 (the top byte of 16-bit PCM), stored per song as
+PEAKS_DIR/<song_id>.npz: about 100 KB for a 5 minute song, all levels
+included.
+
+A request for `px` points between `from` and `to` reads the coarsest
+level that still has at least one peak per pixel and reduces it to
+exactly `px` min/max pairs. Zoomed in past the base level, base peaks
+are repeated.
+"""
+import os
+import json
+import tempfile
+import threading
+import subprocess
+from collections import OrderedDict
+
+import numpy as np
+import requests
+
+# ----------------------------
+# CONFIG
+# ----------------------------
+PEAKS_DIR = os.getenv("PEAKS_DIR", os.path.join("temp", "peaks"))
+
+# Decode rate; waveform overviews need no more than this
+PEAKS_SAMPLE_RATE = int(os.getenv("PEAKS_SAMPLE_RATE", 11025))
+
+# Samples per peak at the finest level (~12 ms at 11025 Hz)
+BASE_SAMPLES_PER_PEAK = int(os.getenv("PEAKS_BASE_SAMPLES", 128))
+
+# Coarsest level stops once it is at most this many peaks
+MIN_LEVEL_PEAKS = 512
+
+# Decoded pyramids kept in memory
+PEAKS_CACHE_SIZE = int(os.getenv("PEAKS_CACHE_SIZE", 64))
+
+MAX_PX = 8192
+
+
+class PeaksUnavailable(Exception):
+    pass
+
+
+def peaks_path(song_id):
+    return os.path.join(PEAKS_DIR, f"{song_id}.npz")
+
+
+# ----------------------------
+# BUILD
+# ----------------------------
+def decode(source, headers=None):
+    """
+    Mono int16 PCM of `source` (file path or URL) at PEAKS_SAMPLE_RATE.
+    A URL that needs `headers` (a bearer token) is downloaded here first:
+    ffmpeg's -headers would put the token on its command line, readable by
+    any local user through ps.
+    """
+    if headers:
+        with tempfile.NamedTemporaryFile(prefix="peaks-") as tmp:
+            _download(source, headers, tmp)
+            return decode(tmp.name)
+    cmd = ["ffmpeg", "-nostdin", "-loglevel", "error",
+           "-i", str(source), "-vn", "-ac", "1", "-ar", str(PEAKS_SAMPLE_RATE), "-f", "s16le", "pipe:1"]
+    try:
+        proc = subprocess.run(cmd, check=True, capture_output=True)
+    except FileNotFoundError:
+        raise PeaksUnavailable("ffmpeg is required to build waveform peaks")
+    except subprocess.CalledProcessError as e:
+        raise PeaksUnavailable(f"ffmpeg failed: {e.stderr.decode(errors='replace').strip()}")
+    return np.frombuffer(proc.stdout, dtype=np.int16)
+
+
+def _download(url, headers, f):
+    try:
+        with requests.get(url, headers=headers, stream=True, timeout=30) as resp:
+            if resp.status_code != 200:
+                raise PeaksUnavailable(f"audio download failed: HTTP {resp.status_code}")
+            for chunk in resp.iter_content(1024 * 1024):
+                f.write(chunk)
+    except requests.RequestException as e:
+        raise PeaksUnavailable(f"audio download failed: {e}")
+    f.flush()
+
+
+def pyramid(samples, base=BASE_SAMPLES_PER_PEAK):
+    """[(samples_per_peak, mins, maxs), ...] finest first; int8 values."""
+    n = -(-len(samples) // base)
+    frames = np.zeros(n * base, dtype=np.int16)
+    frames[:len(samples)] = samples
+    frames = frames.reshape(n, base)
+    mins = (frames.min(axis=1) >> 8).astype(np.int8)
+    maxs = (frames.max(axis=1) >> 8).astype(np.int8)
+
+    levels = [(base, mins, maxs)]
+    while len(mins) > MIN_LEVEL_PEAKS:
+        if len(mins) % 2:
+            mins, maxs = np.append(mins, mins[-1]), np.append(maxs, maxs[-1])
+        mins = mins.reshape(-1, 2).min(axis=1)
+        maxs = maxs.reshape(-1, 2).max(axis=1)
+        base *= 2
+        levels.append((base, mins, maxs))
+    return levels
+
+
+def build(song_id, source, source_key, headers=None):
+    """Decode `source` and write the song's pyramid; `source_key` identifies the audio (e.g. its URL)."""
+    samples = decode(source, headers)
+    levels = pyramid(samples)
+    meta = {
+        "source": source_key,
+        "sample_rate": PEAKS_SAMPLE_RATE,
+        "duration": len(samples) / PEAKS_SAMPLE_RATE,
+        "levels": [spp for spp, _, _ in levels],
+    }
+    arrays = {"meta": np.array(json.dumps(meta))}
+    for i, (_, mins, maxs) in enumerate(levels):
+        arrays[f"min{i}"] = mins
+        arrays[f"max{i}"] = maxs
+
+    os.makedirs(PEAKS_DIR, exist_ok=True)
+    path = peaks_path(song_id)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+    return path
+
+
+# ----------------------------
+# LOAD / QUERY
+# ----------------------------
+class Peaks:
+    def __init__(self, meta, levels):
+        self.source = meta["source"]
+        self.sample_rate = meta["sample_rate"]
+        self.duration = meta["duration"]
+        self.levels = levels  # [(samples_per_peak, mins, maxs)], finest first
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as z:
+            meta = json.loads(str(z["meta"]))
+            levels = [(spp, z[f"min{i}"], z[f"max{i}"]) for i, spp in enumerate(meta["levels"])]
+        return cls(meta, levels)
+
+    def window(self, start=0.0, end=None, px=800):
+        """
+        Exactly `px` (min, max) int8 pairs covering [start, end) seconds.
+        Returns (mins, maxs, seconds_per_px).
+        """
+        end = self.duration if end is None else min(end, self.duration)
+        start = max(0.0, start)
+        if end <= start:
+            raise ValueError("'to' must be after 'from'")
+        px = max(1, min(int(px), MAX_PX))
+
+        wanted = (end - start) * self.sample_rate / px  # samples per pixel
+        spp, mins, maxs = self.levels[0]
+        for level in self.levels:
+            if level[0] <= wanted:
+                spp, mins, maxs = level
+
+        edges = np.linspace(start * self.sample_rate / spp, end * self.sample_rate / spp, px + 1)
+        first = np.minimum(np.floor(edges[:-1]).astype(np.int64), len(mins) - 1)
+        stop = min(len(mins), max(int(np.ceil(edges[-1])), int(first[-1]) + 1))
+        # reduceat: runs between increasing indices; repeated indices yield single peaks
+        return (np.minimum.reduceat(mins[:stop], first), np.maximum.reduceat(maxs[:stop], first),
+                (end - start) / px)
+
+
+def interleave(mins, maxs):
+    """min0, max0, min1, max1, ... as raw int8 bytes."""
+    return np.column_stack((mins, maxs)).tobytes()
+
+
+_cache = OrderedDict()  # song_id -> (mtime, Peaks)
+_cache_lock = threading.Lock()
+_build_locks = {}  # song_id -> [lock, holders + waiters]; dropped when the last one leaves
+
+
+def _load_cached(song_id):
+    path = peaks_path(song_id)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _cache_lock:
+        entry = _cache.get(song_id)
+        if entry and entry[0] == mtime:
+            _cache.move_to_end(song_id)
+            return entry[1]
+    peaks = Peaks.load(path)
+    with _cache_lock:
+        _cache[song_id] = (mtime, peaks)
+        _cache.move_to_end(song_id)
+        while len(_cache) > PEAKS_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return peaks
+
+
+def ensure(song_id, source, source_key, headers=None):
+    """The song's Peaks, building them first if missing or made from other audio (one build per song at a time)."""
+    peaks = _load_cached(song_id)
+    if peaks and peaks.source == source_key:
+        return peaks
+    with _cache_lock:
+        entry = _build_locks.setdefault(song_id, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            peaks = _load_cached(song_id)  # built meanwhile by another request
+            if peaks and peaks.source == source_key:
+                return peaks
+            build(song_id, source, source_key, headers)
+            return _load_cached(song_id)
+    finally:
+        with _cache_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _build_locks[song_id]
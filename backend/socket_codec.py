@@ -0,0 +1,152 @@
+# backend/socket_codec.py
+"""
+Opt-in MessagePack encoding for Socket.IO room events.
+
+A client asks for it when connecting, either with the query string
+`?codec=msgpack` or with `auth={"codec": "msgpack"}`. Every other client
+keeps receiving plain JSON.
+
+For msgpack clients the event payload is a single binary attachment
+holding the msgpack-encoded data. Lists of dicts that all share the same
+keys (leaderboard, playlists) are packed as ext type 1 containing
+`[keys, rows]`, so keys like `submitted_by` are sent once per list
+instead of once per song. Only the top level and one dict level down
+are tabulated. Decoders rebuild the dicts from that table.
+"""
+from urllib.parse import parse_qs
+
+try:
+    import msgpack
+except ImportError:  # JSON-only fallback
+    msgpack = None
+
+CODEC_JSON = "json"
+CODEC_MSGPACK = "msgpack"
+
+# msgpack ext type used for columnar lists of dicts
+TABLE_EXT = 1
+
+# msgpack sockets also sit in "<room>::msgpack" so one encode serves them all
+PACKED_ROOM_SUFFIX = "::msgpack"
+
+
+def requested_codec(environ, auth=None):
+    """Codec asked for by a connecting client (JSON unless msgpack is available and requested)."""
+    wanted = None
+    if isinstance(auth, dict):
+        wanted = auth.get("codec")
+    if not wanted and environ:
+        qs = parse_qs(environ.get("QUERY_STRING", ""))
+        wanted = (qs.get("codec") or [None])[0]
+    if wanted == CODEC_MSGPACK and msgpack is not None:
+        return CODEC_MSGPACK
+    return CODEC_JSON
+
+
+def _table_keys(items):
+    if len(items) < 2 or not isinstance(items[0], dict):
+        return None
+    first = items[0].keys()
+    for item in items:
+        if not isinstance(item, dict) or item.keys() != first:
+            return None
+    return list(first)
+
+
+def _table(items, keys):
+    rows = [[item[k] for k in keys] for item in items]
+    return msgpack.ExtType(TABLE_EXT, msgpack.packb([keys, rows], default=_default))
+
+
+def _compact(obj):
+    """
+    Tabulate lists of dicts at the top level or one dict level down.
+    Deeper data is left to msgpack's C packer so the common payloads
+    never get walked in Python.
+    """
+    if isinstance(obj, list):
+        keys = _table_keys(obj)
+        return obj if keys is None else _table(obj, keys)
+    if isinstance(obj, dict):
+        out = None
+        for k, v in obj.items():
+            if isinstance(v, list):
+                keys = _table_keys(v)
+                if keys is not None:
+                    if out is None:
+                        out = dict(obj)
+                    out[k] = _table(v, keys)
+        return obj if out is None else out
+    return obj
+
+
+def _default(obj):
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj)
+    raise TypeError(f"cannot msgpack {type(obj).__name__}")
+
+
+def _ext_hook(code, data):
+    if code == TABLE_EXT:
+        keys, rows = msgpack.unpackb(data, ext_hook=_ext_hook, raw=False)
+        return [dict(zip(keys, row)) for row in rows]
+    return msgpack.ExtType(code, data)
+
+
+def encode(data):
+    """Encode a payload as compact msgpack bytes."""
+    return msgpack.packb(_compact(data), default=_default)
+
+
+def decode(raw):
+    """Inverse of encode() (used by clients written in Python and the benchmarks)."""
+    return msgpack.unpackb(raw, ext_hook=_ext_hook, raw=False)
+
+
+class SocketCodecs:
+    """Per-client codec negotiation plus room emits that honour it."""
+
+    def __init__(self, sio):
+        self.sio = sio
+        self.packed_sids = set()
+
+    def register(self, sid, environ, auth=None):
+        codec = requested_codec(environ, auth)
+        if codec == CODEC_MSGPACK:
+            self.packed_sids.add(sid)
+        return codec
+
+    def forget(self, sid):
+        self.packed_sids.discard(sid)
+
+    def codec(self, sid):
+        return CODEC_MSGPACK if sid in self.packed_sids else CODEC_JSON
+
+    async def enter_room(self, sid, room):
+        await self.sio.enter_room(sid, room)
+        if sid in self.packed_sids:
+            await self.sio.enter_room(sid, room + PACKED_ROOM_SUFFIX)
+
+    def _packed_members(self, room):
+        return [sid for sid, _ in self.sio.manager.get_participants("/", room + PACKED_ROOM_SUFFIX)]
+
+    async def emit(self, event, data, room):
+        """
+        Emit `event` to a room (or a single sid). JSON clients get the data
+        as-is; msgpack clients get one shared binary encoding.
+        """
+        if not self.packed_sids:
+            await self.sio.emit(event, data, room=room)
+            return
+
+        if room in self.packed_sids:
+            await self.sio.emit(event, encode(data), room=room)
+            return
+
+        packed = self._packed_members(room)
+        if not packed:
+            await self.sio.emit(event, data, room=room)
+            return
+
+        await self.sio.emit(event, data, room=room, skip_sid=packed)
+        await self.sio.emit(event, encode(data), room=room + PACKED_ROOM_SUFFIX)
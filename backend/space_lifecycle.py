@@ -0,0 +1,136 @@
+# backend/space_lifecycle.py
+import os
+import sys
+import json
+import time
+
+# ----------------------------
+# CONFIG
+# ----------------------------
+# Seconds an empty space may sit idle before it is evicted
+SPACE_IDLE_TTL = float(os.getenv("SPACE_IDLE_TTL", 30 * 60))
+
+# How often the sweeper looks for idle spaces
+SPACE_SWEEP_INTERVAL = float(os.getenv("SPACE_SWEEP_INTERVAL", 60))
+
+# If set, evicted spaces are dumped here as JSON before being dropped
+SPACE_ARCHIVE_DIR = os.getenv("SPACE_ARCHIVE_DIR", "")
+
+
+def approx_size(obj, seen=None):
+    """
+    Rough deep size of a space entry in bytes (dicts, lists, sets, scalars).
+    Shared objects are only counted once.
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            size += approx_size(k, seen) + approx_size(v, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += approx_size(item, seen)
+    return size
+
+
+def _jsonable(obj):
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj)
+    raise TypeError(f"not JSON serializable: {type(obj).__name__}")
+
+
+class SpaceLifecycle:
+    """
+    Tracks last activity per space and drops spaces that have had no
+    members for longer than the idle TTL.
+    """
+
+    def __init__(self, spaces, ttl=SPACE_IDLE_TTL, archive_dir=SPACE_ARCHIVE_DIR):
+        self.spaces = spaces
+        self.ttl = ttl
+        self.archive_dir = archive_dir
+        self.last_active = {}
+
+    def touch(self, space_name):
+        if space_name in self.spaces:
+            self.last_active[space_name] = time.monotonic()
+
+    def forget(self, space_name):
+        self.last_active.pop(space_name, None)
+
+    def member_count(self, space_name):
+        return len(self.spaces.get(space_name, {}).get("users", []))
+
+    def idle_seconds(self, space_name, now=None):
+        now = time.monotonic() if now is None else now
+        last = self.last_active.setdefault(space_name, now)
+        return max(0.0, now - last)
+
+    def idle_spaces(self, now=None):
+        """Names of spaces with no members whose idle time exceeds the TTL."""
+        now = time.monotonic() if now is None else now
+        return [
+            name for name in list(self.spaces.keys())
+            if self.member_count(name) == 0 and self.idle_seconds(name, now) >= self.ttl
+        ]
+
+    def archive(self, space_name):
+        if not self.archive_dir:
+            return None
+        os.makedirs(self.archive_dir, exist_ok=True)
+        safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in space_name)
+        path = os.path.join(self.archive_dir, f"{safe}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"space": space_name, "archived_at": time.time(), "state": self.spaces[space_name]},
+                f,
+                default=_jsonable,
+            )
+        return path
+
+    def evict(self, space_name):
+        """Archive (if configured) and remove a space. Returns True if it existed."""
+        if space_name not in self.spaces:
+            self.forget(space_name)
+            return False
+        try:
+            self.archive(space_name)
+        except Exception as e:
+            print(f"[spaces] archive failed for {space_name}: {e}")
+        self.spaces.pop(space_name, None)
+        self.forget(space_name)
+        return True
+
+    def sweep(self, now=None):
+        """Evict every idle space. Returns the evicted names."""
+        evicted = [name for name in self.idle_spaces(now) if self.evict(name)]
+        # drop bookkeeping for spaces removed by other code paths
+        for name in list(self.last_active.keys()):
+            if name not in self.spaces:
+                self.forget(name)
+        return evicted
+
+    def report(self, now=None):
+        """Per-space members, idle time and approximate memory, largest first."""
+        now = time.monotonic() if now is None else now
+        rows = []
+        for name, state in list(self.spaces.items()):
+            rows.append({
+                "space": name,
+                "members": self.member_count(name),
+                "idle_seconds": round(self.idle_seconds(name, now), 1),
+                "leaderboard_size": len(state.get("leaderboard", [])),
+                "approx_bytes": approx_size(state),
+            })
+        rows.sort(key=lambda r: -r["approx_bytes"])
+        return {
+            "ttl_seconds": self.ttl,
+            "space_count": len(rows),
+            "total_approx_bytes": sum(r["approx_bytes"] for r in rows),
+            "spaces": rows,
+        }
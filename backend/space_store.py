@@ -0,0 +1,308 @@
+# backend/space_store.py
+"""
+Local persistence for `spaces`: an append-only log plus periodic snapshots.
+
+Handlers only mark a space as changed (a set add). A flush task on the
+event loop serialises each changed space once per SPACE_FLUSH_MS, whatever
+the number of events in between, and hands the lines to a single writer
+thread. Log records are whole-space states, so replay is last-writer-wins:
+
+    {"seq": 42, "op": "put", "space": "...", "state": {...}}
+    {"seq": 43, "op": "drop", "space": "..."}
+
+fsync policy (SPACE_FSYNC):
+  always    fsync after every flushed batch
+  interval  fsync at most every SPACE_FSYNC_INTERVAL_MS (default)
+  off       leave it to the OS
+
+Once the log passes SPACE_LOG_MAX_BYTES (or SPACE_SNAPSHOT_INTERVAL has
+passed with changes), the writer compacts it: the latest record of every
+live space goes to snapshot.jsonl (atomic replace) and the log starts
+over. The writer keeps those latest lines itself, so compaction never
+touches (or blocks) the live `spaces` dict. The snapshot's first line
+holds the last seq it covers; a crash between the replace and the
+truncate only replays records the snapshot already has, and those are
+skipped. A record torn by a crash mid-write is cut off the log on
+restore, before anything new is appended after it.
+
+The once-a-second playback position tick goes through `ticked()`, which
+persists it at most every SPACE_POSITION_PERSIST_S; play/pause/seek and
+every other event are persisted as they happen.
+"""
+import os
+import json
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from space_lifecycle import _jsonable
+
+# ----------------------------
+# CONFIG
+# ----------------------------
+# Empty = persistence off
+SPACE_STORE_DIR = os.getenv("SPACE_STORE_DIR", os.path.join("temp", "spaces"))
+
+# How often changed spaces are serialised and handed to the writer
+SPACE_FLUSH_MS = float(os.getenv("SPACE_FLUSH_MS", 50))
+
+SPACE_FSYNC = os.getenv("SPACE_FSYNC", "interval")  # always | interval | off
+SPACE_FSYNC_INTERVAL_MS = float(os.getenv("SPACE_FSYNC_INTERVAL_MS", 1000))
+
+# Compact the log into a snapshot past this size, or this often while it changes
+SPACE_LOG_MAX_BYTES = int(os.getenv("SPACE_LOG_MAX_BYTES", 8 * 1024 * 1024))
+SPACE_SNAPSHOT_INTERVAL = float(os.getenv("SPACE_SNAPSHOT_INTERVAL", 10 * 60))
+
+# Playback position ticks are persisted at most this often (seconds)
+SPACE_POSITION_PERSIST_S = float(os.getenv("SPACE_POSITION_PERSIST_S", 15))
+
+# Restored members whose socket has not rejoined by then are dropped
+SPACE_REJOIN_GRACE = float(os.getenv("SPACE_REJOIN_GRACE", 120))
+
+SNAPSHOT_FILE = "snapshot.jsonl"
+LOG_FILE = "events.log"
+
+
+def _dumps(obj):
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=_jsonable)
+
+
+def _revive(state):
+    """
+    JSON state back to the in-memory shape: vote sets were written as
+    lists, and `current_song` is the very dict of its leaderboard entry
+    (handlers update one and expect the other to follow), not a copy.
+    """
+    state["votes"] = {k: set(v) for k, v in state.get("votes", {}).items()}
+    current = state.get("current_song")
+    if current:
+        for entry in state.get("leaderboard", []):
+            if entry.get("id") == current.get("id"):
+                state["current_song"] = entry
+                break
+    return state
+
+
+class SpaceStore:
+    def __init__(self, spaces, directory=SPACE_STORE_DIR, fsync=SPACE_FSYNC):
+        self.spaces = spaces
+        self.directory = directory
+        self.fsync = fsync
+        self.enabled = bool(directory)
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        self.log_path = os.path.join(directory, LOG_FILE)
+        self.seq = 0
+        self.dirty = set()
+        self._ticked = {}  # space -> when a position tick was last persisted
+        self.log_bytes = 0
+        self.last_snapshot = time.monotonic()
+        self.stats = {"records": 0, "batches": 0, "fsyncs": 0, "snapshots": 0, "restore_ms": None}
+        # writer-thread state
+        self._log = None
+        self._latest = {}  # space -> its last "put" line
+        self._last_fsync = 0.0
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="space-store")
+
+    def changed(self, space_name):
+        """Mark a space as mutated (or removed); persisted on the next flush."""
+        if self.enabled:
+            self.dirty.add(space_name)
+
+    def ticked(self, space_name):
+        """Playback position advanced on its own: persist it, at most every SPACE_POSITION_PERSIST_S."""
+        now = time.monotonic()
+        if now - self._ticked.get(space_name, -SPACE_POSITION_PERSIST_S) >= SPACE_POSITION_PERSIST_S:
+            self._ticked[space_name] = now
+            self.changed(space_name)
+
+    # ----------------------------
+    # RESTORE
+    # ----------------------------
+    def restore(self):
+        """Load snapshot + log into `spaces`. Returns the restored space names."""
+        if not self.enabled:
+            return []
+        start = time.perf_counter()
+        os.makedirs(self.directory, exist_ok=True)
+        states = {}
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                self._replay(f, states)
+        except FileNotFoundError:
+            pass
+        try:
+            with open(self.log_path, "r+b") as f:
+                self.log_bytes = self._replay(f, states, after=self.seq)
+                if f.seek(0, os.SEEK_END) > self.log_bytes:
+                    # drop the torn tail, or the next append would be glued onto it
+                    f.truncate(self.log_bytes)
+        except FileNotFoundError:
+            pass
+
+        for name, (state, _) in states.items():
+            self.spaces[name] = _revive(state)
+        self._latest = {name: line for name, (_, line) in states.items()}
+        self.stats["restore_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return list(states)
+
+    def _replay(self, f, states, after=-1):
+        """
+        Apply records of `f` with seq > `after` to `states` (space -> (state, line)).
+        Returns the offset just past the last complete record.
+        """
+        good = 0
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # torn last line from a crash mid-write
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            good += len(line)
+            if "op" not in record:  # snapshot header: the seq it covers
+                self.seq = max(self.seq, record["seq"])
+                continue
+            if record["seq"] <= after:
+                continue
+            self.seq = max(self.seq, record["seq"])
+            if record["op"] == "put":
+                states[record["space"]] = (record["state"], line)
+            else:
+                states.pop(record["space"], None)
+        return good
+
+    # ----------------------------
+    # FLUSH (event loop) → WRITE (writer thread)
+    # ----------------------------
+    def flush(self):
+        """Serialise changed spaces and queue them for the writer. Returns the future (or None)."""
+        if not self.dirty:
+            return None
+        names, self.dirty = self.dirty, set()
+        records = []  # (space, line, is_put)
+        for name in names:
+            self.seq += 1
+            state = self.spaces.get(name)
+            if state is None:
+                record = {"seq": self.seq, "op": "drop", "space": name}
+                self._ticked.pop(name, None)
+            else:
+                record = {"seq": self.seq, "op": "put", "space": name, "state": state}
+            line = _dumps(record).encode("utf-8") + b"\n"
+            records.append((name, line, state is not None))
+            self.log_bytes += len(line)
+        self.stats["records"] += len(records)
+        return self._writer.submit(self._append, records)
+
+    def snapshot(self):
+        """Compact the log into the snapshot (after anything still pending). Returns the future."""
+        self.flush()
+        self.log_bytes = 0
+        self.last_snapshot = time.monotonic()
+        return self._writer.submit(self._write_snapshot, self.seq)
+
+    def maybe_snapshot(self):
+        if self.log_bytes >= SPACE_LOG_MAX_BYTES or (
+                self.log_bytes and time.monotonic() - self.last_snapshot >= SPACE_SNAPSHOT_INTERVAL):
+            return self.snapshot()
+        return None
+
+    async def run(self):
+        """Flush task; start once on the event loop."""
+        if not self.enabled:
+            return
+        while True:
+            await asyncio.sleep(SPACE_FLUSH_MS / 1000)
+            try:
+                self.flush()
+                self.maybe_snapshot()
+            except Exception as e:
+                print("[spaces] persist error:", e)
+
+    def close(self):
+        """Final snapshot on shutdown; blocks until it is on disk."""
+        if not self.enabled:
+            return
+        self.snapshot().result()
+        self._writer.submit(self._close_log).result()
+
+    def _open_log(self):
+        if self._log is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._log = open(self.log_path, "ab")
+        return self._log
+
+    def _append(self, records):
+        log = self._open_log()
+        log.write(b"".join(line for _, line, _ in records))
+        log.flush()
+        for name, line, is_put in records:
+            if is_put:
+                self._latest[name] = line
+            else:
+                self._latest.pop(name, None)
+        self.stats["batches"] += 1
+        now = time.monotonic()
+        if self.fsync == "always" or (
+                self.fsync == "interval" and (now - self._last_fsync) * 1000 >= SPACE_FSYNC_INTERVAL_MS):
+            os.fsync(log.fileno())
+            self._last_fsync = now
+            self.stats["fsyncs"] += 1
+
+    def _write_snapshot(self, seq):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(_dumps({"seq": seq, "saved_at": time.time()}).encode("utf-8") + b"\n")
+            f.writelines(self._latest.values())
+            f.flush()
+            if self.fsync != "off":
+                os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+        # everything in the log is now covered by the snapshot
+        self._close_log()
+        with open(self.log_path, "wb"):
+            pass
+        self.stats["snapshots"] += 1
+
+    def _close_log(self):
+        if self._log is not None:
+            if self.fsync != "off":
+                os.fsync(self._log.fileno())
+            self._log.close()
+            self._log = None
+
+    def report(self):
+        return {
+            "dir": self.directory,
+            "enabled": self.enabled,
+            "fsync": self.fsync,
+            "seq": self.seq,
+            "pending": len(self.dirty),
+            "log_bytes": self.log_bytes,
+            **self.stats,
+        }
+
+
+def instrument_socketio(sio, store, skip=()):
+    """
+    Mark `data["space"]` changed after every Socket.IO handler not in `skip`.
+    Marking after the handler (not when it starts) catches mutations made
+    after its awaits too. Call before metrics.instrument_socketio.
+    """
+    for handlers in sio.handlers.values():
+        for event, handler in list(handlers.items()):
+            if event in skip:
+                continue
+            handlers[event] = _wrap_handler(store, handler)
+
+
+def _wrap_handler(store, handler):
+    async def wrapped(*args):
+        try:
+            return await handler(*args)
+        finally:
+            data = args[1] if len(args) > 1 else None
+            if isinstance(data, dict) and isinstance(data.get("space"), str):
+                store.changed(data["space"])
+    return wrapped
@@ -0,0 +1,6 @@
+# backend/tests/conftest.py
+import os
+import sys
+
+# Tests import backend modules the way main.py does (run from backend/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
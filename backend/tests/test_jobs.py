@@ -0,0 +1,50 @@
+# backend/tests/test_jobs.py
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from karaoke.jobs import JobManager
+
+
+def test_waiters_do_not_hold_executor_threads():
+    release = threading.Event()
+
+    def runner(song_name, progress):
+        release.wait(5)
+        return {"song": song_name}
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        # a single default-executor thread: a waiter parked on it would starve this call
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=1))
+        manager = JobManager(runner, workers=1)
+        job, _ = manager.submit("some song")
+
+        waits = [asyncio.ensure_future(manager.wait(job, 5)) for _ in range(8)]
+        await asyncio.sleep(0.05)
+        assert await asyncio.wait_for(loop.run_in_executor(None, lambda: "free"), 1) == "free"
+
+        release.set()
+        done = await asyncio.wait_for(asyncio.gather(*waits), 2)
+        assert all(j.status == "done" for j in done)
+        assert job.waiters == []
+        manager.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_wait_times_out_while_job_runs():
+    release = threading.Event()
+
+    async def scenario():
+        manager = JobManager(lambda song_name, progress: release.wait(5), workers=1)
+        job, _ = manager.submit("slow song")
+        await manager.wait(job, 0.05)
+        assert job.active
+        assert job.waiters == []
+        release.set()
+        await manager.wait(job, 2)
+        assert job.status == "done"
+        manager.shutdown()
+
+    asyncio.run(scenario())
@@ -0,0 +1,135 @@
+# backend/tests/test_parallel_jobs.py
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from karaoke import cache, encode
+from karaoke import karaoke
+
+JOBS = 4
+
+
+def digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class FakeCursor:
+    """Answers _find_song from `songs`; everything else (cache columns, lookups) comes back empty."""
+
+    def __init__(self, songs):
+        self.songs = songs
+        self.row = None
+
+    def execute(self, query, params=()):
+        self.row = None
+        if "FROM songs" in query:
+            needle = params[0].strip("%")
+            self.row = next((s for s in self.songs if needle in s["title"].lower()), None)
+
+    def fetchone(self):
+        return self.row
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, songs):
+        self.songs = songs
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self.songs)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_pipeline(tmp_path, monkeypatch):
+    """
+    process_song against local inputs with cheap model stand-ins that
+    still read the job's own input and write into its workdir.
+    """
+    songs = []
+    for i in range(JOBS):
+        src = tmp_path / f"input_{i}.wav"
+        src.write_bytes(f"song {i} audio".encode() * 1000)
+        songs.append({"id": i + 1, "title": f"Song {i}", "audio_url": str(src)})
+
+    calls, peaks = [], []
+    lock = threading.Lock()
+    overlap = threading.Barrier(JOBS, timeout=10)  # every job is inside separation at once
+
+    def demucs_separate(audio_path, device, workdir, on_partial=None, mode=None):
+        overlap.wait()
+        vocals = os.path.join(workdir, "vocals.wav")
+        accomp = os.path.join(workdir, "accompaniment.wav")
+        shutil.copy(audio_path, vocals)
+        shutil.copy(audio_path, accomp)
+        with lock:
+            calls.append({"workdir": str(workdir), "input": digest(audio_path)})
+        time.sleep(0.05)
+        return vocals, accomp
+
+    def align_lyrics_whisperx(vocals_path, device, workdir):
+        lines = [[{"text": digest(vocals_path), "start": 0.0, "end": 1.0}]]
+        path = os.path.join(workdir, "lyrics.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"lines": lines}, f)
+        return path, lines
+
+    def build_peaks(song_id, input_path, audio_url):
+        time.sleep(0.1)
+        with lock:
+            peaks.append(os.path.exists(input_path))  # the job must not clean up under it
+
+    monkeypatch.setattr(karaoke, "demucs_separate", demucs_separate)
+    monkeypatch.setattr(karaoke, "align_lyrics_whisperx", align_lyrics_whisperx)
+    monkeypatch.setattr(karaoke, "_build_peaks", build_peaks)
+    monkeypatch.setattr(karaoke, "db_conn", lambda: FakeConnection(songs))
+    monkeypatch.setattr(karaoke, "DRY_RUN", True)
+    monkeypatch.setattr(karaoke, "TMP", tmp_path / "work")
+    monkeypatch.setattr(encode, "STEM_FORMAT", "wav")
+    monkeypatch.setattr(cache, "CACHE_DIR", tmp_path / "cache")
+    (tmp_path / "work").mkdir()
+    return songs, calls, peaks
+
+
+def test_concurrent_jobs_are_isolated(fake_pipeline, tmp_path):
+    songs, calls, peaks = fake_pipeline
+
+    with ThreadPoolExecutor(max_workers=JOBS) as pool:
+        results = list(pool.map(lambda s: karaoke.process_song(s["title"].lower(), "cpu"), songs))
+
+    assert len(calls) == JOBS
+    assert len({c["workdir"] for c in calls}) == JOBS, "jobs shared a work directory"
+    assert sorted(c["input"] for c in calls) == sorted(digest(s["audio_url"]) for s in songs)
+    for song, result in zip(songs, results):
+        assert result["song_id"] == song["id"]
+        assert result["cached"] is False
+        # the lyrics were aligned on this job's own vocals, i.e. its own input
+        assert result["sample_lyrics"][0][0]["text"] == digest(song["audio_url"])
+    assert len({r["vocals_url"] for r in results}) == JOBS
+    assert len({r["sample_lyrics"][0][0]["text"] for r in results}) == JOBS
+    assert os.listdir(tmp_path / "work") == [], "work directories were left behind"
+    assert peaks == [True] * JOBS, "peaks were built after (or while) the workdir was removed"
+
+    # stems kept per input in the content-addressed store, never mixed up
+    for song in songs:
+        stored = cache.load_artifacts(cache.file_digest(song["audio_url"]), karaoke.pipeline_version(),
+                                      karaoke.artifact_names())
+        assert stored is not None
+        assert digest(stored["vocals.wav"]) == digest(song["audio_url"])
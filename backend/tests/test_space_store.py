@@ -0,0 +1,118 @@
+# backend/tests/test_space_store.py
+import os
+
+import space_store
+from space_store import SpaceStore
+
+
+def song(song_id, name, votes=0):
+    return {"id": song_id, "name": name, "artist": "Artist", "votes": votes, "submitted_by": "ann",
+            "db_song_id": 100 + song_id}
+
+
+def space(*users):
+    """Same shape as main.py's spaces, playing the top of its leaderboard."""
+    leaderboard = [song(1, "First", votes=len(users)), song(2, "Second")]
+    return {
+        "users": list(users),
+        "leaderboard": leaderboard,
+        "current_song": leaderboard[0],
+        "admins": list(users[:1]),
+        "votes": {"1": set(users), "2": set()},
+        "is_playing": True,
+    }
+
+
+def crash(store):
+    """Simulate a kill -9: pending writes reach the file, nothing else runs."""
+    store._writer.shutdown(wait=True)
+    if store._log is not None:
+        store._log.flush()
+
+
+def test_torn_tail_is_truncated_and_later_appends_survive(tmp_path):
+    directory = str(tmp_path)
+
+    spaces = {"alpha": space("ann"), "beta": space("bob")}
+    store = SpaceStore(spaces, directory, fsync="always")
+    store.changed("alpha")
+    store.changed("beta")
+    store.flush().result()
+    crash(store)
+    with open(os.path.join(directory, "events.log"), "ab") as f:
+        f.write(b'{"seq":99,"op":"put","space":"alpha","sta')  # torn mid-write
+
+    # first restart: the torn record is dropped, the rest is restored
+    spaces = {}
+    store = SpaceStore(spaces, directory, fsync="always")
+    assert sorted(store.restore()) == ["alpha", "beta"]
+    assert os.path.getsize(store.log_path) == store.log_bytes
+    spaces["gamma"] = space("cat")
+    spaces["alpha"]["users"].append("dan")
+    store.changed("gamma")
+    store.changed("alpha")
+    store.flush().result()
+    crash(store)
+
+    # second restart: nothing written after the first recovery is lost
+    spaces = {}
+    store = SpaceStore(spaces, directory, fsync="always")
+    assert sorted(store.restore()) == ["alpha", "beta", "gamma"]
+    assert spaces["alpha"]["users"] == ["ann", "dan"]
+    assert spaces["alpha"]["votes"] == {"1": {"ann"}, "2": set()}
+    assert spaces["gamma"]["users"] == ["cat"]
+    assert store.seq == 4
+    store.close()
+
+
+def test_restore_after_snapshot_and_more_log(tmp_path):
+    directory = str(tmp_path)
+    spaces = {"alpha": space("ann")}
+    store = SpaceStore(spaces, directory, fsync="off")
+    store.changed("alpha")
+    store.snapshot().result()
+    spaces["beta"] = space("bob")
+    del spaces["alpha"]
+    store.changed("alpha")
+    store.changed("beta")
+    store.flush().result()
+    crash(store)
+
+    spaces = {}
+    store = SpaceStore(spaces, directory, fsync="off")
+    assert store.restore() == ["beta"]
+    store.close()
+
+
+def test_current_song_is_relinked_to_its_leaderboard_entry(tmp_path):
+    directory = str(tmp_path)
+    spaces = {"alpha": space("ann", "bob")}
+    store = SpaceStore(spaces, directory, fsync="off")
+    store.changed("alpha")
+    store.flush().result()
+    crash(store)
+
+    spaces = {}
+    store = SpaceStore(spaces, directory, fsync="off")
+    store.restore()
+    alpha = spaces["alpha"]
+    assert alpha["current_song"] is alpha["leaderboard"][0]
+    # what progress_sync_task / upvote do to one must show in the other
+    alpha["current_song"]["position"] = 42
+    alpha["leaderboard"][0]["votes"] += 1
+    assert alpha["leaderboard"][0]["position"] == 42
+    assert alpha["current_song"]["votes"] == 3
+    store.close()
+
+
+def test_position_ticks_are_persisted_at_most_once_per_interval(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(space_store.time, "monotonic", lambda: now[0])
+    store = SpaceStore({"alpha": space("ann")}, str(tmp_path), fsync="off")
+    persisted = 0
+    for _ in range(30):  # progress_sync_task: one tick a second
+        store.ticked("alpha")
+        persisted += store.dirty == {"alpha"}
+        store.dirty.clear()
+        now[0] += 1
+    assert persisted == 30 // space_store.SPACE_POSITION_PERSIST_S
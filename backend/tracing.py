@@ -0,0 +1,370 @@
+# backend/tracing.py
+"""
+Opt-in request / job tracing with Chrome trace export.
+
+A trace is started for an HTTP request when it carries `X-Trace: 1` plus
+the admin token (X-Admin-Token or Bearer, as for /admin/*; at most
+TRACE_FORCED_PER_MINUTE of those) or wins the TRACE_SAMPLE_RATE draw, and
+for a karaoke job submitted by a traced request (or drawn the same way). While a trace is active,
+`span(...)` / `@traced` record complete events; otherwise they cost one
+ContextVar lookup. Finished traces are written to TRACE_DIR as
+Chrome-trace JSON (open in chrome://tracing or https://ui.perfetto.dev).
+
+The trace lives in a ContextVar, which thread pools do not inherit:
+hand work to executors through `bind(fn)` so its spans land in the
+caller's trace.
+
+With PROFILE_SLOWEST = N > 0, a sampler thread also records the stacks of
+every thread a trace has touched while it runs. The collapsed stacks of
+the N slowest traces so far are kept next to their JSON as `.folded`
+files (flamegraph.pl / speedscope input). Stacks of the event-loop thread
+include whatever else the loop was doing at the time.
+"""
+import os
+import re
+import sys
+import json
+import time
+import hmac
+import heapq
+import random
+import threading
+import functools
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+# ----------------------------
+# CONFIG
+# ----------------------------
+# Share of requests / karaoke jobs traced without the header (0 = header only)
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0))
+
+# Request header that forces a trace (honoured only with the admin token)
+TRACE_HEADER = os.getenv("TRACE_HEADER", "x-trace")
+
+# Cap on header-forced traces, so even admin-authenticated clients cannot
+# turn every request into a traced (and written-to-disk) one
+TRACE_FORCED_PER_MINUTE = int(os.getenv("TRACE_FORCED_PER_MINUTE", 60))
+
+TRACE_DIR = os.getenv("TRACE_DIR", os.path.join("temp", "traces"))
+
+# Oldest trace files beyond this count are deleted
+TRACE_MAX_FILES = int(os.getenv("TRACE_MAX_FILES", 500))
+
+# Keep sampled stacks for the N slowest traces (0 = profiler off)
+PROFILE_SLOWEST = int(os.getenv("PROFILE_SLOWEST", 0))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+
+_current = contextvars.ContextVar("trace", default=None)
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trace-writer")
+
+
+class Trace:
+    """Events of one traced request or job, in Chrome trace "complete event" form."""
+
+    def __init__(self, name):
+        self.id = "%016x" % random.getrandbits(64)
+        self.name = name
+        self.started_at = time.time()
+        self.t0 = time.perf_counter()
+        self.duration = None
+        self.events = []
+        self.root_tid = threading.get_ident()
+        self.tids = {self.root_tid}
+        self.thread_names = {}  # virtual tracks (e.g. karaoke stages)
+        self.samples = Counter()
+
+    def add_span(self, name, start, end, tid=None, **args):
+        """Record a span from perf_counter() timestamps."""
+        tid = tid or threading.get_ident()
+        self.tids.add(tid)
+        event = {"name": name, "ph": "X", "pid": os.getpid(), "tid": tid,
+                 "ts": round((start - self.t0) * 1e6, 1), "dur": round((end - start) * 1e6, 1)}
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    def to_json(self):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        names.update(self.thread_names)
+        meta = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid,
+                 "args": {"name": names.get(tid, str(tid))}} for tid in self.tids]
+        return {
+            "traceEvents": meta + self.events,
+            "displayTimeUnit": "ms",
+            "otherData": {"trace_id": self.id, "name": self.name, "started_at": self.started_at,
+                          "duration_s": self.duration},
+        }
+
+
+def current():
+    return _current.get()
+
+
+def should_sample(forced=False):
+    return forced or (TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE)
+
+
+def configure(sample_rate=None, profile_slowest=None):
+    """Change sampling / profiling at runtime (admin endpoint)."""
+    global TRACE_SAMPLE_RATE, PROFILE_SLOWEST
+    if sample_rate is not None:
+        TRACE_SAMPLE_RATE = min(1.0, max(0.0, float(sample_rate)))
+    if profile_slowest is not None:
+        PROFILE_SLOWEST = max(0, int(profile_slowest))
+    return settings()
+
+
+def settings():
+    return {
+        "sample_rate": TRACE_SAMPLE_RATE,
+        "header": TRACE_HEADER,
+        "dir": TRACE_DIR,
+        "profile_slowest": PROFILE_SLOWEST,
+        "slowest": [{"trace_id": t, "duration_s": round(d, 3)} for d, t, _ in sorted(_slowest, reverse=True)],
+    }
+
+
+# ----------------------------
+# SPANS
+# ----------------------------
+@contextmanager
+def span(name, **args):
+    """Record the block as a span of the current trace (no-op when untraced)."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    trace.tids.add(threading.get_ident())
+    try:
+        yield
+    finally:
+        trace.add_span(name, start, time.perf_counter(), **args)
+
+
+def traced(fn=None, name=None):
+    """Decorator form of span(); `@traced` or `@traced(name="...")`."""
+    if fn is None:
+        return functools.partial(traced, name=name)
+    label = name or fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if _current.get() is None:
+            return fn(*args, **kwargs)
+        with span(label):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def bind(fn, *args, **kwargs):
+    """`fn` bound to a copy of the caller's context (for run_in_executor / pools)."""
+    return functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+@contextmanager
+def activate(trace):
+    """Make `trace` current for the block (None is allowed and does nothing)."""
+    if trace is None:
+        yield None
+        return
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+def start(name, forced=False):
+    """New Trace if this request/job is sampled, else None. Pair with finish()."""
+    if not should_sample(forced):
+        return None
+    trace = Trace(name)
+    if PROFILE_SLOWEST > 0:
+        _sampler.add(trace)
+    return trace
+
+
+def finish(trace):
+    """Close `trace` and write it out in the background."""
+    if trace is None:
+        return
+    trace.duration = time.perf_counter() - trace.t0
+    trace.add_span(trace.name, trace.t0, trace.t0 + trace.duration, tid=trace.root_tid)
+    _sampler.discard(trace)
+    _writer.submit(_write, trace)
+
+
+# ----------------------------
+# OUTPUT
+# ----------------------------
+_slowest = []  # min-heap of (duration, trace_id, folded_path)
+_slowest_lock = threading.Lock()
+
+
+def _base_path(trace):
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(trace.started_at))
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", trace.name).strip("_")[:60]
+    return os.path.join(TRACE_DIR, f"{stamp}-{trace.id}-{slug}")
+
+
+def _write(trace):
+    try:
+        os.makedirs(TRACE_DIR, exist_ok=True)
+        base = _base_path(trace)
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(trace.to_json(), f)
+        if trace.samples:
+            _keep_profile(trace, base + ".folded")
+        _prune()
+    except Exception as e:
+        print("[tracing] write failed:", e)
+
+
+def _keep_profile(trace, path):
+    if PROFILE_SLOWEST <= 0:
+        return
+    with _slowest_lock:
+        entry = (trace.duration, trace.id, path)
+        if len(_slowest) < PROFILE_SLOWEST:
+            heapq.heappush(_slowest, entry)
+            dropped = None
+        elif trace.duration > _slowest[0][0]:
+            dropped = heapq.heapreplace(_slowest, entry)
+        else:
+            return
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in trace.samples.most_common():
+            f.write(f"{stack} {count}\n")
+    if dropped:
+        try:
+            os.remove(dropped[2])
+        except OSError:
+            pass
+
+
+def _prune():
+    files = sorted((e for e in os.scandir(TRACE_DIR) if e.name.endswith(".json")),
+                   key=lambda e: e.stat().st_mtime)
+    for entry in files[:max(0, len(files) - TRACE_MAX_FILES)]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+# ----------------------------
+# SAMPLING PROFILER
+# ----------------------------
+def _collapse(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+class _Sampler:
+    """One background thread sampling the threads of active traces, only while there are any."""
+
+    def __init__(self):
+        self.active = set()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def add(self, trace):
+        with self.lock:
+            self.active.add(trace)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="trace-sampler", daemon=True)
+                self.thread.start()
+
+    def discard(self, trace):
+        """Stop sampling `trace`; once this returns its samples no longer change."""
+        with self.lock:
+            self.active.discard(trace)
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            time.sleep(PROFILE_INTERVAL_MS / 1000)
+            frames = sys._current_frames()
+            # samples are added under the lock, so discard() is a barrier:
+            # the writer can iterate a finished trace's Counter safely
+            with self.lock:
+                if not self.active:
+                    self.thread = None
+                    return
+                for trace in self.active:
+                    for tid in list(trace.tids):
+                        frame = frames.get(tid)
+                        if frame is not None and tid != me:
+                            trace.samples[_collapse(frame)] += 1
+
+
+_sampler = _Sampler()
+
+
+# ----------------------------
+# HTTP
+# ----------------------------
+class TraceMiddleware:
+    """
+    ASGI middleware: traces sampled requests (header or TRACE_SAMPLE_RATE)
+    end to end, streamed bodies included, and returns the id as X-Trace-Id.
+    The header counts only alongside `admin_token`, and never when no
+    token is configured (like the /admin/* endpoints).
+    """
+
+    def __init__(self, app, admin_token=""):
+        self.app = app
+        self.header = TRACE_HEADER.lower().encode()
+        self.admin_token = admin_token
+        self._forced_minute = None
+        self._forced_count = 0
+
+    def _forced(self, headers):
+        wanted, token = False, None
+        for k, v in headers:
+            if k == self.header:
+                wanted = v not in (b"", b"0")
+            elif k == b"x-admin-token":
+                token = v
+            elif k == b"authorization" and token is None:
+                token = v.removeprefix(b"Bearer ")
+        if not wanted or not self.admin_token or token is None:
+            return False
+        if not hmac.compare_digest(token, self.admin_token.encode()):
+            return False
+        minute = int(time.monotonic() // 60)
+        if minute != self._forced_minute:
+            self._forced_minute, self._forced_count = minute, 0
+        self._forced_count += 1
+        return self._forced_count <= TRACE_FORCED_PER_MINUTE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        forced = self._forced(scope.get("headers", ()))
+        trace = start(f"{scope.get('method', '')} {scope.get('path', '')}", forced)
+        if trace is None:
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-trace-id", trace.id.encode())]
+            await send(message)
+
+        token = _current.set(trace)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                trace.name = f"{scope.get('method', '')} {route.path}"
+            finish(trace)
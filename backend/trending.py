@@ -0,0 +1,187 @@
+# backend/trending.py
+"""
+Approximate, time-decayed song popularity across all spaces (/trending).
+
+Every suggest / vote / play event updates:
+  - a Count-Min sketch per event kind plus one for the weighted score
+    (TRENDING_DEPTH rows x TRENDING_WIDTH counters, conservative update),
+  - a SpaceSaving-style top-k of the highest scores, which admits a song
+    once its sketch estimate beats the smallest tracked score.
+
+Memory is fixed by the sketch dimensions and TRENDING_TOP_K, whatever the
+traffic. An event costs O(depth). Only a top-k replacement also rescans
+the k entries for the new minimum.
+
+Decay is forward decay: an event at time t adds 2 ** ((t - landmark) /
+half_life) instead of 1, and reads divide by the same factor for "now".
+Old events therefore fade with TRENDING_HALF_LIFE without touching any
+counter. Once the factor grows large, every counter is rescaled once
+and the landmark moves forward.
+
+Not thread-safe: record and read from the event loop.
+"""
+import os
+import time
+import random
+
+# ----------------------------
+# CONFIG
+# ----------------------------
+TRENDING_HALF_LIFE = float(os.getenv("TRENDING_HALF_LIFE", 60 * 60))
+TRENDING_WIDTH = int(os.getenv("TRENDING_WIDTH", 2048))
+TRENDING_DEPTH = int(os.getenv("TRENDING_DEPTH", 4))
+TRENDING_TOP_K = int(os.getenv("TRENDING_TOP_K", 100))
+
+# Contribution of each event kind to the trending score
+WEIGHTS = {"suggest": 1.0, "vote": 1.0, "play": 2.0}
+
+# Rescale once the forward-decay factor passes 2 ** RESCALE_EXPONENT
+RESCALE_EXPONENT = 32
+
+_PRIME = (1 << 61) - 1
+
+
+class CountMin:
+    def __init__(self, width, depth, seeds):
+        self.width = width
+        self.rows = [[0.0] * width for _ in range(depth)]
+        self.seeds = seeds
+
+    def _cells(self, h):
+        w = self.width
+        return [((a * h + b) % _PRIME) % w for a, b in self.seeds]
+
+    def add(self, h, amount):
+        """Conservative update: only raise the counters that are below the new estimate. Returns it."""
+        cells = self._cells(h)
+        estimate = min(row[c] for row, c in zip(self.rows, cells)) + amount
+        for row, c in zip(self.rows, cells):
+            if row[c] < estimate:
+                row[c] = estimate
+        return estimate
+
+    def estimate(self, h):
+        return min(row[c] for row, c in zip(self.rows, self._cells(h)))
+
+    def scale(self, factor):
+        for row in self.rows:
+            for i, v in enumerate(row):
+                if v:
+                    row[i] = v * factor
+
+
+class Trending:
+    def __init__(self, half_life=TRENDING_HALF_LIFE, width=TRENDING_WIDTH, depth=TRENDING_DEPTH,
+                 k=TRENDING_TOP_K, clock=time.time):
+        self.half_life = half_life
+        self.k = k
+        self.clock = clock
+        self.landmark = clock()
+        rng = random.Random()
+        seeds = [(rng.randrange(1, _PRIME), rng.randrange(_PRIME)) for _ in range(depth)]
+        self.score = CountMin(width, depth, seeds)
+        self.kinds = {kind: CountMin(width, depth, seeds) for kind in WEIGHTS}
+        self.top = {}  # song_id -> [scaled score, scaled error at admission, label dict]
+        self._floor = None  # (score, song_id) of the smallest top entry, None = recompute
+        self.events = 0
+
+    # ----------------------------
+    # UPDATE
+    # ----------------------------
+    def _factor(self, now):
+        exponent = (now - self.landmark) / self.half_life
+        if exponent > RESCALE_EXPONENT:
+            self._rescale(now)
+            exponent = 0.0
+        return 2.0 ** exponent
+
+    def _rescale(self, now):
+        factor = 2.0 ** (-(now - self.landmark) / self.half_life)
+        for sketch in (self.score, *self.kinds.values()):
+            sketch.scale(factor)
+        for entry in self.top.values():
+            entry[0] *= factor
+            entry[1] *= factor
+        self._floor = None
+        self.landmark = now
+
+    def record(self, kind, song_id, name=None, artist=None):
+        """Count one `kind` event ("suggest" | "vote" | "play") for a catalog song id."""
+        if song_id is None or kind not in WEIGHTS:
+            return
+        w = self._factor(self.clock())
+        h = hash(song_id)
+        self.kinds[kind].add(h, w)
+        estimate = self.score.add(h, w * WEIGHTS[kind])
+        self.events += 1
+
+        entry = self.top.get(song_id)
+        if entry is not None:
+            entry[0] += w * WEIGHTS[kind]
+            if name:
+                entry[2] = {"name": name, "artist": artist}
+            if self._floor is not None and self._floor[1] == song_id:
+                self._floor = None
+            return
+        if len(self.top) < self.k:
+            self.top[song_id] = [estimate, estimate - w * WEIGHTS[kind], {"name": name, "artist": artist}]
+            self._floor = None
+            return
+        floor_score, floor_id = self._min()
+        if estimate > floor_score:
+            del self.top[floor_id]
+            self.top[song_id] = [estimate, floor_score, {"name": name, "artist": artist}]
+            self._floor = None
+
+    def _min(self):
+        if self._floor is None:
+            song_id, entry = min(self.top.items(), key=lambda kv: kv[1][0])
+            self._floor = (entry[0], song_id)
+        return self._floor
+
+    # ----------------------------
+    # READ
+    # ----------------------------
+    def top_songs(self, n=20):
+        """Top `n` songs by decayed score, with decayed per-kind estimates."""
+        scale = 1.0 / self._factor(self.clock())
+        ranked = sorted(self.top.items(), key=lambda kv: -kv[1][0])[:n]
+        out = []
+        for song_id, (score, error, label) in ranked:
+            h = hash(song_id)
+            out.append({
+                "song_id": song_id,
+                **label,
+                "score": round(score * scale, 3),
+                "error": round(error * scale, 3),
+                "counts": {kind: round(s.estimate(h) * scale, 2) for kind, s in self.kinds.items()},
+            })
+        return out
+
+    def estimate(self, song_id, kind=None):
+        """Decayed score (or `kind` count) of any song, tracked in the top-k or not."""
+        sketch = self.score if kind is None else self.kinds[kind]
+        return sketch.estimate(hash(song_id)) / self._factor(self.clock())
+
+    def report(self):
+        sketches = 1 + len(self.kinds)
+        return {
+            "half_life_s": self.half_life,
+            "events": self.events,
+            "tracked": len(self.top),
+            "k": self.k,
+            "sketch": {"width": self.score.width, "depth": len(self.score.rows), "counters": sketches
+                       * self.score.width * len(self.score.rows)},
+        }
+
+
+def now_playing(spaces):
+    """{db_song_id: (label, number of spaces playing it)} over the live spaces."""
+    out = {}
+    for state in list(spaces.values()):
+        song = state.get("current_song")
+        if not state.get("is_playing") or not song or song.get("db_song_id") is None:
+            continue
+        label, count = out.get(song["db_song_id"], ({"name": song.get("name"), "artist": song.get("artist")}, 0))
+        out[song["db_song_id"]] = (label, count + 1)
+    return out
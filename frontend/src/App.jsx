@@ -4,6 +4,7 @@ import SpacesPage from "./pages/SpacesPage";
 import ChatWindow from "./pages/ChatWindow";
 import Karaoke from "./pages/karaoke";
 import MusicBrowser from "./pages/MusicBrowser";
+import { generateKaraoke } from "./pages/karaokeJob";
 
 function App() {
   const [page, setPage] = useState("landing");
@@ -59,24 +60,16 @@ function App() {
                 if (!songName.trim()) return;
                 setError("");
                 try {
-                  const res = await fetch(
-                    "https://zylo-y1ys.onrender.com/generate_karaoke",
-                    {
-                      method: "POST",
-                      headers: { "Content-Type": "application/json" },
-                      body: JSON.stringify({ song_name: songName }),
-                    }
+                  const data = await generateKaraoke(
+                    "https://zylo-y1ys.onrender.com",
+                    { song_name: songName }
                   );
-                  if (!res.ok) {
-                    const errData = await res.json();
-                    throw new Error(errData.detail || "Backend error");
-                  }
-                  const data = await res.json();
                   setKaraokeData(data);
                 } catch (err) {
                   console.error(err);
                   setError(
-                    "Failed to start karaoke. Check backend or song name."
+                    err.message ||
+                      "Failed to start karaoke. Check backend or song name."
                   );
                 }
               }}
@@ -1,5 +1,6 @@
 import React, { useEffect, useState } from "react";
 import { io } from "socket.io-client";
+import { generateKaraoke } from "../pages/karaokeJob";
 
 const socket = io("http://localhost:8000"); // adjust backend URL
 
@@ -50,13 +51,7 @@ export default function PartyRoom({ roomName, username, setPage, setKaraokeData
   const playKaraoke = async (songName) => {
     try {
       setLoadingKaraoke(true);
-      const res = await fetch("http://localhost:8000/generate_karaoke", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ song_name: songName }),
-      });
-      if (!res.ok) throw new Error("Karaoke generation failed");
-      const data = await res.json();
+      const data = await generateKaraoke("http://localhost:8000", { song_name: songName, space: roomName });
       setKaraokeData({
         audioUrl: data.audio_url,
         vocalsUrl: data.vocals_url,
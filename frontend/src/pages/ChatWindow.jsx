@@ -1,6 +1,7 @@
 // ChatWindow.jsx
 import React, { useEffect, useState, useRef, useCallback } from "react";
 import { socket } from "./socket";
+import { generateKaraoke } from "./karaokeJob";
 
 export default function ChatWindow({ username, space, setPage, setKaraokeData }) {
   // UI state
@@ -329,18 +330,7 @@ export default function ChatWindow({ username, space, setPage, setKaraokeData })
   const playKaraoke = async (songName) => {
     try {
       setLoadingKaraoke(true);
-      const res = await fetch("https://zylo-y1ys.onrender.com/generate_karaoke", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ song_name: songName }),
-      });
-
-      if (!res.ok) {
-        const text = await res.text();
-        throw new Error(text || "Karaoke generation failed");
-      }
-
-      const data = await res.json();
+      const data = await generateKaraoke("https://zylo-y1ys.onrender.com", { song_name: songName, space });
       setKaraokeData({
         audioUrl: data.audio_url,
         vocalsUrl: data.vocals_url,
@@ -0,0 +1,41 @@
+// Karaoke generation runs as a background job on the backend: POST
+// /generate_karaoke waits briefly, then answers 202 with a status_url
+// that is polled until the job is done or failed.
+
+const WAIT_SECONDS = 20;
+const POLL_MS = 2000;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+async function errorFrom(res, fallback) {
+  try {
+    const body = await res.json();
+    return new Error(body.detail || fallback);
+  } catch {
+    return new Error(fallback);
+  }
+}
+
+// Resolves with the finished job (audio_url, vocals_url, lyrics, ...);
+// onProgress(job) is called with every intermediate status.
+export async function generateKaraoke(baseUrl, body, onProgress) {
+  const res = await fetch(`${baseUrl}/generate_karaoke?wait=${WAIT_SECONDS}`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(body),
+  });
+  if (!res.ok) throw await errorFrom(res, "Karaoke generation failed");
+  let job = await res.json();
+
+  while (job.status !== "done") {
+    if (job.status === "failed") {
+      throw new Error(job.error || "Karaoke generation failed");
+    }
+    if (onProgress) onProgress(job);
+    await sleep(POLL_MS);
+    const poll = await fetch(`${baseUrl}${job.status_url}`);
+    if (!poll.ok) throw await errorFrom(poll, "Lost track of the karaoke job");
+    job = await poll.json();
+  }
+  return job;
+}